@@ -1,16 +1,21 @@
-from flask import Flask, request, jsonify, send_from_directory, copy_current_request_context
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import os
+import threading
 import time
 from pathlib import Path
 import sys
-from threading import Thread
 
 # Añadir la carpeta 'backend' al sys.path para permitir importaciones relativas
 backend_dir = os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, backend_dir)
 
-from services.paper_service import get_paper_info, search_and_download_paper, search_papers_by_keywords
+from services.paper_service import get_paper_info, search_and_download_paper, search_papers_by_keywords, get_late_enrichment, SCHOLAR_CHROME_VERSION
+from services.download_jobs import JobManager, QueueFullError
+from services.pdf_store import get_pdf_store
+from services.block_recovery import BackoffRecovery, set_block_recovery
+from services.browser_pool import get_browser_pool
+from services.reference_finder import find_related_papers
 
 app = Flask(__name__)
 CORS(app)
@@ -19,6 +24,18 @@ CORS(app)
 DOWNLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
 Path(DOWNLOAD_DIR).mkdir(parents=True, exist_ok=True)
 
+# Trabajos de búsqueda de enlaces y descarga ejecutados fuera de los hilos de Flask
+job_manager = JobManager(DOWNLOAD_DIR)
+pdf_store = get_pdf_store(DOWNLOAD_DIR)
+
+# Ante un bloqueo de Google Scholar los hilos de Flask nunca esperan: se rota de proxy y,
+# si no hay alternativa, la búsqueda falla con ScholarBlockedError mientras dura la pausa
+set_block_recovery(BackoffRecovery(max_wait=0))
+
+# En modo Selenium los navegadores se arrancan en segundo plano al iniciar el servidor
+if SCHOLAR_CHROME_VERSION is not None:
+    threading.Thread(target=get_browser_pool(SCHOLAR_CHROME_VERSION).warm_up, daemon=True).start()
+
 @app.route('/api/info', methods=['POST'])
 def get_info():
     """
@@ -36,27 +53,14 @@ def get_info():
         if error or not paper_info:
             return jsonify({'success': False, 'error': error or 'No se pudo obtener información del artículo'})
 
-        # Crear una tarea en segundo plano para buscar el enlace de descarga
-        @copy_current_request_context
-        def find_download_link():
+        # Buscar el enlace de descarga en segundo plano; el cliente sigue el trabajo
+        # con GET /api/jobs/<id> o con el flujo de eventos /api/jobs/<id>/events
+        doi = paper_info['sources'][0]['doi'] if paper_info['sources'] else None
+        if doi:
             try:
-                from services.paper_service import download_from_scihub
-                doi = paper_info['sources'][0]['doi'] if paper_info['sources'] else None
-                
-                if doi:
-                    # Buscar enlace de descarga sin descargar el archivo
-                    download_link = download_from_scihub(doi, None, get_link_only=True)
-                    if download_link:
-                        paper_info['download_link'] = download_link
-                        # Aquí podrías emitir un evento WebSocket o usar Server-Sent Events
-                        # para notificar al frontend que el enlace está disponible
-            except Exception as e:
+                paper_info['link_job_id'] = job_manager.submit_resolve(doi).id
+            except QueueFullError as e:
                 print(f"Error finding download link: {str(e)}")
-
-        # Iniciar la búsqueda del enlace en segundo plano
-        thread = Thread(target=find_download_link)
-        thread.daemon = True
-        thread.start()
         
         return jsonify({'success': True, 'info': paper_info})
     
@@ -66,86 +70,79 @@ def get_info():
 @app.route('/api/download', methods=['POST'])
 def download_paper():
     """
-    Descarga un artículo usando la información y enlace obtenidos previamente
+    Encola la descarga de un artículo usando el enlace obtenido previamente (si lo hay).
+    Devuelve el identificador del trabajo para consultar su progreso.
     """
     data = request.get_json()
     doi = data.get('doi')
     download_link = data.get('download_link')
     
-    if not doi or not download_link:
-        return jsonify({'success': False, 'error': 'Se requiere DOI y enlace de descarga'})
+    if not doi:
+        return jsonify({'success': False, 'error': 'Se requiere el DOI del artículo'})
     
     try:
-        # Preparar nombre de archivo
-        pdf_filename = f"{doi.replace('/', '_')}.pdf"
-        pdf_path = os.path.join(DOWNLOAD_DIR, pdf_filename)
-        
-        from services.paper_service import download_paper_from_link
-        success = download_paper_from_link(download_link, pdf_path)
-        
-        if not success:
-            return jsonify({'success': False, 'error': 'No se pudo descargar el artículo'})
-        
+        job = job_manager.submit_download(doi, download_link)
         return jsonify({
             'success': True,
-            'pdf_url': f"/pdf/{pdf_filename}"
-        })
+            'job_id': job.id,
+            'job': job.to_dict()
+        }), 202
     
+    except QueueFullError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Devuelve el estado de un trabajo de búsqueda de enlace o de descarga"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Flujo Server-Sent Events con los cambios de estado de un trabajo"""
+    if job_manager.get(job_id) is None:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    return Response(stream_with_context(job_manager.iter_events(job_id)),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/pdf/<path:filename>')
 def serve_pdf(filename):
     """Sirve archivos PDF desde el directorio de descargas"""
+    pdf_store.mark_open(filename)
     return send_from_directory(DOWNLOAD_DIR, filename)
 
 @app.route('/api/close_pdf', methods=['POST'])
 def close_pdf():
     """
-    Recibe notificación de que se ha cerrado un visor de PDF
-    Esta función podría usarse para programar la eliminación del archivo
-    después de un cierto tiempo, o para limpiar archivos temporales
+    Recibe notificación de que se ha cerrado un visor de PDF y programa la
+    eliminación del archivo al terminar el periodo de gracia
     """
+    data = request.get_json(silent=True) or {}
+    doi = data.get('doi')
+    
     # No eliminamos el archivo inmediatamente para permitir
     # que el usuario pueda volver a abrirlo durante la sesión
-    return jsonify({'success': True})
+    scheduled = pdf_store.close(doi) if doi else False
+    return jsonify({'success': True, 'scheduled': scheduled})
 
 @app.route('/api/find_related', methods=['POST'])
 def find_related():
     """
-    Encuentra artículos relacionados con el artículo actual
-    Esta es una función de prueba que devuelve datos de ejemplo
+    Encuentra artículos relacionados con el artículo actual, ordenados por similitud
+    TF-IDF, número de citas y antigüedad
     """
-    try:
-        # En una implementación real, aquí buscaríamos artículos relacionados
-        # basados en el contenido, citas, etc.
-        example_related = [
-            {
-                "title": "Deep Learning: A Comprehensive Overview",
-                "authors": ["Smith, John", "Johnson, Mary"],
-                "year": "2021",
-                "abstract": "This paper provides a comprehensive overview of deep learning techniques and their applications in various fields.",
-                "doi": "10.1234/dl.2021.001",
-                "cites_num": 145,
-                "similarity_score": 0.85
-            },
-            {
-                "title": "Neural Networks in Computer Vision: A Survey",
-                "authors": ["Davis, Robert", "Wilson, Lisa"],
-                "year": "2020",
-                "abstract": "We survey the most recent advances in neural networks applied to computer vision tasks.",
-                "doi": "10.1234/nn.2020.015",
-                "cites_num": 78,
-                "similarity_score": 0.72
-            }
-        ]
-        
-        return jsonify({
-            'success': True,
-            'results': example_related
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+    data = request.get_json(silent=True) or {}
+    paper_id = data.get('paper_id', '')
+    
+    if not paper_id:
+        return jsonify({'success': False, 'error': 'Se requiere el DOI del artículo'})
+    
+    return jsonify(find_related_papers(paper_id, data.get('context', ''), data.get('model', 'tfidf')))
 
 @app.route('/api/search_keywords', methods=['POST'])
 def search_keywords():
@@ -173,5 +170,19 @@ def search_keywords():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/enrichment', methods=['POST'])
+def late_enrichment():
+    """
+    Devuelve los campos de los resultados de /api/search_keywords que no llegaron
+    dentro del presupuesto de latencia (resultados con 'enrichment_pending')
+    """
+    data = request.get_json(silent=True) or {}
+    keys = data.get('keys', [])
+    
+    if not isinstance(keys, list) or not keys:
+        return jsonify({'success': False, 'error': 'Se requiere la lista de claves de enriquecimiento'})
+    
+    return jsonify({'success': True, 'results': get_late_enrichment(keys)})
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
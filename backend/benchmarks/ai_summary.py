@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Runnable check of AIModelManager.extract_sections against local mocks of the
+provider APIs: a fake OpenAI client and a fake Gemini model, or, with --http, a
+local HTTP server that imitates the OpenAI chat completions endpoint and is used
+through the real openai client. Checks that a short text takes a single call, that
+a long text is summarized by chunks in parallel and then combined (map-reduce),
+and that summarizing the same text again is served from the cache without calls.
+
+Usage (from the backend directory):
+    python -m benchmarks.ai_summary
+    python -m benchmarks.ai_summary --http
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from services.ai_models import AIModelManager, NOT_AVAILABLE, SUMMARY_SECTIONS
+from services.metadata_cache import MetadataCache
+
+LATENCY = 0.2
+
+
+class MockProvider:
+    """Answers every prompt with a JSON object of the requested sections, after LATENCY seconds"""
+
+    def __init__(self, latency=LATENCY):
+        self.latency = latency
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def answer(self, prompt):
+        with self._lock:
+            self.calls.append(prompt)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.latency)
+        with self._lock:
+            self.running -= 1
+        kind = "combined" if prompt.startswith("Los siguientes objetos JSON") else "chunk"
+        # The last section is left empty to check the 'No disponible' default
+        return json.dumps({section: "" if section == SUMMARY_SECTIONS[-1] else "{} {}".format(kind, section)
+                           for section in SUMMARY_SECTIONS})
+
+
+class FakeOpenAIClient:
+    """Same shape as openai.OpenAI for client.chat.completions.create"""
+
+    def __init__(self, provider):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._provider = provider
+
+    def _create(self, model, messages, response_format=None):
+        assert response_format == {"type": "json_object"}
+        content = self._provider.answer(messages[-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class FakeGeminiModel:
+    """Same shape as genai.GenerativeModel for generate_content; answers in a ```json block"""
+
+    model_name = "models/gemini-pro"
+
+    def __init__(self, provider):
+        self._provider = provider
+
+    def generate_content(self, prompt):
+        return SimpleNamespace(text="```json\n{}\n```".format(self._provider.answer(prompt)))
+
+
+def serveOpenAI(provider):
+    """Local HTTP server imitating POST /v1/chat/completions; returns (server, base_url)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            content = provider.answer(body["messages"][-1]["content"])
+            out = json.dumps({"id": "mock", "object": "chat.completion", "created": 0, "model": body["model"],
+                              "choices": [{"index": 0, "finish_reason": "stop",
+                                           "message": {"role": "assistant", "content": content}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}/v1".format(server.server_address[1])
+
+
+def check(name, manager, model, provider, chunk_chars):
+    short = "We study how mock providers answer. The method is simple."
+    long = "\n\n".join("Paragraph {} about the methodology and results of the study. ".format(i) * 8
+                       for i in range(12))
+
+    provider.calls.clear()
+    summary = manager.extract_sections(short, model)
+    assert len(provider.calls) == 1, provider.calls
+    assert summary[SUMMARY_SECTIONS[-1]] == NOT_AVAILABLE, summary
+    print("{}: short text -> {} call".format(name, len(provider.calls)))
+
+    provider.calls.clear()
+    provider.max_running = 0
+    started = time.perf_counter()
+    summary = manager.extract_sections(long, model)
+    elapsed = time.perf_counter() - started
+    chunks = sum(not call.startswith("Los siguientes objetos JSON") for call in provider.calls)
+    assert chunks > 1 and summary[SUMMARY_SECTIONS[0]].startswith("combined"), summary
+    assert provider.max_running > 1, "chunks were not summarized concurrently"
+    print("{}: long text ({} chars, chunks of {}) -> {} chunk calls + {} combine calls in {:.2f}s, "
+          "{} at once (sequential: {:.2f}s)".format(name, len(long), chunk_chars, chunks, len(provider.calls) - chunks,
+                                                   elapsed, provider.max_running, len(provider.calls) * LATENCY))
+
+    provider.calls.clear()
+    assert manager.extract_sections(long, model) == summary
+    assert not provider.calls
+    print("{}: same text again -> served from the cache, 0 calls".format(name))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--http", action="store_true", help="use the real openai client against a local HTTP mock")
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = MetadataCache(db_path=os.path.join(tmp, "metadata.sqlite"))
+        provider = MockProvider()
+        if args.http:
+            import openai
+            server, base_url = serveOpenAI(provider)
+            client = openai.OpenAI(api_key="mock", base_url=base_url)
+        else:
+            server, client = None, FakeOpenAIClient(provider)
+
+        manager = AIModelManager(openai_client=client, gemini_model=FakeGeminiModel(provider), cache=cache,
+                                 chunk_chars=args.chunk_chars)
+        check("openai", manager, "openai", provider, args.chunk_chars)
+        check("gemini", manager, "gemini", provider, args.chunk_chars)
+        if server is not None:
+            server.shutdown()
+        cache._conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of PapersFilters.filterJurnals against the previous all-pairs implementation.
+
+Usage (from the backend directory):
+    python -m benchmarks.journal_filter --journals 5000 --papers 2000
+"""
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+from services.PapersFilters import filterJurnals, similarStrings
+
+WORDS = ["journal", "review", "letters", "applied", "physics", "chemistry", "materials", "science",
+         "international", "advances", "research", "biology", "engineering", "computational", "energy",
+         "american", "society", "reports", "communications", "nano", "environmental", "medicine"]
+
+
+class FakePaper:
+    def __init__(self, jurnal):
+        self.jurnal = jurnal
+
+
+def legacyFilterJurnals(papers, journal_list, include_list):
+    result = []
+    for p in papers:
+        good = not (p.jurnal is not None and len(p.jurnal) > 0)
+        if p.jurnal is not None:
+            for jurnal, include in zip(journal_list, include_list):
+                if include == 1 and similarStrings(p.jurnal, jurnal) >= 0.8:
+                    good = True
+        if good:
+            result.append(p)
+    return result
+
+
+def randomJournal(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).title()
+
+
+def mutate(rng, name):
+    chars = list(name)
+    for _ in range(rng.randint(1, 4)):
+        op = rng.random()
+        pos = rng.randrange(len(chars))
+        if op < 0.4:
+            chars[pos] = rng.choice(string.ascii_letters)
+        elif op < 0.7:
+            del chars[pos]
+        else:
+            chars.insert(pos, rng.choice(string.ascii_letters + " "))
+    return "".join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the journal filter')
+    parser.add_argument('--journals', default=5000, type=int, help='Rows in the journal csv')
+    parser.add_argument('--papers', default=2000, type=int, help='Papers to filter')
+    parser.add_argument('--seed', default=1, type=int)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    journal_list = [randomJournal(rng) for _ in range(args.journals)]
+    include_list = [1 if rng.random() < 0.7 else 0 for _ in journal_list]
+
+    papers = []
+    for _ in range(args.papers):
+        r = rng.random()
+        if r < 0.4:
+            papers.append(FakePaper(rng.choice(journal_list)))
+        elif r < 0.8:
+            papers.append(FakePaper(mutate(rng, rng.choice(journal_list))))
+        elif r < 0.95:
+            papers.append(FakePaper(randomJournal(rng)))
+        else:
+            papers.append(FakePaper(None))
+
+    fd, csv_path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("journal_list;include_list\n")
+            for jurnal, include in zip(journal_list, include_list):
+                f.write("{};{}\n".format(jurnal, include))
+
+        start = time.perf_counter()
+        expected = legacyFilterJurnals(papers, journal_list, include_list)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = list(filterJurnals(papers, csv_path))
+        first_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        list(filterJurnals(papers, csv_path))
+        cached_time = time.perf_counter() - start
+    finally:
+        os.remove(csv_path)
+
+    same = [id(p) for p in result] == [id(p) for p in expected]
+    print("Journals: {}  Papers: {}  Accepted: {}".format(args.journals, args.papers, len(result)))
+    print("Same result as all-pairs filter: {}".format(same))
+    print("All-pairs filter:         {:8.3f}s".format(legacy_time))
+    print("Compiled matcher:         {:8.3f}s  ({:.1f}x)".format(first_time, legacy_time / max(first_time, 1e-9)))
+    print("Second call (cached csv): {:8.3f}s".format(cached_time))
+
+
+if __name__ == "__main__":
+    main()
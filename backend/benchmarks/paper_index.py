@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the local paper index: time to add synthetic papers in batches and
+latency of related-paper queries, with the SimHash shortlist and with an exact scan
+over the whole memory-mapped matrix. Also reports how many of the exact top results
+the shortlist finds (recall@k).
+
+Usage (from the backend directory):
+    python -m benchmarks.paper_index --records 100000
+"""
+import argparse
+import random
+import tempfile
+import time
+import numpy as np
+from services import paper_index
+from services.paper_index import PaperIndex, paper_vectors
+
+TOPICS = [
+    "deep learning image recognition convolutional networks",
+    "soil chemistry volcanic regions nitrogen",
+    "protein folding molecular dynamics simulation",
+    "graph neural networks molecule property prediction",
+    "climate change coastal erosion sea level",
+    "reinforcement learning robot locomotion control",
+    "bayesian inference hierarchical models epidemiology",
+    "quantum error correction surface codes",
+]
+WORDS = ("analysis model method study data system results approach performance evaluation "
+         "framework network learning dynamics structure effect process design estimation").split()
+
+
+def syntheticPapers(n, seed=0):
+    rnd = random.Random(seed)
+    for i in range(n):
+        topic = rnd.choice(TOPICS).split()
+        title = " ".join(rnd.sample(topic, 3) + rnd.sample(WORDS, 3))
+        abstract = " ".join(rnd.choice(topic + WORDS) for _ in range(40))
+        yield {"title": title, "abstract": abstract, "doi": "10.1000/bench.{}".format(i),
+               "year": rnd.randint(1990, 2025), "cites_num": rnd.randint(0, 500)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PaperIndex(tmp)
+        started = time.perf_counter()
+        batch = []
+        for paper in syntheticPapers(args.records):
+            batch.append(paper)
+            if len(batch) == args.batch:
+                index.add_papers(batch)
+                batch = []
+        index.add_papers(batch)
+        print("Indexed {} papers in {:.2f}s".format(len(index), time.perf_counter() - started))
+
+        queries = [" ".join(random.Random(q).sample(TOPICS, 1)[0].split() + ["study"]) for q in range(args.queries)]
+
+        def timed(limit):
+            paper_index.EXACT_SCAN_LIMIT = limit
+            index.search(queries[0], k=args.k)
+            results = []
+            started = time.perf_counter()
+            for query in queries:
+                results.append([paper["doi"] for paper, _ in index.search(query, k=args.k)])
+            return results, (time.perf_counter() - started) / len(queries) * 1000
+
+        approximate, approximate_ms = timed(0)
+        exact, exact_ms = timed(args.records + 1)
+        # Las similitudes empatadas pueden ordenarse distinto; se compara contra las del resultado exacto
+        vectors = np.memmap(index.vectors_path, dtype=np.float32, mode='r', shape=(len(index), paper_index.INDEX_DIM))
+        recall = []
+        for query, found, expected in zip(queries, approximate, exact):
+            q = paper_vectors([query])[0]
+            kth = np.sort(vectors @ q)[-args.k]
+            rows = [int(doi.rsplit(".", 1)[1]) for doi in found]
+            recall.append(np.mean(vectors[rows] @ q >= kth - 1e-6) if rows else 0.0)
+
+        print("Exact scan:       {:.2f} ms/query".format(exact_ms))
+        print("SimHash shortlist: {:.2f} ms/query, recall@{} {:.3f}".format(approximate_ms, args.k, np.mean(recall)))
+
+
+if __name__ == "__main__":
+    main()
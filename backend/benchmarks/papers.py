@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the slotted Paper and PaperBatch against the previous dict-backed Paper
+and row-by-row report. Reports memory per record (tracemalloc) and the time to write
+result.csv, and checks that both reports are identical.
+
+Usage (from the backend directory):
+    python -m benchmarks.papers --records 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from services.Paper import Paper, PaperBatch
+
+BIBTEX = """@article{{Smith_{i},
+\tdoi = {{10.1000/bench.{i}}},
+\turl = {{https://doi.org/10.1000/bench.{i}}},
+\tyear = {year},
+\tmonth = {{mar}},
+\tpublisher = {{Example Publishing}},
+\tvolume = {{{volume}}},
+\tnumber = {{{number}}},
+\tpages = {{{page}--{page_end}}},
+\tauthor = {{Ann Smith and Bo Wang and Carla Garcia and Dmitri Petrov}},
+\ttitle = {{{title}}},
+\tjournal = {{Journal of Benchmark Studies}}
+}}"""
+
+
+class LegacyPaper:
+    """The previous Paper: a plain object that keeps the raw BibTeX string"""
+
+    def __init__(self, title=None, scholar_link=None, scholar_page=None, link_pdf=None, year=None, authors=None):
+        self.title = title
+        self.scholar_page = scholar_page
+        self.scholar_link = scholar_link
+        self.pdf_link = link_pdf
+        self.year = year
+        self.authors = authors
+        self.abstract = None
+        self.jurnal = None
+        self.cites_num = None
+        self.bibtex = None
+        self.DOI = None
+        self.downloaded = False
+        self.downloadedFrom = 0
+        self.use_doi_as_filename = False
+
+    def getFileName(self):
+        return Paper.getFileName(self)
+
+
+def legacyReport(papers, path):
+    columns = ["Name", "Scholar Link", "DOI", "Bibtex", "PDF Name", "Year", "Scholar page", "Journal",
+               "Downloaded", "Downloaded from", "Authors"]
+    sources = {1: "SciDB", 2: "SciHub", 3: "Scholar"}
+    data = []
+    for p in papers:
+        data.append({
+            "Name": p.title,
+            "Scholar Link": p.scholar_link,
+            "DOI": p.DOI,
+            "Bibtex": p.bibtex is not None,
+            "PDF Name": p.getFileName() if p.downloaded else "",
+            "Year": p.year,
+            "Scholar page": p.scholar_page,
+            "Journal": p.jurnal,
+            "Downloaded": p.downloaded,
+            "Downloaded from": sources.get(p.downloadedFrom, ""),
+            "Authors": p.authors
+        })
+    pd.DataFrame(data, columns=columns).to_csv(path, index=False, encoding='utf-8')
+
+
+def makePapers(cls, n, seed):
+    rng = random.Random(seed)
+    papers = []
+    for i in range(n):
+        title = "Benchmark study number {} of columnar paper records".format(i)
+        year = str(rng.randint(1990, 2024))
+        p = cls(title, "https://example.org/article/{}".format(i), "https://scholar.google.com/scholar?q=bench",
+                None, year, "Ann Smith and Bo Wang and Carla Garcia and Dmitri Petrov")
+        p.DOI = "10.1000/bench.{}".format(i)
+        p.jurnal = "Journal of Benchmark Studies"
+        p.cites_num = rng.randint(0, 5000)
+        p.bibtex = BIBTEX.format(i=i, year=year, volume=rng.randint(1, 200), number=rng.randint(1, 12),
+                                 page=i, page_end=i + 12, title=title)
+        p.downloaded = rng.random() < 0.6
+        p.downloadedFrom = rng.choice([1, 2, 3]) if p.downloaded else 0
+        papers.append(p)
+    return papers
+
+
+def measureMemory(cls, n, seed):
+    tracemalloc.start()
+    papers = makePapers(cls, n, seed)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return papers, current / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of Paper records and reports')
+    parser.add_argument('--records', default=100000, type=int)
+    parser.add_argument('--seed', default=1, type=int)
+    args = parser.parse_args()
+
+    legacy, legacy_bytes = measureMemory(LegacyPaper, args.records, args.seed)
+    slotted, slotted_bytes = measureMemory(Paper, args.records, args.seed)
+
+    tmp_dir = tempfile.mkdtemp()
+    legacy_csv = os.path.join(tmp_dir, "legacy.csv")
+    batch_csv = os.path.join(tmp_dir, "batch.csv")
+    try:
+        start = time.perf_counter()
+        legacyReport(legacy, legacy_csv)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        PaperBatch.fromPapers(slotted).generateReport(batch_csv)
+        batch_time = time.perf_counter() - start
+
+        with open(legacy_csv, encoding="utf-8") as a, open(batch_csv, encoding="utf-8") as b:
+            same = a.read() == b.read()
+    finally:
+        for path in (legacy_csv, batch_csv):
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(tmp_dir)
+
+    print("Records: {}".format(args.records))
+    print("Memory per record:  dict Paper {:8.0f} B   slotted Paper {:8.0f} B  ({:.1f}x less)".format(
+        legacy_bytes, slotted_bytes, legacy_bytes / slotted_bytes))
+    print("result.csv:         row dicts  {:8.2f} s   PaperBatch    {:8.2f} s  ({:.1f}x)".format(
+        legacy_time, batch_time, legacy_time / max(batch_time, 1e-9)))
+    print("Identical reports: {}".format(same))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the HTML parsers on the saved Scholar and Sci-Hub pages in fixtures/.
+Reports per-page parse time and peak Python heap (tracemalloc, which does not see
+lxml's C allocations) for lxml and for the html.parser fallback, and checks that
+both give the same records.
+
+Usage (from the backend directory):
+    python -m benchmarks.parsing --repeat 50
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from services import HTMLparsers
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+PAGES = [
+    ("scholar_results.html", lambda html: HTMLparsers.parseScholarResults(html)),
+    ("scihub_article.html", lambda html: HTMLparsers.getSchiHubPDF(html)),
+    ("scidb_article.html", lambda html: HTMLparsers.getSchiHubPDF(html)),
+    ("scihub_mirrors.html", lambda html: HTMLparsers.SciHubUrls(html)),
+]
+
+
+def measure(parse, html, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = parse(html)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the HTML parsers')
+    parser.add_argument('--repeat', default=20, type=int, help='Parses of each page to average')
+    args = parser.parse_args()
+
+    backends = [("html.parser", False)]
+    if HTMLparsers.HAVE_LXML:
+        backends.insert(0, ("lxml", True))
+    else:
+        print("lxml is not installed, only the html.parser fallback is measured")
+
+    print("{:<22} {:<12} {:>12} {:>12}".format("Page", "Parser", "ms/page", "heap KiB"))
+    have_lxml = HTMLparsers.HAVE_LXML
+    try:
+        for name, parse in PAGES:
+            with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+                html = f.read()
+            results = []
+            for backend, use_lxml in backends:
+                HTMLparsers.HAVE_LXML = use_lxml
+                result, elapsed, peak = measure(parse, html, args.repeat)
+                results.append(result)
+                print("{:<22} {:<12} {:>12.2f} {:>12.0f}".format(name, backend, elapsed * 1000, peak / 1024))
+            if len(results) > 1 and results[0] != results[1]:
+                print("  WARNING: parsers disagree on {}".format(name))
+    finally:
+        HTMLparsers.HAVE_LXML = have_lxml
+
+
+if __name__ == "__main__":
+    main()
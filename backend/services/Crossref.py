@@ -1,17 +1,28 @@
-from crossref_commons.iteration import iterate_publications_as_json
 from crossref_commons.retrieval import get_entity
 from crossref_commons.types import EntityType, OutputType
 from .PapersFilters import similarStrings
 from .Paper import Paper
-import requests
+import concurrent.futures
+from .http_client import http_get
+from .metadata_cache import get_metadata_cache
+from .citation_graph import record_crossref_works
 import time
-import random
+
+CROSSREF_WORKS_URL = "https://api.crossref.org/works"
+
+# Title search: results examined per paper, page size, similarity needed to accept a
+# match and to stop looking, and papers searched at the same time
+TITLE_MAX_RESULTS = 30
+TITLE_PAGE_SIZE = 10
+TITLE_SIMILARITY = 0.75
+TITLE_EXACT_SIMILARITY = 0.95
+TITLE_WORKERS = 4
 
 
 def getBibtex(DOI):
     try:
         url_bibtex = "http://api.crossref.org/works/" + DOI + "/transform/application/x-bibtex"
-        x = requests.get(url_bibtex)
+        x = http_get(url_bibtex)
         if x.status_code == 404:
             return ""
         return str(x.text)
@@ -20,13 +31,23 @@ def getBibtex(DOI):
         return ""
 
 
-def getPapersInfoFromDOIs(DOI, restrict):
+"""
+Input
+    DOI: DOI of the paper
+    restrict: 1 skips the BibTeX lookup
+    raise_errors: re-raise network and API errors instead of returning an empty Paper,
+        so an unknown DOI (still an empty Paper) can be told apart from a failed lookup
+Output
+    Paper
+"""
+def getPapersInfoFromDOIs(DOI, restrict, raise_errors=False):
     paper_found = Paper()
     paper_found.DOI = DOI
 
     try:
         paper = get_entity(DOI, EntityType.PUBLICATION, OutputType.JSON)
         if isinstance(paper, dict) and paper is not None and len(paper) > 0:
+            record_crossref_works([paper])
             if "title" in paper:
                 paper_found.title = paper["title"][0]
             if "short-container-title" in paper and len(paper["short-container-title"]) > 0:
@@ -34,55 +55,188 @@ def getPapersInfoFromDOIs(DOI, restrict):
 
             if restrict is None or restrict != 1:
                 paper_found.setBibtex(getBibtex(paper_found.DOI))
-    except:
+    except ValueError:
+        # crossref_commons raises ValueError for a DOI that does not exist
+        print("Paper not found " + DOI)
+    except Exception:
+        if raise_errors:
+            raise
         print("Paper not found " + DOI)
 
     return paper_found
 
 
-# Get paper information from Crossref and return a list of Paper
-def getPapersInfo(papers, scholar_search_link, restrict, scholar_results):
-    papers_return = []
-    num = 1
-    for paper in papers:
-        # while num <= scholar_results:
-        title = paper['title']
-        queries = {'query.bibliographic': title.lower(), 'sort': 'relevance',
-                   "select": "DOI,title,deposited,author,short-container-title"}
-
-        print("Searching paper {} of {} on Crossref...".format(num, len(papers)))
-        num += 1
-
-        found_timestamp = 0
-        paper_found = Paper(title, paper['link'], scholar_search_link, paper['cites'], paper['link_pdf'], paper['year'],
-                            paper['authors'])
-        while True:
-            try:
-                for el in iterate_publications_as_json(max_results=30, queries=queries):
+def getCrossrefBatch(DOIs):
+    # A single works query with one doi: filter per DOI (filters of the same kind are OR-ed)
+    params = {"filter": ",".join("doi:" + DOI for DOI in DOIs), "rows": len(DOIs),
+              "select": "DOI,title,short-container-title,reference"}
+    r = http_get(CROSSREF_WORKS_URL, params=params)
+    r.raise_for_status()
+    items = r.json()["message"]["items"]
+    # The reference lists feed the citation graph
+    record_crossref_works(items)
+    return {el["DOI"].lower(): el for el in items if "DOI" in el}
 
-                    el_date = 0
-                    if "deposited" in el and "timestamp" in el["deposited"]:
-                        el_date = int(el["deposited"]["timestamp"])
 
-                    if (paper_found.DOI is None or el_date > found_timestamp) and "title" in el and similarStrings(
-                            title.lower(), el["title"][0].lower()) > 0.75:
-                        found_timestamp = el_date
+def _paperFromCrossref(DOI, el):
+    paper_found = Paper()
+    paper_found.DOI = DOI
+    if el is not None:
+        if "title" in el and len(el["title"]) > 0:
+            paper_found.title = el["title"][0]
+        if "short-container-title" in el and len(el["short-container-title"]) > 0:
+            paper_found.jurnal = el["short-container-title"][0]
+    return paper_found
 
-                        if "DOI" in el:
-                            paper_found.DOI = el["DOI"].strip().lower()
-                        if "short-container-title" in el and len(el["short-container-title"]) > 0:
-                            paper_found.jurnal = el["short-container-title"][0]
 
-                        if restrict is None or restrict != 1:
-                            paper_found.setBibtex(getBibtex(paper_found.DOI))
+def _addBibtex(paper_found):
+    paper_found.setBibtex(getBibtex(paper_found.DOI))
+    return paper_found
 
-                break
-            except ConnectionError as e:
-                print("Wait 10 seconds and try again...")
-                time.sleep(10)
 
-        papers_return.append(paper_found)
+"""
+Input
+    DOIs: list of DOI
+    restrict: same meaning as in getPapersInfoFromDOIs
+Output
+    generator of Paper, yielded as soon as each DOI is resolved (not in input order)
+"""
+def getPapersInfoFromDOIsBatch(DOIs, restrict, batch_size=50, max_workers=8):
+    started = time.time()
+    resolved = 0
+
+    def progress():
+        elapsed = max(time.time() - started, 1e-6)
+        return "{} of {} DOIs resolved ({:.2f} DOIs/s)".format(resolved, len(DOIs), resolved / elapsed)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for i in range(0, len(DOIs), batch_size):
+            batch = [DOI.strip() for DOI in DOIs[i:i + batch_size] if DOI.strip()]
+            # Commas would break the filter syntax, those DOIs are looked up one by one
+            single = [DOI for DOI in batch if "," in DOI]
+            batch = [DOI for DOI in batch if "," not in DOI]
 
-        time.sleep(random.randint(1, 10))
+            try:
+                found = getCrossrefBatch(batch) if batch else {}
+            except Exception as e:
+                print("Crossref batch query failed ({}), falling back to single lookups".format(e))
+                single += batch
+                batch = []
+                found = {}
+
+            for DOI in single:
+                pending.add(executor.submit(getPapersInfoFromDOIs, DOI, restrict))
+
+            for DOI in batch:
+                el = found.get(DOI.lower())
+                paper_found = _paperFromCrossref(DOI, el)
+                if el is None:
+                    print("Paper not found " + DOI)
+                if el is not None and (restrict is None or restrict != 1):
+                    pending.add(executor.submit(_addBibtex, paper_found))
+                else:
+                    resolved += 1
+                    yield paper_found
+
+            # Stream the BibTeX lookups that already finished while the next batch is queried
+            done, pending = concurrent.futures.wait(pending, timeout=0)
+            for future in done:
+                resolved += 1
+                yield future.result()
+            print(progress())
+
+        for future in concurrent.futures.as_completed(pending):
+            resolved += 1
+            yield future.result()
+
+    print(progress())
+
+
+def _titleKey(title):
+    return " ".join(title.lower().split())
+
+
+def _searchTitle(title):
+    """
+    Look up the DOI of a title on Crossref. A near-exact title match is returned right
+    away; otherwise, among the results with a similar title the most recently
+    deposited wins. Returns the winning Crossref item (DOI and short-container-title) or None.
+    """
+    title_lower = title.lower()
+    best = None
+    best_timestamp = 0
+    for offset in range(0, TITLE_MAX_RESULTS, TITLE_PAGE_SIZE):
+        params = {'query.bibliographic': title_lower, 'sort': 'relevance', 'rows': TITLE_PAGE_SIZE,
+                  'offset': offset, "select": "DOI,title,deposited,short-container-title"}
+        r = http_get(CROSSREF_WORKS_URL, params=params)
+        r.raise_for_status()
+        items = r.json()["message"]["items"]
+
+        for el in items:
+            if "DOI" not in el or not el.get("title"):
+                continue
+            similarity = similarStrings(title_lower, el["title"][0].lower())
+            if similarity >= TITLE_EXACT_SIMILARITY:
+                return el
+            if similarity <= TITLE_SIMILARITY:
+                continue
+
+            el_date = 0
+            if "deposited" in el and "timestamp" in el["deposited"]:
+                el_date = int(el["deposited"]["timestamp"])
+            if best is None or el_date > best_timestamp:
+                best = el
+                best_timestamp = el_date
+
+        if len(items) < TITLE_PAGE_SIZE:
+            break
+
+    return best
+
+
+def resolveTitle(title):
+    """
+    Return (DOI, jurnal) of a title, or (None, None) if Crossref has no similar title.
+    Answers are memoized in the metadata cache so they carry over between runs.
+    """
+    cache = get_metadata_cache()
+    key = _titleKey(title)
+    cached, value = cache.get(key, "crossref_title")
+    if cached:
+        return (value["DOI"], value["jurnal"]) if value else (None, None)
+
+    el = _searchTitle(title)
+    if el is None:
+        cache.set_not_found(key, "crossref_title")
+        return None, None
+
+    DOI = el["DOI"].strip().lower()
+    jurnal = el["short-container-title"][0] if len(el.get("short-container-title") or []) > 0 else None
+    cache.set(key, "crossref_title", {"DOI": DOI, "jurnal": jurnal})
+    return DOI, jurnal
+
+
+def _paperInfo(paper, scholar_search_link, restrict):
+    paper_found = Paper(paper['title'], paper['link'], scholar_search_link, paper['link_pdf'], paper['year'],
+                        paper['authors'])
+    paper_found.cites_num = paper['cites']
+
+    try:
+        paper_found.DOI, paper_found.jurnal = resolveTitle(paper['title'])
+    except Exception as e:
+        print("Crossref search failed for \"{}\": {}".format(paper['title'], e))
+        return paper_found
 
+    # BibTeX is fetched once, for the final match only
+    if paper_found.DOI is not None and (restrict is None or restrict != 1):
+        paper_found.setBibtex(getBibtex(paper_found.DOI))
+    return paper_found
+
+
+# Get paper information from Crossref and return a list of Paper
+def getPapersInfo(papers, scholar_search_link, restrict, scholar_results, max_workers=TITLE_WORKERS):
+    print("Searching {} papers on Crossref...".format(len(papers)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        papers_return = list(executor.map(lambda paper: _paperInfo(paper, scholar_search_link, restrict), papers))
     return papers_return
@@ -1,52 +1,178 @@
-from os import path
-import requests
+from os import path, replace as rename
+import concurrent.futures
+import threading
+from .http_client import http_get
 import time
 from .HTMLparsers import getSchiHubPDF, SciHubUrls
-import random
 from .NetInfo import NetInfo
 from .Utils import URLjoin
+from .stream_download import save_response_stream
+from .mirror_health import get_mirror_registry
+from .scihub_resolver import SCIHUB_MIRRORS, is_cloudflare_challenge
+
+# Download sources, papers downloaded at the same time, requests allowed at once per
+# source and (connect, read) timeout of every request
+SCIDB, SCIHUB, SCHOLAR = 1, 2, 3
+DOWNLOAD_WORKERS = 4
+SOURCE_LIMITS = {SCIDB: 2, SCIHUB: 2, SCHOLAR: 4}
+DOWNLOAD_TIMEOUT = (10, 60)
 
 
 def setSciHubUrl():
+    registry = get_mirror_registry()
+    known_links = registry.rank(SCIHUB_MIRRORS, include_open=True)
+
+    # A mirror that answered recently is reused without probing the whole list again
+    recent = registry.best_recent(known_links)
+    if recent is not None:
+        NetInfo.SciHub_URL = recent
+        return
+
     print("Searching for a sci-hub mirror")
-    r = requests.get(NetInfo.SciHub_URLs_repo, headers=NetInfo.HEADERS)
-    links = SciHubUrls(r.text)
+    try:
+        r = http_get(NetInfo.SciHub_URLs_repo, headers=NetInfo.HEADERS, timeout=10)
+        links = SciHubUrls(r.text)
+    except Exception:
+        links = []
 
+    links = registry.rank(list(dict.fromkeys(links + SCIHUB_MIRRORS)))
     for l in links:
+        started = time.monotonic()
         try:
             print("Trying with {}...".format(l))
-            r = requests.get(l, headers=NetInfo.HEADERS)
+            r = http_get(l, headers=NetInfo.HEADERS, timeout=10)
             if r.status_code == 200:
+                registry.record_success(l, time.monotonic() - started)
                 NetInfo.SciHub_URL = l
                 break
-        except:
-            pass
+            registry.record_failure(l, time.monotonic() - started,
+                                    cloudflare=is_cloudflare_challenge(r.status_code, r.headers, r.text),
+                                    error="HTTP {}".format(r.status_code))
+        except Exception as e:
+            registry.record_failure(l, time.monotonic() - started, error=str(e))
     else:
         print(
             "\nNo working Sci-Hub instance found!\nIf in your country Sci-Hub is not available consider using a VPN or a proxy\nYou can use a specific mirror mirror with the --scihub-mirror argument")
         NetInfo.SciHub_URL = "https://sci-hub.st"
 
 
+_reserved_dirs = set()
+_reserved_lock = threading.Lock()
+
+
 def getSaveDir(folder, fname):
-    dir_ = path.join(folder, fname)
-    n = 1
-    while path.exists(dir_):
-        n += 1
-        dir_ = path.join(folder, f"({n}){fname}")
+    # Names being downloaded by other workers count as taken
+    with _reserved_lock:
+        dir_ = path.join(folder, fname)
+        n = 1
+        while path.exists(dir_) or dir_ in _reserved_dirs:
+            n += 1
+            dir_ = path.join(folder, f"({n}){fname}")
+        _reserved_dirs.add(dir_)
 
     return dir_
 
 
-def saveFile(file_name, content, paper, dwn_source):
-    f = open(file_name, 'wb')
-    f.write(content)
-    f.close()
+def _releaseSaveDir(dir_):
+    with _reserved_lock:
+        _reserved_dirs.discard(dir_)
+
+
+def saveFile(file_name, response, paper, dwn_source):
+    part_name = file_name + ".part"
+    if not save_response_stream(response, part_name):
+        return False
+    rename(part_name, file_name)
 
     paper.downloaded = True
     paper.downloadedFrom = dwn_source
+    return True
+
+
+def _isPDF(content_type):
+    return content_type is not None and ('application/pdf' in content_type or "application/octet-stream" in content_type)
+
+
+def downloadSteps(p):
+    """
+    Fallback chain of a paper as a list of (source, url): 1 scidb - 2 scihub - 3 scholar.
+    Steps that don't apply to the paper are left out.
+    """
+    steps = []
+    if p.DOI is not None:
+        steps.append((SCIDB, URLjoin(NetInfo.SciDB_URL, p.DOI)))
+        steps.append((SCIHUB, URLjoin(NetInfo.SciHub_URL, p.DOI)))
+    if p.scholar_link is not None:
+        steps.append((SCIHUB, URLjoin(NetInfo.SciHub_URL, p.scholar_link)))
+        if p.scholar_link[-3:] == "pdf":
+            steps.append((SCHOLAR, p.scholar_link))
+    if p.pdf_link is not None:
+        steps.append((SCHOLAR, p.pdf_link))
+    return steps
+
+
+class _PaperDownload:
+    """State of a paper in the fallback chain: the next step runs only if the previous one failed"""
+
+    def __init__(self, paper, number, pdf_dir):
+        self.paper = paper
+        self.number = number
+        self.pdf_dir = pdf_dir
+        self.steps = downloadSteps(paper)
+        self.step = 0
+
+    def finished(self):
+        return self.paper.downloaded or self.step >= len(self.steps)
+
+
+def _runStep(state, source_limits):
+    dwn_source, url = state.steps[state.step]
+    state.step += 1
+    registry = get_mirror_registry()
+    with source_limits[dwn_source]:
+        started = time.monotonic()
+        try:
+            r = http_get(url, headers=NetInfo.HEADERS, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        except Exception as e:
+            if dwn_source != SCHOLAR:
+                registry.record_failure(url, time.monotonic() - started, error=str(e))
+            return False
+        if dwn_source != SCHOLAR:
+            if r.status_code == 200:
+                registry.record_success(url, time.monotonic() - started)
+            else:
+                registry.record_failure(url, time.monotonic() - started,
+                                        cloudflare=is_cloudflare_challenge(r.status_code, r.headers, r.text),
+                                        error="HTTP {}".format(r.status_code))
+        content_type = r.headers.get('content-type')
 
-
-def downloadPapers(papers, dwnl_dir, num_limit, SciHub_URL=None, SciDB_URL=None):
+        try:
+            if dwn_source != SCHOLAR and not _isPDF(content_type):
+                pdf_link = getSchiHubPDF(r.text)
+                r.close()
+                if pdf_link is None:
+                    return False
+                r = http_get(pdf_link, headers=NetInfo.HEADERS, stream=True, timeout=DOWNLOAD_TIMEOUT)
+                content_type = r.headers.get('content-type')
+
+            if _isPDF(content_type):
+                return saveFile(state.pdf_dir, r, state.paper, dwn_source)
+            r.close()
+        except Exception as e:
+            print("Error downloading {}: {}".format(url, e))
+            r.close()
+        return False
+
+
+"""
+Input
+    papers: iterable of Paper (a list or the stream coming from the search)
+    num_limit: maximum number of papers to download, None for no limit
+    workers: papers downloaded at the same time
+    on_processed: function called with each Paper once it has been downloaded or given up
+"""
+def downloadPapers(papers, dwnl_dir, num_limit, SciHub_URL=None, SciDB_URL=None, workers=DOWNLOAD_WORKERS,
+                   on_processed=None):
 
     NetInfo.SciHub_URL = SciHub_URL
     if NetInfo.SciHub_URL is None:
@@ -58,50 +184,67 @@ def downloadPapers(papers, dwnl_dir, num_limit, SciHub_URL=None, SciDB_URL=None)
     print("Using Sci-DB mirror {}".format(NetInfo.SciDB_URL))
     print("You can use --scidb-mirror and --scidb-mirror to specify your're desired mirror URL\n")
 
+    on_processed = on_processed or (lambda paper: None)
+    source_limits = {source: threading.BoundedSemaphore(limit) for source, limit in SOURCE_LIMITS.items()}
+    # papers can be a list or a stream of Paper coming from the search
+    total = len(papers) if hasattr(papers, "__len__") else None
+    papers = iter(papers)
+    exhausted = False
     num_downloaded = 0
-    paper_number = 1
-    paper_files = []
+    num_bytes = 0
+    paper_number = 0
+    running = {}
+    started = time.monotonic()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # Start new papers while there are free workers; with num_limit, papers in
+            # flight are counted as if they will succeed so the limit is never exceeded
+            while not exhausted and len(running) < workers and (
+                    num_limit is None or num_downloaded + len(running) < num_limit):
+                p = next(papers, None)
+                if p is None:
+                    exhausted = True
+                    break
+                if not p.canBeDownloaded():
+                    on_processed(p)
+                    continue
+                paper_number += 1
+                if total is not None:
+                    print("Download {} of {} -> {}".format(paper_number, total, p.title))
+                else:
+                    print("Download {} -> {}".format(paper_number, p.title))
+                state = _PaperDownload(p, paper_number, getSaveDir(dwnl_dir, p.getFileName()))
+                if state.finished():
+                    _releaseSaveDir(state.pdf_dir)
+                    on_processed(p)
+                    continue
+                running[executor.submit(_runStep, state, source_limits)] = state
+
+            if not running:
+                break
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                state = running.pop(future)
+                if not state.finished():
+                    # Next step of the chain, queued behind the other papers
+                    running[executor.submit(_runStep, state, source_limits)] = state
+                    continue
+                _releaseSaveDir(state.pdf_dir)
+                if state.paper.downloaded:
+                    num_downloaded += 1
+                    num_bytes += path.getsize(state.pdf_dir) if path.exists(state.pdf_dir) else 0
+                on_processed(state.paper)
+
+            if num_limit is not None and num_downloaded >= num_limit and not running:
+                break
+
+    # Papers not attempted because the limit was reached are still reported
     for p in papers:
-        if p.canBeDownloaded() and (num_limit is None or num_downloaded < num_limit):
-            print("Download {} of {} -> {}".format(paper_number, len(papers), p.title))
-            paper_number += 1
-
-            pdf_dir = getSaveDir(dwnl_dir, p.getFileName())
-
-            failed = 0
-            url = ""
-            while not p.downloaded and failed != 5:
-                try:
-                    dwn_source = 1  # 1 scidb - 2 scihub - 3 scholar
-                    if failed == 0 and p.DOI is not None:
-                        url = URLjoin(NetInfo.SciDB_URL, p.DOI)
-                    if failed == 1 and p.DOI is not None:
-                        url = URLjoin(NetInfo.SciHub_URL, p.DOI)
-                        dwn_source = 2
-                    if failed == 2 and p.scholar_link is not None:
-                        url = URLjoin(NetInfo.SciHub_URL, p.scholar_link)
-                    if failed == 3 and p.scholar_link is not None and p.scholar_link[-3:] == "pdf":
-                        url = p.scholar_link
-                        dwn_source = 3
-                    if failed == 4 and p.pdf_link is not None:
-                        url = p.pdf_link
-                        dwn_source = 3
-
-                    if url != "":
-                        r = requests.get(url, headers=NetInfo.HEADERS)
-                        content_type = r.headers.get('content-type')
-
-                        if (dwn_source == 1 or dwn_source == 2) and 'application/pdf' not in content_type and "application/octet-stream" not in content_type:
-                            time.sleep(random.randint(1, 4))
-
-                            pdf_link = getSchiHubPDF(r.text)
-                            if pdf_link is not None:
-                                r = requests.get(pdf_link, headers=NetInfo.HEADERS)
-                                content_type = r.headers.get('content-type')
-
-                        if 'application/pdf' in content_type or "application/octet-stream" in content_type:
-                            paper_files.append(saveFile(pdf_dir, r.content, p, dwn_source))
-                except Exception:
-                    pass
-
-                failed += 1
+        on_processed(p)
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print("\nDownloaded {} of {} papers in {:.1f}s ({:.2f} papers/s, {:.2f} MB/s)".format(
+        num_downloaded, paper_number, elapsed, num_downloaded / elapsed, num_bytes / elapsed / 1024 / 1024))
+    return num_downloaded
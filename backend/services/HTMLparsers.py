@@ -4,105 +4,221 @@ Created on Sun Jun  7 11:59:42 2020
 
 @author: Vito
 """
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urljoin
 from bs4 import BeautifulSoup
 import re
 
+# lxml parses several times faster than the pure-Python html.parser; it is optional
+try:
+    import lxml.html
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+
+class _LxmlNode:
+    def __init__(self, element):
+        self.element = element
+
+    def select(self, tag=None, classes=(), id=None):
+        # Same matching as the CSS selector tag.class1.class2#id
+        xpath = ".//" + (tag or "*")
+        for cls in classes:
+            xpath += "[contains(concat(' ', normalize-space(@class), ' '), ' {} ')]".format(cls)
+        if id is not None:
+            xpath += "[@id='{}']".format(id)
+        return [_LxmlNode(e) for e in self.element.xpath(xpath)]
+
+    def text(self):
+        return self.element.text_content()
+
+    def attr(self, name):
+        return self.element.get(name)
+
+
+class _SoupNode:
+    def __init__(self, element):
+        self.element = element
+
+    def select(self, tag=None, classes=(), id=None):
+        selector = (tag or "*") + "".join("." + cls for cls in classes) + ("#" + id if id is not None else "")
+        return [_SoupNode(e) for e in self.element.select(selector)]
+
+    def text(self):
+        return self.element.get_text()
+
+    def attr(self, name):
+        value = self.element.get(name)
+        return " ".join(value) if isinstance(value, list) else value
+
+
+def parseDocument(html):
+    """Parse a page once with lxml if available, otherwise with BeautifulSoup's html.parser"""
+    if HAVE_LXML and html and html.strip():
+        try:
+            return _LxmlNode(lxml.html.document_fromstring(html))
+        except (ValueError, lxml.etree.ParserError):
+            pass
+    return _SoupNode(BeautifulSoup(html or "", "html.parser"))
+
+
+def _first(nodes):
+    return nodes[0] if nodes else None
+
+
+@dataclass
+class ScholarResult:
+    """One result of a Google Scholar results page"""
+    title: Optional[str] = None      # Text of the first link of the heading
+    heading: Optional[str] = None    # Whole heading without the [PDF]/[HTML] markers
+    link: Optional[str] = None
+    link_pdf: Optional[str] = None
+    cites: Optional[int] = None
+    year: Optional[str] = None
+    authors: Optional[str] = None    # ';' separated, None if Scholar truncated the list
+    meta: Optional[str] = None       # "authors - source, year - publisher" line
+    abstract: Optional[str] = None
+    is_book: bool = False
+
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'link': self.link,
+            'cites': self.cites,
+            'link_pdf': self.link_pdf,
+            'year': self.year,
+            'authors': self.authors}
+
+
+def _parseMeta(meta):
+    authors = None
+    year = None
+    try:
+        authors, source_and_year, source = meta.split(" - ")
+    except ValueError:
+        return None, None
+
+    if not authors.strip().endswith('\u2026'):
+        # There is no ellipsis at the end so we know the full list of authors
+        authors = authors.replace(', ', ';')
+    else:
+        authors = None
+    try:
+        year = int(source_and_year[-4:])
+    except ValueError:
+        return authors, None
+    if not (1000 <= year <= 3000):
+        year = None
+    else:
+        year = str(year)
+    return authors, year
+
+
+def _scholarResult(element):
+    result = ScholarResult()
+    result.is_book = any(span.text() == "[B]" for span in element.select("span", ["gs_ct2"]))
+
+    for h3 in element.select("h3", ["gs_rt"]):
+        if result.heading is None:
+            result.heading = h3.text().replace('[HTML]', '').replace('[PDF]', '').strip()
+        a = _first(h3.select("a"))
+        if a is not None and result.title is None:
+            result.title = a.text()
+            result.link = a.attr("href")
+
+    for a in element.select("a"):
+        text = a.text()
+        if "Cited by" in text:
+            cites = ''.join(filter(str.isdigit, text))
+            result.cites = int(cites) if cites else None
+        if "[PDF]" in text:
+            result.link_pdf = a.attr("href")
+
+    for div in element.select("div", ["gs_a"]):
+        meta = div.text().replace('\u00A0', ' ')
+        if result.meta is None:
+            result.meta = meta
+        authors, year = _parseMeta(meta)
+        if authors is not None or year is not None:
+            result.authors, result.year = authors, year
+
+    abstract = _first(element.select(classes=["gs_fma_abs"])) or _first(element.select(classes=["gs_fma_snp"]))
+    if abstract is not None:
+        result.abstract = abstract.text().replace('\u2026', '...').strip()
+    return result
+
+
+"""
+Input
+    html: Google Scholar results page
+Output
+    list of ScholarResult, books included (see ScholarResult.is_book)
+"""
+def parseScholarResults(html):
+    doc = parseDocument(html)
+    return [_scholarResult(element) for element in doc.select("div", ["gs_r", "gs_or", "gs_scl"])]
+
 
 def schoolarParser(html):
-    result = []
-    soup = BeautifulSoup(html, "html.parser")
-    for element in soup.findAll("div", class_="gs_r gs_or gs_scl"):
-        if not isBook(element):
-            title = None
-            link = None
-            link_pdf = None
-            cites = None
-            year = None
-            authors = None
-            for h3 in element.findAll("h3", class_="gs_rt"):
-                found = False
-                for a in h3.findAll("a"):
-                    if not found:
-                        title = a.text
-                        link = a.get("href")
-                        found = True
-            for a in element.findAll("a"):
-                if "Cited by" in a.text:
-                    cites = int(a.text[8:])
-                if "[PDF]" in a.text:
-                    link_pdf = a.get("href")
-            for div in element.findAll("div", class_="gs_a"):
-                try:
-                    authors, source_and_year, source = div.text.replace('\u00A0', ' ').split(" - ")
-                except ValueError:
-                    continue
-
-                if not authors.strip().endswith('\u2026'):
-                    # There is no ellipsis at the end so we know the full list of authors
-                    authors = authors.replace(', ', ';')
-                else:
-                    authors = None
-                try:
-                    year = int(source_and_year[-4:])
-                except ValueError:
-                    continue
-                if not (1000 <= year <= 3000):
-                    year = None
-                else:
-                    year = str(year)
-            if title is not None:
-                result.append({
-                    'title': title,
-                    'link': link,
-                    'cites': cites,
-                    'link_pdf': link_pdf,
-                    'year': year,
-                    'authors': authors})
-    return result
+    return [r.to_dict() for r in parseScholarResults(html) if not r.is_book and r.title is not None]
 
 
-def isBook(tag):
-    result = False
-    for span in tag.findAll("span", class_="gs_ct2"):
-        if span.text == "[B]":
-            result = True
-    return result
+def isBlockedPage(html):
+    # Google Scholar robot check / CAPTCHA pages
+    markers = ["Sorry, we can't verify that you're not a robot when JavaScript is turned off",
+               'id="gs_captcha_f"', "gs_captcha_ccl", "/sorry/index"]
+    return any(marker in html for marker in markers)
 
 
 def getSchiHubPDF(html):
     result = None
-    soup = BeautifulSoup(html, "html.parser")
+    doc = parseDocument(html)
 
-    iframe = soup.find(id='pdf') #scihub logic
-    plugin = soup.find(id='plugin') #scihub logic
-    download_scidb = soup.find("a", text=lambda text: text and "Download" in text, href=re.compile(r"\.pdf$")) #scidb logic
-    embed_scihub = soup.find("embed") #scihub logic
+    iframe = _first(doc.select(id='pdf')) #scihub logic
+    plugin = _first(doc.select(id='plugin')) #scihub logic
+    download_scidb = _first([a for a in doc.select("a") if "Download" in a.text()
+                             and re.search(r"\.pdf$", a.attr("href") or "")]) #scidb logic
+    embed_scihub = _first(doc.select("embed")) #scihub logic
 
     if iframe is not None:
-        result = iframe.get("src")
+        result = iframe.attr("src")
 
     if plugin is not None and result is None:
-        result = plugin.get("src")
+        result = plugin.attr("src")
 
     if result is not None and result[0] != "h":
         result = "https:" + result
 
     if download_scidb is not None and result is None:
-        result = download_scidb.get("href")
+        result = download_scidb.attr("href")
 
     if embed_scihub is not None and result is None:
-        result = embed_scihub.get("original-url")
+        result = embed_scihub.attr("original-url")
 
     return result
 
 
+def getSciHubPDFLink(html, page_url):
+    """Absolute link of the PDF embedded (iframe/embed with id 'pdf') in a Sci-Hub page, or None"""
+    pdf_element = _first(parseDocument(html).select(id='pdf'))
+    if pdf_element is None or not pdf_element.attr('src'):
+        return None
+
+    download_link = pdf_element.attr('src')
+    if download_link.startswith('//'):
+        return 'https:' + download_link
+    return urljoin(page_url, download_link)
+
+
 def SciHubUrls(html):
     result = []
-    soup = BeautifulSoup(html, "html.parser")
+    doc = parseDocument(html)
 
-    for ul in soup.findAll("ul"):
-        for a in ul.findAll("a"):
-            link = a.get("href")
+    for ul in doc.select("ul"):
+        for a in ul.select("a"):
+            link = a.attr("href") or ""
             if link.startswith("https://sci-hub.") or link.startswith("http://sci-hub."):
                 result.append(link)
 
@@ -5,13 +5,36 @@ Created on Mon Jun  8 21:43:30 2020
 @author: Vito
 """
 import bibtexparser
+import csv
+import os
 import re
-import pandas as pd
+import zlib
+from array import array
 import urllib.parse
 
 
-class Paper:
+# Preset dictionary for zlib: BibTeX entries are too short to compress well on their own
+_BIBTEX_ZDICT = (b"@inproceedings{@book{@misc{@article{,\n\tdoi = {10.,\n\turl = {https://doi.org/10.,\n\tyear = ,"
+                 b"\n\tmonth = {jan}{feb}{mar}{apr}{may}{jun}{jul}{aug}{sep}{oct}{nov}{dec},\n\tpublisher = {"
+                 b"Elsevier BV}{Springer Science and Business Media LLC}{American Chemical Society (ACS)}{Wiley},"
+                 b"\n\tvolume = {,\n\tnumber = {,\n\tpages = {},\n\tauthor = { and },\n\ttitle = {"
+                 b"},\n\tjournal = {Journal of the }\n}")
+
+
+def _compressBibtex(bibtex):
+    compressor = zlib.compressobj(zdict=_BIBTEX_ZDICT)
+    return compressor.compress(bibtex.encode("utf-8")) + compressor.flush()
+
+
+def _decompressBibtex(data):
+    decompressor = zlib.decompressobj(zdict=_BIBTEX_ZDICT)
+    return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+
 
+class Paper:
+    # No per-instance __dict__: large crawls keep thousands of Paper alive
+    __slots__ = ("title", "scholar_page", "scholar_link", "pdf_link", "year", "authors", "abstract", "jurnal",
+                 "cites_num", "_bibtex", "DOI", "downloaded", "downloadedFrom", "use_doi_as_filename")
 
     def __init__(self,title=None, scholar_link=None, scholar_page=None, link_pdf=None, year=None, authors=None):        
         self.title = title
@@ -25,7 +48,7 @@ class Paper:
 
         self.jurnal = None
         self.cites_num = None
-        self.bibtex = None
+        self._bibtex = None
         self.DOI = None
 
         self.downloaded = False
@@ -33,6 +56,15 @@ class Paper:
         
         self.use_doi_as_filename = False # if True, the filename will be the DOI
 
+    @property
+    def bibtex(self):
+        # Once parsed, the BibTeX is only needed for the export, so it is kept compressed
+        return _decompressBibtex(self._bibtex) if self._bibtex is not None else None
+
+    @bibtex.setter
+    def bibtex(self, bibtex):
+        self._bibtex = _compressBibtex(bibtex) if bibtex is not None else None
+
     def getFileName(self):
             try:
                 if self.use_doi_as_filename:
@@ -63,52 +95,81 @@ class Paper:
         return self.DOI is not None or self.scholar_link is not None
 
     def generateReport(papers, path):
-        # Define the column names
-        columns = ["Name", "Scholar Link", "DOI", "Bibtex", "PDF Name",
-                   "Year", "Scholar page", "Journal", "Downloaded",
-                   "Downloaded from", "Authors"]
-
-        # Prepare data to populate the DataFrame
-        data = []
-        for p in papers:
-            pdf_name = p.getFileName() if p.downloaded else ""
-            bibtex_found = p.bibtex is not None
-
-            # Determine download source
-            dwn_from = ""
-            if p.downloadedFrom == 1:
-                dwn_from = "SciDB"
-            elif p.downloadedFrom == 2:
-                dwn_from = "SciHub"
-            elif p.downloadedFrom == 3:
-                dwn_from = "Scholar"
-
-            # Append row data as a dictionary
-            data.append({
-                "Name": p.title,
-                "Scholar Link": p.scholar_link,
-                "DOI": p.DOI,
-                "Bibtex": bibtex_found,
-                "PDF Name": pdf_name,
-                "Year": p.year,
-                "Scholar page": p.scholar_page,
-                "Journal": p.jurnal,
-                "Downloaded": p.downloaded,
-                "Downloaded from": dwn_from,
-                "Authors": p.authors
-            })
-
-        # Create a DataFrame and write to CSV
-        df = pd.DataFrame(data, columns=columns)
-        df.to_csv(path, index=False, encoding='utf-8')
+        PaperBatch.fromPapers(papers).generateReport(path)
 
     def generateBibtex(papers, path):
-        content = ""
+        PaperBatch.fromPapers(papers).generateBibtex(path)
+
+
+class PaperBatch:
+    """
+    Columnar container of papers: one list (or array for numbers) per report column
+    instead of one object per paper. Reports are written straight from the columns,
+    without building a dict per row.
+    """
+
+    TEXT_COLUMNS = ("title", "scholar_link", "DOI", "pdf_name", "year", "scholar_page", "jurnal", "authors",
+                    "bibtex")
+    # Numeric columns use -1 for "unknown"
+    NUMBER_COLUMNS = {"cites_num": "q", "downloaded": "b", "downloadedFrom": "b"}
+
+    REPORT_COLUMNS = [("Name", "title"), ("Scholar Link", "scholar_link"), ("DOI", "DOI"), ("Bibtex", "bibtex"),
+                      ("PDF Name", "pdf_name"), ("Year", "year"), ("Scholar page", "scholar_page"),
+                      ("Journal", "jurnal"), ("Downloaded", "downloaded"), ("Downloaded from", "downloadedFrom"),
+                      ("Authors", "authors")]
+    DOWNLOAD_SOURCES = {1: "SciDB", 2: "SciHub", 3: "Scholar"}
+
+    def __init__(self):
+        self.columns = {name: [] for name in self.TEXT_COLUMNS}
+        self.columns.update({name: array(code) for name, code in self.NUMBER_COLUMNS.items()})
+
+    @classmethod
+    def fromPapers(cls, papers):
+        batch = cls()
         for p in papers:
-            if p.bibtex is not None:
-                content += p.bibtex + "\n"
-
-        relace_list = ["\ast", "*", "#"]
+            batch.append(p)
+        return batch
+
+    def __len__(self):
+        return len(self.columns["title"])
+
+    def append(self, p):
+        columns = self.columns
+        columns["title"].append(p.title)
+        columns["scholar_link"].append(p.scholar_link)
+        columns["DOI"].append(p.DOI)
+        columns["pdf_name"].append(p.getFileName() if p.downloaded else "")
+        columns["year"].append(p.year)
+        columns["scholar_page"].append(p.scholar_page)
+        columns["jurnal"].append(p.jurnal)
+        columns["authors"].append(p.authors)
+        # The compressed BibTeX is shared with the Paper, not copied
+        columns["bibtex"].append(p._bibtex)
+        columns["cites_num"].append(int(p.cites_num) if p.cites_num is not None else -1)
+        columns["downloaded"].append(1 if p.downloaded else 0)
+        columns["downloadedFrom"].append(p.downloadedFrom or 0)
+
+    def _reportColumn(self, name):
+        values = self.columns[name]
+        if name == "bibtex":
+            return (value is not None for value in values)
+        if name == "downloaded":
+            return (value == 1 for value in values)
+        if name == "downloadedFrom":
+            return (self.DOWNLOAD_SOURCES.get(value, "") for value in values)
+        return values
+
+    def generateReport(self, path):
+        # Written straight from the columns, in the same format as DataFrame.to_csv
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow([header for header, _ in self.REPORT_COLUMNS])
+            writer.writerows(zip(*(self._reportColumn(name) for _, name in self.REPORT_COLUMNS)))
+
+    def generateBibtex(self, path):
+        content = "".join(_decompressBibtex(b) + "\n" for b in self.columns["bibtex"] if b is not None)
+
+        relace_list = ["\\ast", "*", "#"]
         for c in relace_list:
             content = content.replace(c, "")
 
@@ -4,52 +4,134 @@ Created on Tue Aug 18 12:41:29 2020
 
 @author: Vito
 """
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
 import pandas as pd
 from difflib import SequenceMatcher
 
+JOURNAL_THRESHOLD = 0.8
+
 
 def similarStrings(a, b):
     return SequenceMatcher(None, a, b).ratio()
 
 
+class JournalMatcher:
+    """
+    Precompiled form of a journal csv. Gives the same answers as comparing a journal
+    against every included row with similarStrings, but only runs the full ratio on
+    candidates that can still reach the threshold:
+        - exact matches are answered by a hash lookup
+        - ratio = 2*M/(len(a)+len(b)), so only journals within a length window are candidates
+        - M can't exceed the common characters, so a character count bound prunes the rest
+    Each journal keeps its own SequenceMatcher with the journal already indexed, and
+    results are memoized because many papers share the same journal.
+    """
+
+    def __init__(self, journals, threshold=JOURNAL_THRESHOLD):
+        self.threshold = threshold
+        self.journals = sorted(set(journals), key=len)
+        self.exact = set(self.journals)
+        self.lengths = [len(j) for j in self.journals]
+        self.counts = [Counter(j) for j in self.journals]
+        self.matchers = []
+        for j in self.journals:
+            matcher = SequenceMatcher(None)
+            matcher.set_seq2(j)
+            self.matchers.append(matcher)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromCSV(cls, csv_path, threshold=JOURNAL_THRESHOLD):
+        df = pd.read_csv(csv_path, sep=";")
+        journals = [jurnal for jurnal, include in zip(df["journal_list"], df["include_list"])
+                    if include == 1 and isinstance(jurnal, str)]
+        return cls(journals, threshold)
+
+    def _candidates(self, jurnal):
+        # 2*min(la, lb)/(la + lb) >= t  <=>  la*t/(2-t) <= lb <= la*(2-t)/t
+        n = len(jurnal)
+        low = bisect_left(self.lengths, n * self.threshold / (2 - self.threshold) - 1e-9)
+        high = bisect_right(self.lengths, n * (2 - self.threshold) / self.threshold + 1e-9)
+        return range(low, high)
+
+    def _match(self, jurnal):
+        if jurnal in self.exact:
+            return True
+        counts = Counter(jurnal)
+        n = len(jurnal)
+        for i in self._candidates(jurnal):
+            total = n + self.lengths[i]
+            common = sum((counts & self.counts[i]).values())
+            if total == 0 or 2.0 * common / total < self.threshold:
+                continue
+            # SequenceMatcher caches the second sequence, so only the paper journal is reindexed
+            matcher = self.matchers[i]
+            with self._lock:
+                matcher.set_seq1(jurnal)
+                ratio = matcher.ratio()
+            if ratio >= self.threshold:
+                return True
+        return False
+
+    def matches(self, jurnal):
+        """Return True if jurnal is similar enough to one of the included journals"""
+        result = self._memo.get(jurnal)
+        if result is None:
+            result = self._match(jurnal)
+            self._memo[jurnal] = result
+        return result
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def getJournalMatcher(csv_path, threshold=JOURNAL_THRESHOLD):
+    """Return the compiled matcher of a csv, rebuilding it only when the file changes"""
+    path = os.path.abspath(csv_path)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size, threshold)
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is None:
+            matcher = JournalMatcher.fromCSV(path, threshold)
+            for old_key in [k for k in _matchers if k[0] == path]:
+                del _matchers[old_key]
+            _matchers[key] = matcher
+        return matcher
+
+
 """
 Input
-    papers: list of Paper
+    papers: iterable of Paper
     csv_path: path of a csv containing the journals to include (consult the GitHub page for the csv format)
 Output
-    result: list of Paper published by the journals included in the csv
+    generator of Paper published by the journals included in the csv
 """
 def filterJurnals(papers,csv_path):
-    result = []
-    df = pd.read_csv(csv_path, sep=";")
-    journal_list = list(df["journal_list"])
-    include_list = list(df["include_list"])
+    matcher = getJournalMatcher(csv_path)
 
     for p in papers:
         good = not (p.jurnal is not None and len(p.jurnal) > 0)
-        if p.jurnal is not None:
-            for jurnal, include in zip(journal_list, include_list):
-                if include == 1 and similarStrings(p.jurnal, jurnal) >= 0.8:
-                    good = True
+        if p.jurnal is not None and matcher.matches(p.jurnal):
+            good = True
 
         if good:
-            result.append(p)
-
-    return result
+            yield p
 
 
 """
 Input
-    papers: list of Paper
+    papers: iterable of Paper
     min_year: minimal publication year accepted
 Output
-    result: list of Paper published since min_year
+    generator of Paper published since min_year
 """
 def filter_min_date(list_papers,min_year):
-    new_list = []
-
     for paper in list_papers:
         if paper.year is not None and int(paper.year) >= min_year:
-            new_list.append(paper)
-
-    return new_list
+            yield paper
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental writers for the crawl outputs (result.csv/.jsonl/.parquet and bibtex.bib).
+Rows are appended as papers are processed and flushed periodically, so a crash
+keeps everything written so far; with resume=True an existing output is continued
+and papers already in it are skipped.
+"""
+import abc
+import csv
+import json
+import os
+import re
+import time
+from .Paper import PaperBatch
+
+# Rows written between two flushes to disk, and maximum seconds between flushes
+FLUSH_EVERY = 50
+FLUSH_INTERVAL = 10.0
+
+REPORT_HEADERS = [header for header, _ in PaperBatch.REPORT_COLUMNS]
+DOWNLOAD_SOURCES = PaperBatch.DOWNLOAD_SOURCES
+
+
+def reportRow(p):
+    return [p.title, p.scholar_link, p.DOI, p.bibtex is not None, p.getFileName() if p.downloaded else "",
+            p.year, p.scholar_page, p.jurnal, p.downloaded, DOWNLOAD_SOURCES.get(p.downloadedFrom, ""), p.authors]
+
+
+def paperKey(DOI, title):
+    if DOI:
+        return "doi:" + DOI.strip().lower()
+    if title:
+        return "title:" + " ".join(title.lower().split())
+    return None
+
+
+def _isTrue(value):
+    # csv stores the Downloaded column as text, jsonl and parquet as a bool
+    return value is True or value == "True"
+
+
+def _bibtexField(entry, name):
+    # Value of a {...} or "..." field, nested braces included; booktitle doesn't match title
+    match = re.search(r"(?<![\w-])" + name + r"\s*=\s*([{\"])", entry, flags=re.IGNORECASE)
+    if match is None:
+        return None
+    start = match.end()
+    if match.group(1) == '"':
+        end = entry.find('"', start)
+        return entry[start:end] if end >= 0 else None
+    depth = 1
+    for i in range(start, len(entry)):
+        if entry[i] == "{":
+            depth += 1
+        elif entry[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return entry[start:i]
+    return None
+
+
+def bibtexKey(entry):
+    """Key of a BibTeX entry from its own doi or, if it has none, its title"""
+    title = _bibtexField(entry, "title")
+    return paperKey(_bibtexField(entry, "doi"), title.replace("{", "").replace("}", "") if title else None)
+
+
+def _truncateToLastLine(path):
+    # A crash can leave half a line at the end of the file, it is dropped before appending
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        if tail.endswith(b"\n"):
+            return
+        cut = tail.rfind(b"\n")
+        f.truncate(size - len(tail) + cut + 1 if cut >= 0 else 0)
+
+
+class _Writer(abc.ABC):
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.keys = set()
+        # Papers of the resumed output that were downloaded
+        self.downloaded = set()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        resume = resume and os.path.exists(path) and os.path.getsize(path) > 0
+        if resume:
+            self._resume()
+        self._open(resume)
+
+    def _resume(self):
+        pass
+
+    def _key(self, p):
+        return paperKey(p.DOI, p.title)
+
+    def _resumeRow(self, DOI, title, downloaded):
+        key = paperKey(DOI, title)
+        self.keys.add(key)
+        if _isTrue(downloaded):
+            self.downloaded.add(key)
+
+    @abc.abstractmethod
+    def _open(self, resume):
+        """Open self._file, appending to the existing output if resume is true"""
+
+    @abc.abstractmethod
+    def _write(self, p):
+        """Write one paper to self._file"""
+
+    def _flush(self):
+        self._file.flush()
+
+    def write(self, p):
+        """Append a paper unless it is already in the output"""
+        key = self._key(p)
+        if key is not None:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+        self._write(p)
+        self._pending += 1
+        if self._pending >= FLUSH_EVERY or time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+        return True
+
+    def flush(self):
+        self._flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class CSVReportWriter(_Writer):
+
+    def _resume(self):
+        _truncateToLastLine(self.path)
+        with open(self.path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                self._resumeRow(row.get("DOI"), row.get("Name"), row.get("Downloaded"))
+
+    def _open(self, resume):
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file, lineterminator=os.linesep)
+        if not resume:
+            self._writer.writerow(REPORT_HEADERS)
+
+    def _write(self, p):
+        self._writer.writerow(reportRow(p))
+
+
+class JSONLReportWriter(_Writer):
+
+    def _resume(self):
+        _truncateToLastLine(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    self._resumeRow(row.get("DOI"), row.get("Name"), row.get("Downloaded"))
+
+    def _open(self, resume):
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+
+    def _write(self, p):
+        self._file.write(json.dumps(dict(zip(REPORT_HEADERS, reportRow(p))), ensure_ascii=False) + "\n")
+
+
+class ParquetReportWriter(_Writer):
+    """
+    Parquet files can't be appended to, so rows are written in row groups to a
+    temporary file that replaces the output on close. Until then the previous
+    output, if any, stays intact; on resume its rows are copied first.
+    """
+
+    def __init__(self, path, resume=False):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self._pq = pq
+        types = {"Bibtex": pa.bool_(), "Downloaded": pa.bool_()}
+        self._schema = pa.schema([(h, types.get(h, pa.string())) for h in REPORT_HEADERS])
+        self._rows = []
+        self._previous = None
+        super().__init__(path, resume)
+
+    def _resume(self):
+        self._previous = self._pq.read_table(self.path, schema=self._schema)
+        for DOI, title, downloaded in zip(self._previous.column("DOI").to_pylist(),
+                                          self._previous.column("Name").to_pylist(),
+                                          self._previous.column("Downloaded").to_pylist()):
+            self._resumeRow(DOI, title, downloaded)
+
+    def _open(self, resume):
+        self._part_path = self.path + ".part"
+        self._file = self._pq.ParquetWriter(self._part_path, self._schema)
+        if self._previous is not None:
+            self._file.write_table(self._previous)
+            self._previous = None
+
+    def _write(self, p):
+        row = reportRow(p)
+        self._rows.append([value if isinstance(value, bool) or value is None else str(value) for value in row])
+
+    def _flush(self):
+        if self._rows:
+            columns = list(zip(*self._rows))
+            self._file.write_table(self._pa.Table.from_arrays(
+                [self._pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+                schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        super().close()
+        os.replace(self._part_path, self.path)
+
+
+class BibtexWriter(_Writer):
+    """Entries are keyed by the doi or title written in the entry itself, so resume finds the same keys"""
+
+    def _resume(self):
+        with open(self.path, encoding="latin-1") as f:
+            for entry in re.split(r"(?=@[A-Za-z]+\s*\{)", f.read()):
+                key = bibtexKey(entry)
+                if key is not None:
+                    self.keys.add(key)
+
+    def _key(self, p):
+        return bibtexKey(self._content(p))
+
+    def _open(self, resume):
+        self._file = open(self.path, "a" if resume else "w", encoding="latin-1", errors="ignore")
+
+    def write(self, p):
+        if p.bibtex is None:
+            return False
+        return super().write(p)
+
+    @staticmethod
+    def _content(p):
+        content = p.bibtex + "\n"
+        relace_list = ["\\ast", "*", "#"]
+        for c in relace_list:
+            content = content.replace(c, "")
+        return content
+
+    def _write(self, p):
+        self._file.write(self._content(p))
+
+
+REPORT_WRITERS = {"csv": CSVReportWriter, "jsonl": JSONLReportWriter, "parquet": ParquetReportWriter}
+
+
+def openWriters(dwn_dir, formats=("csv",), resume=False):
+    """Open the report writers of the given formats plus the BibTeX writer"""
+    writers = []
+    try:
+        for fmt in formats:
+            writers.append(REPORT_WRITERS[fmt](os.path.join(dwn_dir, "result." + fmt), resume))
+        writers.append(BibtexWriter(os.path.join(dwn_dir, "bibtex.bib"), resume))
+    except Exception:
+        for writer in writers:
+            writer.close()
+        raise
+    return writers
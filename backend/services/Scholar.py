@@ -1,67 +1,157 @@
-import time
-import requests
+import queue
+import threading
+from .http_client import http_get
 import functools
-import undetected_chromedriver as uc
-from selenium.webdriver.chrome.options import Options
-from .HTMLparsers import schoolarParser
+from .HTMLparsers import schoolarParser, isBlockedPage
+from .block_recovery import get_block_recovery
+from .browser_pool import get_browser_pool
 from .Crossref import getPapersInfo
 from .NetInfo import NetInfo
 
+# Pages waiting between the stages of the crawl
+PIPELINE_QUEUE_SIZE = 2
+_DONE = object()
 
-def waithIPchange():
-    while True:
-        inp = input('You have been blocked, try changing your IP or using a VPN. '
-                    'Press Enter to continue downloading, or type "exit" to stop and exit....')
-        if inp.strip().lower() == "exit":
-            return False
-        elif not inp.strip():
-            print("Wait 30 seconds...")
-            time.sleep(30)
+
+def _put(q, item, stop):
+    # Waits for room in the queue unless the consumer has stopped reading
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
             return True
+        except queue.Full:
+            pass
+    return False
 
 
-def scholar_requests(scholar_pages, url, restrict, chrome_version, scholar_results=10):
-    javascript_error = "Sorry, we can't verify that you're not a robot when JavaScript is turned off"
-    to_download = []
-    driver = None
-    for i in scholar_pages:
-        while True:
-            res_url = url % (scholar_results * (i - 1))
-            if chrome_version is not None:
-                if driver is None:
-                    print("Using Selenium driver")
-                    options = Options()
-                    options.add_argument('--headless')
-                    driver = uc.Chrome(headless=True, use_subprocess=False, version_main=chrome_version)
-                driver.get(res_url)
-                html = driver.page_source
-            else:
-                html = requests.get(res_url, headers=NetInfo.HEADERS)
-                html = html.text
-
-            if javascript_error in html:
-                is_continue = waithIPchange()
-                if not is_continue:
-                    return to_download
-            else:
-                break
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            pass
+    return _DONE
+
 
+def _stage(work, inbox, out, stop):
+    # Runs work on every item of inbox and forwards its results; errors travel downstream
+    try:
+        while True:
+            item = _get(inbox, stop)
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                _put(out, item, stop)
+                continue
+            for result in work(item):
+                if not _put(out, result, stop):
+                    return
+    except Exception as e:
+        _put(out, e, stop)
+    finally:
+        _put(out, _DONE, stop)
+
+
+def _fetchPage(res_url, chrome_version, recovery):
+    if chrome_version is None:
+        return http_get(res_url, headers=NetInfo.HEADERS, proxies=recovery.proxies()).text
+
+    with get_browser_pool(chrome_version).lease() as lease:
+        lease.driver.get(res_url)
+        html = lease.driver.page_source
+        # A blocked browser is replaced instead of being reused
+        if isBlockedPage(html):
+            lease.recycle()
+        return html
+
+
+def _fetchPages(scholar_pages, url, chrome_version, scholar_results, out, stop):
+    recovery = get_block_recovery()
+    try:
+        for i in scholar_pages:
+            attempt = 0
+            while True:
+                res_url = url % (scholar_results * (i - 1))
+                recovery.check(res_url)
+                html = _fetchPage(res_url, chrome_version, recovery)
+
+                if isBlockedPage(html):
+                    # Raises ScholarBlockedError when the strategy gives up
+                    recovery.recover(res_url, attempt)
+                    attempt += 1
+                else:
+                    break
+
+            if not _put(out, (i, html), stop):
+                return
+    except Exception as e:
+        _put(out, e, stop)
+    finally:
+        _put(out, _DONE, stop)
+
+
+def _parsePage(scholar_results):
+    def work(page):
+        i, html = page
         papers = schoolarParser(html)
         if len(papers) > scholar_results:
             papers = papers[0:scholar_results]
 
-        print("\nGoogle Scholar page {} : {} papers found".format(i, scholar_results))
-
+        print("\nGoogle Scholar page {} : {} papers found".format(i, len(papers)))
         if len(papers) > 0:
-            papersInfo = getPapersInfo(papers, url, restrict, scholar_results)
-            info_valids = functools.reduce(lambda a, b: a + 1 if b.DOI is not None else a, papersInfo, 0)
-            print("Papers found on Crossref: {}/{}\n".format(info_valids, len(papers)))
-
-            to_download.append(papersInfo)
+            yield papers
         else:
             print("Paper not found...")
+    return work
+
 
-    return to_download
+def _resolvePage(url, restrict, scholar_results):
+    def work(papers):
+        papersInfo = getPapersInfo(papers, url, restrict, scholar_results)
+        info_valids = functools.reduce(lambda a, b: a + 1 if b.DOI is not None else a, papersInfo, 0)
+        print("Papers found on Crossref: {}/{}\n".format(info_valids, len(papers)))
+        yield from papersInfo
+    return work
+
+
+def _iterResults(results, stop):
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+"""
+Input
+    scholar_pages: pages to crawl
+    url: Scholar search url with a %d placeholder for the result offset
+Output
+    generator of Paper, yielded as soon as each page has been resolved on Crossref.
+    Page fetching, HTML parsing and Crossref resolution run in separate threads joined
+    by bounded queues, so the next page is fetched while the current one is resolved.
+"""
+def scholar_requests(scholar_pages, url, restrict, chrome_version, scholar_results=10):
+    stop = threading.Event()
+    pages = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    parsed = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    results = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE * scholar_results)
+
+    threads = [
+        threading.Thread(target=_fetchPages, args=(scholar_pages, url, chrome_version, scholar_results, pages, stop)),
+        threading.Thread(target=_stage, args=(_parsePage(scholar_results), pages, parsed, stop)),
+        threading.Thread(target=_stage, args=(_resolvePage(url, restrict, scholar_results), parsed, results, stop)),
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    return _iterResults(results, stop)
 
 
 def parseSkipList(skip_words):
@@ -92,6 +182,4 @@ def ScholarPapersInfo(query, scholar_pages, restrict, min_date=None, scholar_res
     if min_date:
         url += f"&as_ylo={min_date}"
 
-    to_download = scholar_requests(scholar_pages, url, restrict, chrome_version, scholar_results)
-
-    return [item for sublist in to_download for item in sublist]
+    return scholar_requests(scholar_pages, url, restrict, chrome_version, scholar_results)
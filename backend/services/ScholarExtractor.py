@@ -1,7 +1,8 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-import random
+from .http_client import http_get
+import re
+from .HTMLparsers import isBlockedPage, parseScholarResults
+from .block_recovery import ScholarBlockedError, get_block_recovery
+from .rate_limiter import RateLimitExceeded, get_rate_limiter
 from urllib.parse import quote_plus, urlencode
 
 class ScholarExtractor:
@@ -54,20 +55,23 @@ class ScholarExtractor:
         search_url = f"https://scholar.google.com/scholar?{urlencode(params)}"
         
         try:
-            # Añadir un retraso aleatorio para evitar bloqueos
-            time.sleep(random.uniform(1, 3))
-            
-            # Realizar la solicitud HTTP
-            response = requests.get(search_url, headers=self.headers, timeout=10)
-            
-            if response.status_code != 200:
+            # Tras un bloqueo reciente se falla enseguida en lugar de esperar a que acabe la
+            # pausa, si la estrategia de recuperación lo limita (max_wait)
+            recovery = get_block_recovery()
+            recovery.check(search_url)
+            # Realizar la solicitud HTTP (el planificador de peticiones limita el ritmo)
+            response = http_get(search_url, headers=self.headers, timeout=10,
+                                max_wait=getattr(recovery, 'max_wait', None))
+            
+            if response.status_code != 200 or isBlockedPage(response.text):
+                # Solo un bloqueo (403) o CAPTCHA reduce el ritmo de peticiones a Google Scholar;
+                # los 429 ya los penaliza http_get y los demás errores suelen ser pasajeros
+                if response.status_code == 403 or isBlockedPage(response.text):
+                    get_rate_limiter().penalize(search_url)
                 return None, f"Error al conectar con Google Scholar: {response.status_code}"
             
-            # Parsear el HTML con BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Buscar resultados
-            results = soup.select('.gs_r.gs_or.gs_scl')
+            # Analizar la página una sola vez con el parser compartido (lxml si está disponible)
+            results = parseScholarResults(response.text)
             if not results:
                 return None, "No se encontraron resultados en Google Scholar"
             
@@ -78,59 +82,42 @@ class ScholarExtractor:
             paper_info = {}
             
             # Título
-            title_tag = result.select_one('.gs_rt')
-            if title_tag:
-                paper_info['title'] = title_tag.get_text(strip=True).replace('[HTML]', '').replace('[PDF]', '').strip()
+            if result.heading:
+                paper_info['title'] = result.heading
             
             # Autores, año y fuente
-            meta_tag = result.select_one('.gs_a')
-            if meta_tag:
-                meta_text = meta_tag.get_text(strip=True)
+            meta_text = (result.meta or '').strip()
+            if '-' in meta_text:
                 # Intentar separar autores y fecha
-                if '-' in meta_text:
-                    authors_part = meta_text.split('-')[0].strip()
-                    paper_info['authors'] = authors_part
-                    
-                    # Extraer año
-                    import re
-                    year_match = re.search(r'\b(19|20)\d{2}\b', meta_text)
-                    if year_match:
-                        paper_info['year'] = year_match.group(0)
-                    
-                    # Extraer revista/fuente
-                    journal_parts = meta_text.split('-')
-                    if len(journal_parts) > 1:
-                        paper_info['journal'] = journal_parts[1].strip()
+                authors_part = meta_text.split('-')[0].strip()
+                paper_info['authors'] = authors_part
+                
+                # Extraer año
+                year_match = re.search(r'\b(19|20)\d{2}\b', meta_text)
+                if year_match:
+                    paper_info['year'] = year_match.group(0)
+                
+                # Extraer revista/fuente
+                journal_parts = meta_text.split('-')
+                if len(journal_parts) > 1:
+                    paper_info['journal'] = journal_parts[1].strip()
             
             # Abstract / Resumen
-            abstract_tag = result.select_one('.gs_fma_abs')
-            if not abstract_tag:
-                # Intentar buscar en el primer párrafo del contenido
-                abstract_tag = result.select_one('.gs_fma_snp')
-            elif not abstract_tag:
-                # Si no hay abstract, intentar buscar en el primer párrafo del contenido
-                abstract_tag = result.select_one('.gsh_csp')
-            if abstract_tag:
-                abstract_text = abstract_tag.get_text(strip=True)
-                # Eliminar indicadores de elipsis y limpiar
-                abstract_text = abstract_text.replace('…', '...').strip()
-                paper_info['abstract'] = abstract_text
+            if result.abstract:
+                paper_info['abstract'] = result.abstract
             
             # URL del artículo
-            url_tag = result.select_one('.gs_rt a')
-            if url_tag and 'href' in url_tag.attrs:
-                paper_info['url'] = url_tag['href']
+            if result.link:
+                paper_info['url'] = result.link
             
             # Número de citas
-            cite_tag = result.select_one('a:contains("Cited by")')
-            if cite_tag:
-                cite_text = cite_tag.get_text(strip=True)
-                cite_count = ''.join(filter(str.isdigit, cite_text))
-                if cite_count:
-                    paper_info['cited_by'] = int(cite_count)
+            if result.cites:
+                paper_info['cited_by'] = result.cites
             
             return paper_info, None
             
+        except (ScholarBlockedError, RateLimitExceeded) as e:
+            return None, f"Error al conectar con Google Scholar: {str(e)}"
         except Exception as e:
             return None, f"Error al extraer información de Google Scholar: {str(e)}"
     
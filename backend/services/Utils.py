@@ -1,2 +1,24 @@
+import os
+
+CACHE_DIR = os.getenv('RESEARCHER_CACHE_DIR',
+                      os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache'))
+
+
 def URLjoin(*args):
-    return "/".join(map(lambda x: str(x).rstrip('/'), args))
\ No newline at end of file
+    return "/".join(map(lambda x: str(x).rstrip('/'), args))
+
+
+def getCachePath(fname):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, fname)
+
+
+def normalizeDOI(doi):
+    if doi is None:
+        return None
+    doi = str(doi).strip()
+    for prefix in ("https://doi.org/", "http://doi.org/", "https://dx.doi.org/", "http://dx.doi.org/", "doi:"):
+        if doi.lower().startswith(prefix):
+            doi = doi[len(prefix):]
+            break
+    return doi.strip().lower()
@@ -5,57 +5,99 @@ import sys
 import os
 import time
 import requests
-from .Paper import Paper
+from .ReportWriters import openWriters, paperKey, BibtexWriter
 from .PapersFilters import filterJurnals, filter_min_date, similarStrings
-from .Downloader import downloadPapers
+from .Downloader import downloadPapers, DOWNLOAD_WORKERS
 from .Scholar import ScholarPapersInfo
-from .Crossref import getPapersInfoFromDOIs
-from .proxy import proxy
+from .Crossref import getPapersInfoFromDOIsBatch
+from .proxy import proxy, ProxyPool
+from .block_recovery import BackoffRecovery, InteractiveRecovery, ScholarBlockedError, set_block_recovery
 from urllib.parse import urljoin
 
 def start(query, scholar_results, scholar_pages, dwn_dir, proxy, min_date=None, num_limit=None, num_limit_type=None,
           filter_jurnal_file=None, restrict=None, DOIs=None, SciHub_URL=None, chrome_version=None, cites=None,
-          use_doi_as_filename=False, SciDB_URL=None, skip_words=None):
+          use_doi_as_filename=False, SciDB_URL=None, skip_words=None, report_formats=("csv",), resume=False, dwn_workers=DOWNLOAD_WORKERS):
 
     if SciDB_URL is not None and "/scidb" not in SciDB_URL:
         SciDB_URL = urljoin(SciDB_URL, "/scidb/")
 
-    to_download = []
     if DOIs is None:
         print("Query: {}".format(query))
         print("Cites: {}".format(cites))
-        to_download = ScholarPapersInfo(query, scholar_pages, restrict, min_date, scholar_results, chrome_version, cites, skip_words)
+        to_download = untilBlocked(ScholarPapersInfo(query, scholar_pages, restrict, min_date, scholar_results,
+                                                     chrome_version, cites, skip_words))
     else:
         print("Downloading papers from DOIs\n")
-        num = 1
-        i = 0
-        while i < len(DOIs):
-            DOI = DOIs[i]
-            print("Searching paper {} of {} with DOI {}".format(num, len(DOIs), DOI))
-            papersInfo = getPapersInfoFromDOIs(DOI, restrict)
-            papersInfo.use_doi_as_filename = use_doi_as_filename
-            to_download.append(papersInfo)
-
-            num += 1
-            i += 1
-
-    if restrict != 0 and to_download:
+        to_download = withDOIFilename(getPapersInfoFromDOIsBatch(DOIs, restrict), use_doi_as_filename)
+
+    if restrict != 0:
         if filter_jurnal_file is not None:
             to_download = filterJurnals(to_download, filter_jurnal_file)
 
         if min_date is not None:
             to_download = filter_min_date(to_download, min_date)
 
+        # Sorting needs every paper, so the stream is materialized only in that case
         if num_limit_type is not None and num_limit_type == 0:
-            to_download.sort(key=lambda x: int(x.year) if x.year is not None else 0, reverse=True)
+            to_download = sorted(to_download, key=lambda x: int(x.year) if x.year is not None else 0, reverse=True)
 
         if num_limit_type is not None and num_limit_type == 1:
-            to_download.sort(key=lambda x: int(x.cites_num) if x.cites_num is not None else 0, reverse=True)
+            to_download = sorted(to_download, key=lambda x: int(x.cites_num) if x.cites_num is not None else 0, reverse=True)
+
+    # Papers flow as a stream from the search to the downloader and each one is written
+    # to the reports as soon as the downloader is done with it
+    writers = openWriters(dwn_dir, report_formats, resume)
+
+    if resume:
+        # Papers already in the reports are not downloaded again, and the ones downloaded
+        # by the previous run count towards the limit
+        recorded = set()
+        downloaded = set()
+        for writer in writers:
+            if not isinstance(writer, BibtexWriter):
+                recorded |= writer.keys
+                downloaded |= writer.downloaded
+        if recorded:
+            print("Resuming: {} papers already processed, {} downloaded".format(len(recorded), len(downloaded)))
+        to_download = skipRecorded(to_download, recorded)
+        if num_limit is not None:
+            num_limit = max(num_limit - len(downloaded), 0)
+
+    def write(paper):
+        for writer in writers:
+            writer.write(paper)
+
+    try:
+        if restrict != 0:
+            downloadPapers(to_download, dwn_dir, num_limit, SciHub_URL, SciDB_URL, workers=dwn_workers,
+                           on_processed=write)
+        else:
+            for paper in to_download:
+                write(paper)
+    finally:
+        for writer in writers:
+            writer.close()
 
-        downloadPapers(to_download, dwn_dir, num_limit, SciHub_URL, SciDB_URL)
 
-    Paper.generateReport(to_download, dwn_dir + "result.csv")
-    Paper.generateBibtex(to_download, dwn_dir + "bibtex.bib")
+def untilBlocked(papers):
+    # A Scholar block stops the crawl; the papers found so far are still downloaded
+    try:
+        yield from papers
+    except ScholarBlockedError as e:
+        print(e)
+
+
+def skipRecorded(papers, keys):
+    # A sorted list stays a list so the downloader can still show the total
+    if isinstance(papers, list):
+        return [p for p in papers if paperKey(p.DOI, p.title) not in keys]
+    return (p for p in papers if paperKey(p.DOI, p.title) not in keys)
+
+
+def withDOIFilename(papers, use_doi_as_filename):
+    for paper in papers:
+        paper.use_doi_as_filename = use_doi_as_filename
+        yield paper
 
 
 def main():
@@ -100,6 +142,16 @@ def main():
                         help='Use proxychains, provide a seperated list of proxies to use.Please specify the argument al the end')
     parser.add_argument('--single-proxy', type=str, default=None,
                         help='Use a single proxy. Recommended if using --proxy gives errors')
+    parser.add_argument('--dwn-workers', default=DOWNLOAD_WORKERS, type=int,
+                        help='Number of papers downloaded at the same time (default {})'.format(DOWNLOAD_WORKERS))
+    parser.add_argument('--report-format', nargs='+', default=['csv'], choices=['csv', 'jsonl', 'parquet'],
+                        help='Formats of the results report (parquet requires pyarrow). Default: csv')
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='Continue the reports of a previous run in --dwn-dir instead of overwriting them')
+    parser.add_argument('--proxy-pool', nargs='+', default=[],
+                        help='HTTP(S) proxies to rotate through when Google Scholar blocks the current connection')
+    parser.add_argument('--wait-on-block', action='store_true', default=False,
+                        help='When Google Scholar blocks the connection, ask before continuing instead of backing off automatically')
     parser.add_argument('--selenium-chrome-version', type=int, default=None,
                         help='First three digits of the chrome version installed on your machine. If provided, selenium will be used for scholar search. It helps avoid bot detection but chrome must be installed.')
     parser.add_argument('--use-doi-as-filename', action='store_true', default=False,
@@ -117,6 +169,12 @@ def main():
         pchain = args.proxy
         proxy(pchain)
 
+    if args.wait_on_block:
+        set_block_recovery(InteractiveRecovery())
+    else:
+        proxy_pool = ProxyPool(args.proxy_pool) if args.proxy_pool else ProxyPool.fromEnv()
+        set_block_recovery(BackoffRecovery(proxy_pool=proxy_pool))
+
     if args.query is None and args.doi_file is None and args.doi is None and args.cites is None:
         print("Error, provide at least one of the following arguments: --query, --file, or --cites")
         sys.exit()
@@ -190,7 +248,7 @@ def main():
 
     start(args.query, args.scholar_results, scholar_pages, dwn_dir, proxy, args.min_year , max_dwn, max_dwn_type ,
           args.journal_filter, args.restrict, DOIs, args.scihub_mirror, args.selenium_chrome_version, args.cites,
-          args.use_doi_as_filename, args.annas_archive_mirror, args.skip_words)
+          args.use_doi_as_filename, args.annas_archive_mirror, args.skip_words, args.report_format, args.resume, args.dwn_workers)
 
 if __name__ == "__main__":
     main()
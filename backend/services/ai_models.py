@@ -1,89 +1,232 @@
+import concurrent.futures
+import hashlib
+import json
 import os
+import re
 import openai
 import google.generativeai as genai
 from dotenv import load_dotenv
+from .metadata_cache import get_metadata_cache
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Configurar OpenAI
-openai.api_key = os.getenv('OPENAI_API_KEY')
+# Configurar OpenAI; OPENAI_BASE_URL permite apuntar a un servidor local compatible
+# (p. ej. un simulador de la API para pruebas)
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+
+# Configurar Google Gemini; GEMINI_API_ENDPOINT cumple la misma función para Gemini
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+if GEMINI_API_ENDPOINT:
+    genai.configure(api_key=os.getenv('GOOGLE_API_KEY'), transport='rest',
+                    client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+else:
+    genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+
+SUMMARY_SECTIONS = ['objective', 'methodology', 'analysis', 'conclusions']
+NOT_AVAILABLE = 'No disponible'
+# Tamaño máximo (en tokens aproximados, ~4 caracteres por token) del texto enviado en
+# cada llamada; los documentos más largos se resumen por fragmentos (map-reduce)
+AI_CONTEXT_TOKENS = int(os.getenv('AI_CONTEXT_TOKENS', 12000))
+AI_CHUNK_CHARS = AI_CONTEXT_TOKENS * 4
+# Fragmentos resumidos a la vez
+AI_MAX_WORKERS = int(os.getenv('AI_MAX_WORKERS', 4))
+
+SYSTEM_PROMPT = "Eres un asistente experto en análisis de textos académicos."
+
+_JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+
+
+def content_hash(*parts):
+    """Hash SHA-256 del contenido con el que se identifica un resumen en la caché"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def split_into_chunks(text, max_chars=AI_CHUNK_CHARS):
+    """
+    Divide el texto en fragmentos de hasta max_chars caracteres, cortando por párrafos
+    y, si un párrafo no cabe, por oraciones o, en último caso, por caracteres
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    chunks = []
+    current = ''
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def parse_json_response(text):
+    """Extrae el objeto JSON de la respuesta del modelo (admite bloques ```json ... ```)"""
+    match = _JSON_OBJECT.search(text or '')
+    if match is None:
+        raise ValueError("La respuesta del modelo no contiene un objeto JSON")
+    return json.loads(match.group(0))
+
+
+def _sections_prompt(text, sections):
+    keys = ", ".join(f'"{section}"' for section in sections)
+    return f"""Analiza el siguiente texto académico y extrae a la vez todas estas secciones: {keys}.
+    Responde únicamente con un objeto JSON con exactamente esas claves y un texto breve para cada una.
+    Si no encuentras información específica para una sección, usa el valor '{NOT_AVAILABLE}'.
+    Texto: {text}"""
+
+
+def fit_partials(partials, max_chars):
+    """
+    Recorta por igual el texto de cada sección de los resúmenes parciales hasta que,
+    serializados en JSON, ocupan como mucho max_chars caracteres
+
+    Raises:
+        ValueError: Si no caben ni recortando todo el texto
+    """
+    limit = max(len(value) for partial in partials for value in partial.values())
+    while len(json.dumps(partials, ensure_ascii=False)) > max_chars:
+        if limit == 0:
+            raise ValueError("Los resúmenes parciales no caben en el contexto del modelo "
+                             f"({max_chars} caracteres); aumente AI_CONTEXT_TOKENS")
+        limit //= 2
+        partials = [{section: value[:limit] for section, value in partial.items()} for partial in partials]
+    return partials
+
+
+def _combine_prompt(partials, sections):
+    keys = ", ".join(f'"{section}"' for section in sections)
+    return f"""Los siguientes objetos JSON resumen, por partes y en orden, las secciones {keys} de un mismo texto académico.
+    Combínalos en un único objeto JSON con esas mismas claves, uniendo la información de todas las partes sin repetirla.
+    Usa '{NOT_AVAILABLE}' solo si ninguna parte tiene información de esa sección.
+    Partes: {json.dumps(partials, ensure_ascii=False)}"""
 
-# Configurar Google Gemini
-genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
 
 class AIModelManager:
-    def __init__(self):
+    """
+    Acceso a los modelos de OpenAI y Gemini. Los clientes se pueden inyectar (por
+    ejemplo, simuladores locales de las APIs); si no, se crean con la configuración
+    del entorno.
+    """
+
+    def __init__(self, openai_client=None, gemini_model=None, cache=None, max_workers=AI_MAX_WORKERS,
+                 chunk_chars=AI_CHUNK_CHARS):
         self.openai_model = "gpt-3.5-turbo"
-        self.gemini_model = genai.GenerativeModel('gemini-pro')
-    
-    def generate_summary_openai(self, text, sections=None):
+        self._openai_client = openai_client
+        self.gemini_model = gemini_model or genai.GenerativeModel('gemini-pro')
+        self._cache = cache
+        self.max_workers = max_workers
+        self.chunk_chars = chunk_chars
+
+    @property
+    def openai_client(self):
+        # Se crea con la primera llamada: sin OPENAI_API_KEY el constructor falla
+        if self._openai_client is None:
+            self._openai_client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'), base_url=OPENAI_BASE_URL)
+        return self._openai_client
+
+    @property
+    def cache(self):
+        return self._cache or get_metadata_cache()
+
+    def _complete(self, model, prompt, system=SYSTEM_PROMPT, json_response=False):
+        if model == 'openai':
+            options = {'response_format': {'type': 'json_object'}} if json_response else {}
+            response = self.openai_client.chat.completions.create(
+                model=self.openai_model,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ],
+                **options
+            )
+            return response.choices[0].message.content.strip()
+        response = self.gemini_model.generate_content(prompt)
+        return response.text.strip()
+
+    def _extract(self, model, prompt, sections):
+        result = parse_json_response(self._complete(model, prompt, json_response=True))
+        return {section: str(result.get(section) or NOT_AVAILABLE).strip() for section in sections}
+
+    def extract_sections(self, text, model='openai', sections=None):
         """
-        Genera un resumen usando OpenAI
+        Extrae todas las secciones del texto con una sola respuesta JSON. Los textos
+        que no caben en el contexto se dividen en fragmentos que se resumen en paralelo
+        y se combinan después (map-reduce). El resultado se guarda en caché por el hash
+        del contenido, así que volver a resumir el mismo artículo no hace llamadas.
+
+        Returns:
+            dict: Texto de cada sección ('No disponible' si no se encontró)
         """
+        sections = list(sections or SUMMARY_SECTIONS)
+        model_name = self.openai_model if model == 'openai' else getattr(self.gemini_model, 'model_name', 'gemini')
+        key = content_hash(model, model_name, ",".join(sections), text)
+        cached, summary = self.cache.get(key, "ai_summary")
+        if cached and summary:
+            return summary
+
+        chunks = split_into_chunks(text, self.chunk_chars)
+        if len(chunks) == 1:
+            summary = self._extract(model, _sections_prompt(text, sections), sections)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                partials = list(executor.map(
+                    lambda chunk: self._extract(model, _sections_prompt(chunk, sections), sections), chunks))
+                # Las combinaciones que no caben en el contexto se hacen por grupos, también en paralelo
+                while len(json.dumps(partials, ensure_ascii=False)) > self.chunk_chars and len(partials) > 2:
+                    groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+                    partials = list(executor.map(
+                        lambda group: group[0] if len(group) == 1 else self._extract(
+                            model, _combine_prompt(fit_partials(group, self.chunk_chars), sections), sections),
+                        groups))
+            # Si las dos últimas partes siguen sin caber, se recortan sus secciones
+            summary = self._extract(model, _combine_prompt(fit_partials(partials, self.chunk_chars), sections),
+                                    sections)
+
+        self.cache.set(key, "ai_summary", summary)
+        return summary
+
+    def _generate_summary(self, text, sections, model):
         try:
-            if sections is None:
-                sections = ['objective', 'methodology', 'analysis', 'conclusions']
-            
-            summary = {}
-            for section in sections:
-                prompt = f"""Analiza el siguiente texto y extrae la sección de {section}. 
-                Si no encuentras información específica para esta sección, indica 'No disponible'.
-                Texto: {text}"""
-                
-                response = openai.ChatCompletion.create(
-                    model=self.openai_model,
-                    messages=[
-                        {"role": "system", "content": "Eres un asistente experto en análisis de textos académicos."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                
-                summary[section] = response.choices[0].message.content.strip()
-            
             return {
                 'success': True,
-                'summary': summary,
-                'model': 'openai'
+                'summary': self.extract_sections(text, model, sections),
+                'model': model
             }
-        
+
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e),
-                'model': 'openai'
+                'model': model
             }
-    
+
+    def generate_summary_openai(self, text, sections=None):
+        """
+        Genera un resumen usando OpenAI
+        """
+        return self._generate_summary(text, sections, 'openai')
+
     def generate_summary_gemini(self, text, sections=None):
         """
         Genera un resumen usando Google Gemini
         """
-        try:
-            if sections is None:
-                sections = ['objective', 'methodology', 'analysis', 'conclusions']
-            
-            summary = {}
-            for section in sections:
-                prompt = f"""Analiza el siguiente texto y extrae la sección de {section}. 
-                Si no encuentras información específica para esta sección, indica 'No disponible'.
-                Texto: {text}"""
-                
-                response = self.gemini_model.generate_content(prompt)
-                summary[section] = response.text.strip()
-            
-            return {
-                'success': True,
-                'summary': summary,
-                'model': 'gemini'
-            }
-        
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'model': 'gemini'
-            }
-    
+        return self._generate_summary(text, sections, 'gemini')
+
     def find_related_papers_ai(self, text, context='', model='openai'):
         """
         Encuentra artículos relacionados usando IA
@@ -93,34 +236,23 @@ class AIModelManager:
             No incluyas las referencias que ya están citadas en el texto.
             Texto: {text}
             Contexto adicional: {context}
-            
+
             Proporciona las palabras clave en formato de lista, separadas por comas."""
-            
-            if model == 'openai':
-                response = openai.ChatCompletion.create(
-                    model=self.openai_model,
-                    messages=[
-                        {"role": "system", "content": "Eres un experto en investigación académica."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                keywords = response.choices[0].message.content.strip()
-            else:  # gemini
-                response = self.gemini_model.generate_content(prompt)
-                keywords = response.text.strip()
-            
+
+            keywords = self._complete(model, prompt, system="Eres un experto en investigación académica.")
+
             # Limpiar y formatear las palabras clave
             keywords = [k.strip() for k in keywords.split(',')]
-            
+
             return {
                 'success': True,
                 'keywords': keywords,
                 'model': model
             }
-        
+
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e),
                 'model': model
-            } 
\ No newline at end of file
+            }
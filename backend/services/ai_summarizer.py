@@ -1,7 +1,7 @@
-from transformers import pipeline
 import nltk
 from nltk.tokenize import sent_tokenize
 from .ai_models import AIModelManager
+from .summarization_models import get_summarization_model
 
 # Descargar recursos necesarios de NLTK
 try:
@@ -37,19 +37,17 @@ def generate_summary_transformers(text):
     Genera un resumen usando el modelo de transformers
     """
     try:
-        # Inicializar el modelo de resumen
-        summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-        
         # Dividir el texto en secciones si es muy largo
         sections = split_into_sections(text)
         
-        summaries = []
-        for section in sections:
-            if len(section.split()) > 100:  # Solo resumir secciones largas
-                summary = summarizer(section, max_length=130, min_length=30, do_sample=False)
-                summaries.append(summary[0]['summary_text'])
-            else:
-                summaries.append(section)
+        # Solo se resumen las secciones largas, todas en lote con el modelo compartido
+        summaries = list(sections)
+        long_sections = [i for i, section in enumerate(sections) if len(section.split()) > 100]
+        if long_sections:
+            section_summaries = get_summarization_model().summarize(
+                [sections[i] for i in long_sections], max_length=130, min_length=30)
+            for i, summary in zip(long_sections, section_summaries):
+                summaries[i] = summary
         
         # Organizar el resumen en secciones
         organized_summary = {
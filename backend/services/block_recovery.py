@@ -0,0 +1,127 @@
+import abc
+import os
+import random
+import threading
+from .proxy import ProxyPool
+from .rate_limiter import get_rate_limiter
+
+# Espera tras el primer bloqueo (se duplica en cada bloqueo seguido), espera máxima e
+# intentos antes de abandonar. SCHOLAR_BLOCK_MAX_WAIT limita cuánto puede esperar un hilo:
+# si la espera necesaria es mayor, se lanza ScholarBlockedError en lugar de esperar
+BLOCK_BASE_DELAY = float(os.getenv('SCHOLAR_BLOCK_BASE_DELAY', 30))
+BLOCK_MAX_DELAY = float(os.getenv('SCHOLAR_BLOCK_MAX_DELAY', 15 * 60))
+BLOCK_MAX_ATTEMPTS = int(os.getenv('SCHOLAR_BLOCK_MAX_ATTEMPTS', 5))
+BLOCK_MAX_WAIT = float(os.getenv('SCHOLAR_BLOCK_MAX_WAIT')) if os.getenv('SCHOLAR_BLOCK_MAX_WAIT') else None
+
+
+class ScholarBlockedError(Exception):
+    """Google Scholar bloqueó las peticiones (página de verificación de robots o CAPTCHA)"""
+
+    def __init__(self, url, attempts, retry_after=None):
+        self.url = url
+        self.attempts = attempts
+        self.retry_after = retry_after
+        if attempts:
+            message = "Google Scholar bloqueó la búsqueda tras {} intento(s)".format(attempts)
+        else:
+            message = "Google Scholar está en pausa tras un bloqueo reciente"
+        if retry_after:
+            message += ", reintente en {:.0f} s".format(retry_after)
+        super().__init__(message)
+
+
+class BlockRecovery(abc.ABC):
+    """
+    Estrategia de recuperación ante un bloqueo de Google Scholar. recover() se llama con
+    la URL bloqueada y el número de bloqueos seguidos; debe volver si se puede reintentar
+    o lanzar ScholarBlockedError si hay que abandonar.
+    """
+
+    def proxies(self):
+        """Proxies a usar en la siguiente petición (argumento proxies de requests)"""
+        return None
+
+    def check(self, url):
+        """Se llama antes de cada petición; puede lanzar ScholarBlockedError para no esperar"""
+
+    @abc.abstractmethod
+    def recover(self, url, attempt):
+        """Se llama tras cada bloqueo; vuelve para reintentar o lanza ScholarBlockedError"""
+
+
+class BackoffRecovery(BlockRecovery):
+    """
+    Recuperación automática: rota por el conjunto de proxies y, cuando todos están
+    bloqueados, aplica una espera exponencial a través del planificador de peticiones,
+    de modo que todos los hilos que usan Scholar frenan a la vez.
+    """
+
+    def __init__(self, base_delay=BLOCK_BASE_DELAY, max_delay=BLOCK_MAX_DELAY, max_attempts=BLOCK_MAX_ATTEMPTS,
+                 max_wait=BLOCK_MAX_WAIT, proxy_pool=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.max_wait = max_wait
+        self.proxy_pool = proxy_pool if proxy_pool is not None else ProxyPool.fromEnv()
+
+    def proxies(self):
+        return self.proxy_pool.current()
+
+    def delay(self, attempt):
+        # Mientras queden proxies sin probar en esta ronda no hace falta esperar
+        cycle = (attempt + 1) // (len(self.proxy_pool) + 1)
+        if cycle == 0:
+            return 0.0
+        delay = min(self.max_delay, self.base_delay * 2 ** (cycle - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def check(self, url):
+        if self.max_wait is None:
+            return
+        remaining = get_rate_limiter().cooldown_remaining(url)
+        if remaining > self.max_wait:
+            raise ScholarBlockedError(url, 0, remaining)
+
+    def recover(self, url, attempt):
+        delay = self.delay(attempt)
+        get_rate_limiter().penalize(url, delay)
+        if attempt + 1 >= self.max_attempts or (self.max_wait is not None and delay > self.max_wait):
+            raise ScholarBlockedError(url, attempt + 1, delay)
+        if len(self.proxy_pool) > 0:
+            self.proxy_pool.rotate()
+        if delay > 0:
+            print("Blocked by Google Scholar, waiting {:.0f} seconds...".format(delay))
+
+
+class InteractiveRecovery(BlockRecovery):
+    """Pregunta al usuario por consola si cambió de IP (comportamiento original de la CLI)"""
+
+    def recover(self, url, attempt):
+        while True:
+            inp = input('You have been blocked, try changing your IP or using a VPN. '
+                        'Press Enter to continue downloading, or type "exit" to stop and exit....')
+            if inp.strip().lower() == "exit":
+                raise ScholarBlockedError(url, attempt + 1)
+            elif not inp.strip():
+                print("Wait 30 seconds...")
+                get_rate_limiter().penalize(url, 30)
+                return
+
+
+_recovery = None
+_recovery_lock = threading.Lock()
+
+
+def get_block_recovery():
+    """Devuelve la estrategia de recuperación activa (por defecto BackoffRecovery)"""
+    global _recovery
+    with _recovery_lock:
+        if _recovery is None:
+            _recovery = BackoffRecovery()
+        return _recovery
+
+
+def set_block_recovery(recovery):
+    global _recovery
+    with _recovery_lock:
+        _recovery = recovery
@@ -0,0 +1,170 @@
+import atexit
+import os
+import threading
+import time
+
+# Navegadores simultáneos, páginas servidas por cada uno antes de reiniciarlo y espera
+# máxima para obtener un navegador libre
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))
+BROWSER_MAX_PAGES = int(os.getenv('BROWSER_MAX_PAGES', 50))
+BROWSER_LEASE_TIMEOUT = float(os.getenv('BROWSER_LEASE_TIMEOUT', 120))
+
+
+class _Browser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.recycle = False
+
+
+class BrowserLease:
+    """Préstamo de un navegador del pool; usar como gestor de contexto"""
+
+    def __init__(self, pool, browser):
+        self._pool = pool
+        self._browser = browser
+        self.driver = browser.driver
+
+    def recycle(self):
+        """Marca el navegador para cerrarlo al devolverlo (p. ej. tras un bloqueo)"""
+        self._browser.recycle = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._browser.pages += 1
+        # Un error del navegador suele dejarlo en mal estado, así que también se reinicia
+        if exc_type is not None:
+            self._browser.recycle = True
+        self._pool._release(self._browser)
+        return False
+
+
+class BrowserPool:
+    """
+    Pool de navegadores Chrome (undetected_chromedriver) sin interfaz, persistentes
+    entre búsquedas. Cada navegador se presta a una sola petición a la vez y se
+    reinicia tras max_pages páginas o cuando Google Scholar lo bloquea.
+    """
+
+    def __init__(self, chrome_version, size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES):
+        self.chrome_version = chrome_version
+        self.size = size
+        self.max_pages = max_pages
+        self._cond = threading.Condition()
+        self._idle = []
+        self._browsers = []
+        self._starting = 0
+        self._closed = False
+
+    def _start_browser(self):
+        import undetected_chromedriver as uc
+        print("Starting Chrome {} for Google Scholar".format(self.chrome_version))
+        driver = uc.Chrome(headless=True, use_subprocess=False, version_main=self.chrome_version)
+        return _Browser(driver)
+
+    def _quit(self, browser):
+        try:
+            browser.driver.quit()
+        except Exception as e:
+            print("Error closing Chrome: {}".format(e))
+
+    def _reserve(self):
+        # Debe llamarse con el lock tomado
+        if len(self._browsers) + self._starting < self.size:
+            self._starting += 1
+            return True
+        return False
+
+    def _launch(self):
+        try:
+            browser = self._start_browser()
+        except Exception:
+            with self._cond:
+                self._starting -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._starting -= 1
+            self._browsers.append(browser)
+        return browser
+
+    def warm_up(self):
+        """Arranca todos los navegadores del pool por adelantado"""
+        while True:
+            with self._cond:
+                if self._closed or not self._reserve():
+                    return
+            browser = self._launch()
+            self._release(browser)
+
+    def lease(self, timeout=BROWSER_LEASE_TIMEOUT):
+        """
+        Presta un navegador libre, arrancando uno nuevo si el pool aún no está completo
+
+        Returns:
+            BrowserLease: Préstamo con el driver en .driver
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed")
+                if self._idle:
+                    return BrowserLease(self, self._idle.pop())
+                if self._reserve():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("No browser available after {} seconds".format(timeout))
+                self._cond.wait(remaining)
+        return BrowserLease(self, self._launch())
+
+    def _release(self, browser):
+        with self._cond:
+            retire = self._closed or browser.recycle or browser.pages >= self.max_pages
+            if retire:
+                if browser in self._browsers:
+                    self._browsers.remove(browser)
+            else:
+                self._idle.append(browser)
+            self._cond.notify()
+        if retire:
+            self._quit(browser)
+
+    def close(self):
+        """Cierra todos los navegadores del pool"""
+        with self._cond:
+            self._closed = True
+            browsers = list(self._browsers)
+            self._browsers.clear()
+            self._idle.clear()
+            self._cond.notify_all()
+        for browser in browsers:
+            self._quit(browser)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_browser_pool(chrome_version):
+    """Devuelve el pool compartido para una versión de Chrome"""
+    with _pools_lock:
+        pool = _pools.get(chrome_version)
+        if pool is None:
+            pool = BrowserPool(chrome_version)
+            _pools[chrome_version] = pool
+        return pool
+
+
+def close_browser_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_browser_pools)
@@ -0,0 +1,209 @@
+import atexit
+import os
+import sqlite3
+import threading
+import numpy as np
+from scipy import sparse
+from .Utils import getCachePath, normalizeDOI
+
+
+class CitationGraph:
+    """
+    Grafo de citas DOI→DOI construido con las listas de referencias de los registros de
+    Crossref. Las aristas se guardan en SQLite y, para consultar, se cargan como matriz
+    de adyacencia CSR (fila: artículo que cita, columna: artículo citado) junto con su
+    traspuesta. La matriz se guarda en disco al cerrar y se reconstruye desde SQLite si
+    la copia no está al día; las aristas nuevas se suman a la matriz en memoria.
+    """
+
+    def __init__(self, db_path=None, snapshot_path=None):
+        self.db_path = db_path or getCachePath('citation_graph.sqlite')
+        self.snapshot_path = snapshot_path or os.path.splitext(self.db_path)[0] + '.npz'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # fetched: ya se consultó su lista de referencias en Crossref
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS nodes (
+                id INTEGER PRIMARY KEY,
+                doi TEXT NOT NULL UNIQUE,
+                fetched INTEGER NOT NULL DEFAULT 0
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS edges (
+                source INTEGER NOT NULL,
+                target INTEGER NOT NULL,
+                PRIMARY KEY (source, target)
+            ) WITHOUT ROWID""")
+        self._conn.commit()
+        self._cites = None
+        self._cited_by = None
+        self._pending = []
+        self._saved = True
+
+    def _node_ids(self, dois):
+        self._conn.executemany("INSERT OR IGNORE INTO nodes (doi) VALUES (?)", [(doi,) for doi in dois])
+        placeholders = ",".join("?" * len(dois))
+        return dict(self._conn.execute(f"SELECT doi, id FROM nodes WHERE doi IN ({placeholders})", dois).fetchall())
+
+    def record_works(self, works):
+        """
+        Registra las referencias de registros de Crossref (diccionarios con 'DOI' y
+        'reference'); solo cuentan las referencias que incluyen DOI. Los artículos se
+        marcan como consultados aunque Crossref no tenga su lista de referencias.
+
+        Returns:
+            int: Número de aristas nuevas
+        """
+        edges = set()
+        citing = set()
+        for work in works:
+            if not work or not work.get("DOI"):
+                continue
+            source = normalizeDOI(work["DOI"])
+            citing.add(source)
+            for reference in work.get("reference") or []:
+                if reference.get("DOI"):
+                    target = normalizeDOI(reference["DOI"])
+                    if target != source:
+                        edges.add((source, target))
+        if not citing:
+            return 0
+
+        with self._lock:
+            ids = self._node_ids(sorted(citing | {doi for edge in edges for doi in edge}))
+            self._conn.executemany("UPDATE nodes SET fetched = 1 WHERE id = ?", [(ids[doi],) for doi in citing])
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO edges (source, target) VALUES (?, ?)",
+                                   [(ids[source], ids[target]) for source, target in edges])
+            added = self._conn.total_changes - before
+            self._conn.commit()
+            if added:
+                self._pending.extend((ids[source], ids[target]) for source, target in edges)
+        return added
+
+    def is_fetched(self, doi):
+        """Indica si ya se registró la lista de referencias del artículo"""
+        with self._lock:
+            row = self._conn.execute("SELECT fetched FROM nodes WHERE doi = ?", (normalizeDOI(doi),)).fetchone()
+        return bool(row and row[0])
+
+    def _load(self):
+        num_nodes = (self._conn.execute("SELECT MAX(id) FROM nodes").fetchone()[0] or 0) + 1
+        num_edges = self._conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+        if os.path.exists(self.snapshot_path):
+            with np.load(self.snapshot_path) as snapshot:
+                if int(snapshot["num_edges"]) == num_edges:
+                    cites = sparse.csr_matrix(
+                        (np.ones(len(snapshot["indices"]), dtype=np.float32), snapshot["indices"], snapshot["indptr"]),
+                        shape=(int(snapshot["num_nodes"]), int(snapshot["num_nodes"])))
+                    return self._resize(cites, num_nodes)
+
+        edges = np.array(self._conn.execute("SELECT source, target FROM edges").fetchall(),
+                         dtype=np.int32).reshape(-1, 2)
+        self._saved = False
+        return sparse.csr_matrix((np.ones(len(edges), dtype=np.float32), (edges[:, 0], edges[:, 1])),
+                                 shape=(num_nodes, num_nodes))
+
+    @staticmethod
+    def _resize(matrix, num_nodes):
+        if matrix.shape[0] >= num_nodes:
+            return matrix
+        matrix = matrix.tocoo()
+        return sparse.csr_matrix((matrix.data, (matrix.row, matrix.col)), shape=(num_nodes, num_nodes))
+
+    def _matrices(self):
+        if self._cites is None:
+            self._cites = self._load()
+            self._pending = []
+        elif self._pending:
+            num_nodes = (self._conn.execute("SELECT MAX(id) FROM nodes").fetchone()[0] or 0) + 1
+            edges = np.array(self._pending, dtype=np.int32)
+            new = sparse.csr_matrix((np.ones(len(edges), dtype=np.float32), (edges[:, 0], edges[:, 1])),
+                                    shape=(num_nodes, num_nodes))
+            self._cites = self._resize(self._cites, num_nodes) + new
+            # Una arista ya presente en la matriz cuenta una sola vez
+            self._cites.data[:] = 1
+            self._pending = []
+            self._cited_by = None
+            self._saved = False
+        if self._cited_by is None:
+            self._cited_by = self._cites.T.tocsr()
+        return self._cites, self._cited_by
+
+    def related(self, doi, k=10):
+        """
+        Artículos más cercanos a uno en el grafo: co-citados con él (aparecen en las
+        mismas listas de referencias), con referencias en común (acoplamiento
+        bibliográfico) o enlazados directamente. Cada relación se obtiene con un único
+        producto de matrices dispersas.
+
+        Returns:
+            list: Diccionarios con doi, cocitations, coupling, direct y score, de mayor a menor score
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM nodes WHERE doi = ?", (normalizeDOI(doi),)).fetchone()
+            if row is None:
+                return []
+            node = row[0]
+            cites, cited_by = self._matrices()
+
+            cocitations = (cited_by[node] @ cites).toarray().ravel()
+            coupling = (cites[node] @ cited_by).toarray().ravel()
+            direct = (cites[node] + cited_by[node]).toarray().ravel()
+            scores = cocitations + coupling + direct
+            scores[node] = 0
+
+            found = np.flatnonzero(scores)
+            order = found[np.argsort(-scores[found], kind='stable')[:k]]
+            if not len(order):
+                return []
+            ids = [int(i) for i in order]
+            placeholders = ",".join("?" * len(ids))
+            dois = dict(self._conn.execute(f"SELECT id, doi FROM nodes WHERE id IN ({placeholders})", ids).fetchall())
+
+        return [{"doi": dois[i], "cocitations": int(cocitations[i]), "coupling": int(coupling[i]),
+                 "direct": int(direct[i]), "score": float(scores[i])} for i in ids]
+
+    def save(self):
+        """Guarda en disco la matriz CSR para no reconstruirla desde SQLite al arrancar"""
+        with self._lock:
+            if self._cites is None or (self._saved and not self._pending):
+                return
+            cites, _ = self._matrices()
+            num_edges = self._conn.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+            part_path = self.snapshot_path + '.part.npz'
+            np.savez(part_path, indptr=cites.indptr, indices=cites.indices,
+                     num_nodes=cites.shape[0], num_edges=num_edges)
+            os.replace(part_path, self.snapshot_path)
+            self._saved = True
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_citation_graph():
+    """Devuelve la instancia compartida del grafo de citas"""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = CitationGraph()
+        return _graph
+
+
+def record_crossref_works(works):
+    """Registra las referencias de registros de Crossref sin que un fallo interrumpa la consulta"""
+    try:
+        return get_citation_graph().record_works(works)
+    except Exception as e:
+        print(f"Error al registrar referencias: {str(e)}")
+        return 0
+
+
+def save_citation_graph():
+    if _graph is not None:
+        _graph.save()
+
+
+atexit.register(save_citation_graph)
@@ -0,0 +1,169 @@
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+import numpy as np
+from .Utils import normalizeDOI
+
+# Parámetros de MinHash/LSH: 64 permutaciones en 16 bandas de 4 filas detectan como
+# candidatos los pares con similitud de Jaccard a partir de ~0.5
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 4
+SIMILARITY_THRESHOLD = 0.8
+# Longitud mínima de un título truncado para considerarlo prefijo de otro
+MIN_PREFIX_LENGTH = 20
+PREFIX_WORDS = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+
+def normalize_title(title):
+    """Normaliza un título: sin acentos, en minúsculas, sin puntuación ni elipsis final"""
+    if not title:
+        return ""
+    title = unicodedata.normalize('NFKD', str(title))
+    title = ''.join(c for c in title if not unicodedata.combining(c))
+    title = title.lower().replace('…', ' ').rstrip('. ')
+    return re.sub(r'[\W_]+', ' ', title).strip()
+
+
+def title_shingles(normalized_title, k=SHINGLE_SIZE):
+    """Conjunto de n-gramas de caracteres del título normalizado"""
+    if len(normalized_title) <= k:
+        return {normalized_title} if normalized_title else set()
+    return {normalized_title[i:i + k] for i in range(len(normalized_title) - k + 1)}
+
+
+def minhash_signature(shingles):
+    # Hash estable (CRC32) de cada n-grama y permutaciones (a*x + b) mod p vectorizadas
+    hashes = np.array([zlib.crc32(s.encode('utf-8')) for s in shingles], dtype=np.uint64)
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % np.uint64(_MERSENNE_PRIME)
+    return permuted.min(axis=1)
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _is_truncation(a, b):
+    shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+    return len(shorter) >= MIN_PREFIX_LENGTH and longer.startswith(shorter)
+
+
+def _is_empty(value):
+    return value is None or value == "" or value == [] or value == {}
+
+
+def merge_records(records):
+    """
+    Fusiona registros duplicados conservando el valor más completo de cada campo:
+    el texto o la lista más larga y el mayor número de citas
+    """
+    merged = dict(records[0])
+    for record in records[1:]:
+        for key, value in record.items():
+            current = merged.get(key)
+            if _is_empty(value):
+                continue
+            if _is_empty(current):
+                merged[key] = value
+            elif key == "source":
+                continue
+            elif isinstance(current, (int, float)) and isinstance(value, (int, float)):
+                merged[key] = max(current, value)
+            elif isinstance(current, (str, list)) and isinstance(value, (str, list)) and len(value) > len(current):
+                merged[key] = value
+
+    sources = []
+    for record in records:
+        for source in record.get("sources") or [record.get("source")]:
+            if source and source not in sources:
+                sources.append(source)
+    if sources:
+        merged["sources"] = sources
+    return merged
+
+
+def deduplicate_papers(papers, threshold=SIMILARITY_THRESHOLD):
+    """
+    Elimina duplicados de una lista de resultados (diccionarios con 'title' y 'doi').
+    Dos registros se fusionan si comparten DOI o si sus títulos normalizados son casi
+    idénticos (Jaccard de n-gramas >= threshold) o uno es una versión truncada del otro.
+    Los candidatos se obtienen con MinHash/LSH y un índice de prefijos, en tiempo casi lineal.
+
+    Returns:
+        list: Registros fusionados, en el orden de su primera aparición
+    """
+    n = len(papers)
+    parent = list(range(n))
+    component_dois = [set() for _ in range(n)]
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri == rj:
+            return
+        # No se fusionan grupos con DOIs distintos (p. ej. preprint y fe de erratas)
+        if component_dois[ri] and component_dois[rj] and component_dois[ri] != component_dois[rj]:
+            return
+        if rj < ri:
+            ri, rj = rj, ri
+        parent[rj] = ri
+        component_dois[ri] |= component_dois[rj]
+
+    titles = []
+    shingle_sets = []
+    by_doi = {}
+    buckets = defaultdict(list)
+
+    for i, paper in enumerate(papers):
+        doi = normalizeDOI(paper.get("doi")) if paper.get("doi") else None
+        if doi:
+            component_dois[i].add(doi)
+        title = normalize_title(paper.get("title"))
+        shingles = title_shingles(title)
+        titles.append(title)
+        shingle_sets.append(shingles)
+
+        if doi:
+            if doi in by_doi:
+                union(by_doi[doi], i)
+            else:
+                by_doi[doi] = i
+
+        if not shingles:
+            continue
+        signature = minhash_signature(shingles)
+        for band in range(BANDS):
+            band_key = (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+            buckets[band_key].append(i)
+        buckets[("prefix", " ".join(title.split()[:PREFIX_WORDS]))].append(i)
+
+    checked = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        for a_index, a in enumerate(members):
+            for b in members[a_index + 1:]:
+                if (a, b) in checked:
+                    continue
+                checked.add((a, b))
+                if _jaccard(shingle_sets[a], shingle_sets[b]) >= threshold or _is_truncation(titles[a], titles[b]):
+                    union(a, b)
+
+    groups = defaultdict(list)
+    for i in range(n):
+        groups[find(i)].append(papers[i])
+    return [merge_records(groups[root]) for root in sorted(groups)]
@@ -0,0 +1,187 @@
+import concurrent.futures
+import json
+import os
+import threading
+import time
+import uuid
+from .pdf_store import get_pdf_store
+
+# Estados posibles de un trabajo
+QUEUED = "queued"
+RESOLVING = "resolving"
+DOWNLOADING = "downloading"
+DONE = "done"
+FAILED = "failed"
+FINAL_STATES = (DONE, FAILED)
+
+MAX_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', 4))
+MAX_PENDING_JOBS = int(os.getenv('DOWNLOAD_MAX_PENDING', 100))
+JOB_TTL = int(os.getenv('DOWNLOAD_JOB_TTL', 3600))
+
+
+class QueueFullError(Exception):
+    """Se lanza cuando hay demasiados trabajos pendientes para aceptar uno nuevo"""
+
+
+class Job:
+    """Trabajo de búsqueda de enlace o de descarga de un artículo"""
+
+    def __init__(self, kind, doi, download_link=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.doi = doi
+        self.download_link = download_link
+        self.state = QUEUED
+        self.message = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def update(self, state=None, message=None, result=None, error=None):
+        with self.condition:
+            if state is not None:
+                self.state = state
+            if message is not None:
+                self.message = message
+            if result is not None:
+                self.result = result
+            if error is not None:
+                self.error = error
+            self.updated_at = time.time()
+            self.version += 1
+            self.condition.notify_all()
+
+    def is_finished(self):
+        return self.state in FINAL_STATES
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "doi": self.doi,
+            "state": self.state,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobManager:
+    """
+    Ejecuta la búsqueda de enlaces y la descarga de PDFs en un conjunto acotado de
+    hilos, para no bloquear los hilos de Flask. Los trabajos activos para el mismo
+    DOI se reutilizan en lugar de lanzarse dos veces.
+    """
+
+    def __init__(self, download_dir, max_workers=MAX_WORKERS, max_pending=MAX_PENDING_JOBS, job_ttl=JOB_TTL):
+        self.download_dir = download_dir
+        self.store = get_pdf_store(download_dir)
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="download-job")
+        self._jobs = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def submit_resolve(self, doi):
+        """Crea (o reutiliza) un trabajo que solo busca el enlace de descarga"""
+        return self._submit("resolve", doi)
+
+    def submit_download(self, doi, download_link=None):
+        """Crea (o reutiliza) un trabajo que busca el enlace si hace falta y descarga el PDF"""
+        return self._submit("download", doi, download_link)
+
+    def _submit(self, kind, doi, download_link=None):
+        key = (kind, doi.lower())
+        with self._lock:
+            self._purge()
+            job_id = self._active.get(key)
+            if job_id is not None and not self._jobs[job_id].is_finished():
+                return self._jobs[job_id]
+
+            pending = sum(1 for job in self._jobs.values() if not job.is_finished())
+            if pending >= self.max_pending:
+                raise QueueFullError("Hay demasiados trabajos pendientes, inténtelo más tarde")
+
+            job = Job(kind, doi, download_link)
+            self._jobs[job.id] = job
+            self._active[key] = job.id
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def _purge(self):
+        limit = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.is_finished() and job.updated_at < limit]:
+            del self._jobs[job_id]
+        self._active = {key: job_id for key, job_id in self._active.items() if job_id in self._jobs}
+
+    def _run(self, job):
+        from .paper_service import download_from_scihub, download_paper_from_link
+
+        try:
+            # Si el PDF ya está en el almacén no hace falta usar la red
+            if job.kind == "download":
+                stored = self.store.lookup(job.doi)
+                if stored is not None:
+                    job.update(state=DONE, result={"download_link": job.download_link, "pdf_url": f"/pdf/{stored}"})
+                    return
+
+            download_link = job.download_link
+            if not download_link:
+                job.update(state=RESOLVING, message="Buscando enlace de descarga")
+                download_link = download_from_scihub(job.doi, None, get_link_only=True)
+                if not download_link:
+                    job.update(state=FAILED, error="No se encontró un enlace de descarga")
+                    return
+
+            if job.kind == "resolve":
+                job.update(state=DONE, result={"download_link": download_link})
+                return
+
+            job.update(state=DOWNLOADING, message="Descargando PDF")
+            pdf_path = os.path.join(self.download_dir, f"{job.doi.replace('/', '_')}.pdf.download")
+            if not download_paper_from_link(download_link, pdf_path):
+                job.update(state=FAILED, error="No se pudo descargar el artículo")
+                return
+            pdf_filename = self.store.add(job.doi, pdf_path)
+
+            job.update(state=DONE, result={"download_link": download_link, "pdf_url": f"/pdf/{pdf_filename}"})
+        except Exception as e:
+            job.update(state=FAILED, error=str(e))
+
+    def iter_events(self, job_id, keepalive=15):
+        """
+        Generador de eventos Server-Sent Events con el estado del trabajo.
+        Termina cuando el trabajo llega a un estado final.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return
+
+        version = -1
+        while True:
+            with job.condition:
+                if job.version == version:
+                    job.condition.wait(timeout=keepalive)
+                changed = job.version != version
+                version = job.version
+                payload = job.to_dict()
+
+            if changed:
+                yield f"data: {json.dumps(payload)}\n\n"
+                if payload["state"] in FINAL_STATES:
+                    return
+            else:
+                yield ": keep-alive\n\n"
+
@@ -0,0 +1,109 @@
+import os
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .rate_limiter import get_rate_limiter, parse_retry_after
+
+# Conexiones máximas y tiempos de espera (conexión, lectura) por dominio
+DEFAULT_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+DEFAULT_TIMEOUT = (float(os.getenv('HTTP_CONNECT_TIMEOUT', 10)), float(os.getenv('HTTP_READ_TIMEOUT', 30)))
+HOST_LIMITS = {
+    "api.crossref.org": {"pool_size": 16, "timeout": (10, 30)},
+    "scholar.google.com": {"pool_size": 4, "timeout": (10, 15)},
+}
+
+# Reintentos con espera exponencial y variación aleatoria ante errores de conexión y 5xx
+RETRIES = int(os.getenv('HTTP_RETRIES', 3))
+RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', 0.5))
+RETRY_JITTER = float(os.getenv('HTTP_RETRY_JITTER', 0.5))
+RETRY_STATUS = (500, 502, 503, 504)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_scrapers = threading.local()
+
+
+def _host(url):
+    return urlparse(url).netloc.lower()
+
+
+def _host_limits(host):
+    return HOST_LIMITS.get(host, {})
+
+
+def _new_session(host):
+    limits = _host_limits(host)
+    retry_options = dict(total=RETRIES, connect=RETRIES, read=RETRIES, status=RETRIES,
+                         backoff_factor=RETRY_BACKOFF, backoff_jitter=RETRY_JITTER,
+                         status_forcelist=RETRY_STATUS, allowed_methods=frozenset(["GET", "HEAD"]),
+                         respect_retry_after_header=True, raise_on_status=False)
+    try:
+        retry = Retry(**retry_options)
+    except TypeError:
+        # urllib3 < 2.0 no admite backoff_jitter
+        retry_options.pop("backoff_jitter")
+        retry = Retry(**retry_options)
+    # pool_block hace que las peticiones esperen una conexión libre en vez de abrir más
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=limits.get("pool_size", DEFAULT_POOL_SIZE),
+                          max_retries=retry, pool_block=True)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(url):
+    """
+    Devuelve la sesión compartida (con conexiones reutilizables) del dominio de la URL
+    """
+    host = _host(url)
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _new_session(host)
+            _sessions[host] = session
+        return session
+
+
+def http_request(method, url, **kwargs):
+    """
+    Realiza una petición HTTP con la sesión compartida del dominio. Acepta los mismos
+    argumentos que requests.request y aplica el tiempo de espera del dominio si no se indica.
+    Cada petición consume presupuesto del planificador del dominio; un 429 lo reduce.
+    max_wait limita la espera si el dominio está en pausa tras un bloqueo (ver RateLimiter.acquire).
+    """
+    kwargs.setdefault("timeout", _host_limits(_host(url)).get("timeout", DEFAULT_TIMEOUT))
+    limiter = get_rate_limiter()
+    limiter.acquire(url, kwargs.pop("max_wait", None))
+    response = get_session(url).request(method, url, **kwargs)
+    if response.status_code == 429:
+        limiter.penalize(url, parse_retry_after(response.headers.get("Retry-After")))
+    else:
+        limiter.reward(url)
+    return response
+
+
+def http_get(url, **kwargs):
+    return http_request("GET", url, **kwargs)
+
+
+def get_scraper():
+    """
+    Devuelve un cliente cloudscraper reutilizable por hilo, para no repetir la
+    negociación TLS y el desafío de Cloudflare en cada descarga
+    """
+    scraper = getattr(_scrapers, "scraper", None)
+    if scraper is None:
+        import cloudscraper
+        scraper = cloudscraper.create_scraper()
+        _scrapers.scraper = scraper
+    return scraper
+
+
+def close_all():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
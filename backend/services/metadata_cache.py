@@ -0,0 +1,132 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from .Utils import getCachePath, normalizeDOI
+
+# Tiempo de vida (segundos) de cada fuente de metadatos
+DEFAULT_TTLS = {
+    "crossref": 30 * 24 * 3600,
+    "crossref_title": 30 * 24 * 3600,
+    "scholar": 7 * 24 * 3600,
+    "enrichment": 7 * 24 * 3600,
+    "search_enrichment": 7 * 24 * 3600,
+    "ai_summary": 90 * 24 * 3600,
+}
+DEFAULT_TTL = 24 * 3600
+NEGATIVE_TTL = int(os.getenv('METADATA_CACHE_NEGATIVE_TTL', 6 * 3600))
+MAX_ENTRIES = int(os.getenv('METADATA_CACHE_MAX_ENTRIES', 20000))
+
+
+class MetadataCache:
+    """
+    Caché persistente de metadatos en SQLite, indexada por clave normalizada
+    (normalmente el DOI) y por fuente. Cada fuente tiene su propio tiempo de
+    vida, los resultados "no encontrado" se guardan con un TTL más corto y,
+    al superar el número máximo de entradas, se eliminan las menos usadas.
+    """
+
+    def __init__(self, db_path=None, max_entries=MAX_ENTRIES, ttls=None, negative_ttl=NEGATIVE_TTL):
+        self.db_path = db_path or getCachePath('metadata.sqlite')
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS metadata (
+                key TEXT NOT NULL,
+                source TEXT NOT NULL,
+                value TEXT,
+                found INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (key, source)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_metadata_access ON metadata(last_access)")
+        self._conn.commit()
+
+    def _ttl(self, source, found):
+        if not found:
+            return self.negative_ttl
+        return self.ttls.get(source, DEFAULT_TTL)
+
+    def get(self, key, source):
+        """
+        Busca una entrada vigente en la caché
+
+        Args:
+            key: DOI (u otra clave) de la entrada
+            source: Fuente de los metadatos (crossref, scholar, enrichment...)
+
+        Returns:
+            tuple: (encontrado_en_cache, valor). El valor es None para entradas negativas
+        """
+        key = normalizeDOI(key)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, found, stored_at FROM metadata WHERE key = ? AND source = ?",
+                (key, source)).fetchone()
+            if row is None:
+                return False, None
+
+            value, found, stored_at = row
+            if now - stored_at > self._ttl(source, found):
+                self._conn.execute("DELETE FROM metadata WHERE key = ? AND source = ?", (key, source))
+                self._conn.commit()
+                return False, None
+
+            self._conn.execute("UPDATE metadata SET last_access = ? WHERE key = ? AND source = ?",
+                               (now, key, source))
+            self._conn.commit()
+
+        return True, json.loads(value) if found else None
+
+    def set(self, key, source, value):
+        """Guarda un valor serializable en JSON; None registra un resultado negativo"""
+        key = normalizeDOI(key)
+        now = time.time()
+        found = value is not None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata (key, source, value, found, stored_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, source, json.dumps(value) if found else None, int(found), now, now))
+            self._evict()
+            self._conn.commit()
+
+    def set_not_found(self, key, source):
+        self.set(key, source, None)
+
+    def invalidate(self, key, source=None):
+        key = normalizeDOI(key)
+        with self._lock:
+            if source is None:
+                self._conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+            else:
+                self._conn.execute("DELETE FROM metadata WHERE key = ? AND source = ?", (key, source))
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM metadata WHERE rowid IN "
+                "(SELECT rowid FROM metadata ORDER BY last_access ASC LIMIT ?)", (excess,))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_metadata_cache():
+    """Devuelve la instancia compartida de la caché de metadatos"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache()
+        return _cache
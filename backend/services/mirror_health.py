@@ -0,0 +1,202 @@
+import atexit
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from .Utils import getCachePath
+
+# Fallos consecutivos antes de abrir el circuito de un espejo y tiempos de espera
+FAILURE_THRESHOLD = int(os.getenv('MIRROR_FAILURE_THRESHOLD', 3))
+BASE_COOLDOWN = float(os.getenv('MIRROR_BASE_COOLDOWN', 60))
+MAX_COOLDOWN = float(os.getenv('MIRROR_MAX_COOLDOWN', 6 * 3600))
+LATENCY_WINDOW = 50
+SAVE_INTERVAL = 5
+
+
+def mirror_key(url):
+    """Devuelve el esquema y dominio de una URL, que identifican al espejo"""
+    parsed = urlparse(url)
+    if not parsed.netloc:
+        return url.rstrip('/')
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class MirrorHealthRegistry:
+    """
+    Registro persistente del estado de los espejos (Sci-Hub, SciDB, Anna's Archive).
+    Guarda aciertos, fallos, latencias recientes, desafíos de Cloudflare y el último
+    fallo de cada espejo, y aplica un cortocircuito con espera exponencial a los
+    espejos que fallan de forma consecutiva.
+    """
+
+    def __init__(self, path=None, failure_threshold=FAILURE_THRESHOLD,
+                 base_cooldown=BASE_COOLDOWN, max_cooldown=MAX_COOLDOWN):
+        self.path = path or getCachePath('mirror_health.json')
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._mirrors = {}
+        self._dirty = False
+        self._last_save = 0
+        self._load()
+        atexit.register(self.save)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._mirrors = json.load(f)
+        except (OSError, ValueError):
+            self._mirrors = {}
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._mirrors)
+            self._dirty = False
+            self._last_save = time.time()
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save mirror health data: {str(e)}")
+
+    def _entry(self, url):
+        key = mirror_key(url)
+        if key not in self._mirrors:
+            self._mirrors[key] = {
+                "successes": 0,
+                "failures": 0,
+                "cloudflare": 0,
+                "consecutive_failures": 0,
+                "latencies": [],
+                "last_success": None,
+                "last_failure": None,
+                "last_error": None,
+                "open_until": 0,
+            }
+        return self._mirrors[key]
+
+    def _record(self, url, latency, success, cloudflare=False, error=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entry(url)
+            if latency is not None:
+                entry["latencies"] = (entry["latencies"] + [round(latency, 3)])[-LATENCY_WINDOW:]
+            if success:
+                entry["successes"] += 1
+                entry["consecutive_failures"] = 0
+                entry["last_success"] = now
+                entry["open_until"] = 0
+            else:
+                entry["failures"] += 1
+                entry["consecutive_failures"] += 1
+                entry["last_failure"] = now
+                entry["last_error"] = error
+                if cloudflare:
+                    entry["cloudflare"] += 1
+                exceeded = entry["consecutive_failures"] - self.failure_threshold
+                if exceeded >= 0:
+                    cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** exceeded))
+                    entry["open_until"] = now + cooldown
+            self._dirty = True
+            should_save = now - self._last_save > SAVE_INTERVAL
+        if should_save:
+            self.save()
+
+    def record_success(self, url, latency=None):
+        self._record(url, latency, True)
+
+    def record_failure(self, url, latency=None, cloudflare=False, error=None):
+        self._record(url, latency, False, cloudflare, error)
+
+    def is_available(self, url):
+        with self._lock:
+            entry = self._mirrors.get(mirror_key(url))
+            return entry is None or entry["open_until"] <= time.time()
+
+    def stats(self, url):
+        """Devuelve tasa de éxito, latencias p50/p95 y estado del circuito de un espejo"""
+        with self._lock:
+            entry = self._mirrors.get(mirror_key(url))
+            if entry is None:
+                return None
+            total = entry["successes"] + entry["failures"]
+            return {
+                "success_rate": entry["successes"] / total if total else None,
+                "p50_latency": _percentile(entry["latencies"], 0.5),
+                "p95_latency": _percentile(entry["latencies"], 0.95),
+                "cloudflare": entry["cloudflare"],
+                "last_success": entry["last_success"],
+                "last_failure": entry["last_failure"],
+                "last_error": entry["last_error"],
+                "open": entry["open_until"] > time.time(),
+            }
+
+    def _score(self, entry):
+        if entry is None:
+            # Espejo sin historial: probabilidad neutra y latencia supuesta
+            return 0.5 / 3.0
+        success_rate = (entry["successes"] + 1) / (entry["successes"] + entry["failures"] + 2)
+        latency = _percentile(entry["latencies"], 0.5) or 2.0
+        cloudflare_penalty = 1 + entry["cloudflare"] / (entry["successes"] + entry["failures"] + 1)
+        return success_rate / ((1 + latency) * cloudflare_penalty)
+
+    def rank(self, urls, include_open=False):
+        """
+        Ordena los espejos de mejor a peor puntuación
+
+        Args:
+            urls: Espejos candidatos
+            include_open: Si es True, los espejos con el circuito abierto se añaden al final
+
+        Returns:
+            list: Espejos ordenados. Si todos tienen el circuito abierto, se devuelve
+            el que antes vuelve a estar disponible para no quedarse sin candidatos
+        """
+        now = time.time()
+        with self._lock:
+            entries = [(url, self._mirrors.get(mirror_key(url))) for url in urls]
+        available = [(url, entry) for url, entry in entries if entry is None or entry["open_until"] <= now]
+        blocked = [(url, entry) for url, entry in entries if entry is not None and entry["open_until"] > now]
+
+        ranked = [url for url, entry in sorted(available, key=lambda x: self._score(x[1]), reverse=True)]
+        blocked.sort(key=lambda x: x[1]["open_until"])
+        if include_open or not ranked:
+            ranked += [url for url, _ in (blocked if include_open else blocked[:1])]
+        return ranked
+
+    def best_recent(self, urls, max_age=3600):
+        """Devuelve el mejor espejo con un acierto reciente, o None"""
+        now = time.time()
+        for url in self.rank(urls):
+            with self._lock:
+                entry = self._mirrors.get(mirror_key(url))
+            if entry and entry["last_success"] and now - entry["last_success"] <= max_age:
+                return url
+        return None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_mirror_registry():
+    """Devuelve la instancia compartida del registro de espejos"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MirrorHealthRegistry()
+        return _registry
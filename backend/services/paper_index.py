@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from .Utils import getCachePath, normalizeDOI
+from .dedup import merge_records, normalize_title
+
+# Dimensión de los vectores TF con hashing: no depende del vocabulario, así que el
+# índice crece artículo a artículo sin volver a ajustar nada
+INDEX_DIM = 512
+# Bits del sketch SimHash (hiperplanos aleatorios) con el que se preseleccionan candidatos
+SKETCH_BITS = 256
+SKETCH_BYTES = SKETCH_BITS // 8
+# Hasta este número de artículos se compara el vector de la consulta con todo el índice
+EXACT_SCAN_LIMIT = int(os.getenv('PAPER_INDEX_EXACT_SCAN_LIMIT', 20000))
+# Candidatos por resultado pedido que se reordenan con el coseno exacto
+CANDIDATES_PER_RESULT = 20
+
+_rng = np.random.RandomState(7)
+_HYPERPLANES = _rng.standard_normal((INDEX_DIM, SKETCH_BITS)).astype(np.float32)
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+_vectorizer = HashingVectorizer(n_features=INDEX_DIM, stop_words='english', strip_accents='unicode',
+                                norm='l2', alternate_sign=True, dtype=np.float32)
+
+
+def paper_key(paper):
+    """Clave del artículo en el índice: el DOI normalizado o, si no lo tiene, su título normalizado"""
+    if paper.get("doi"):
+        return normalizeDOI(paper["doi"])
+    title = normalize_title(paper.get("title"))
+    return "title:" + hashlib.sha1(title.encode('utf-8')).hexdigest() if title else None
+
+
+def _record(paper):
+    # Los resultados de Crossref, Scholar y la búsqueda por palabras clave usan nombres distintos
+    return {
+        "title": paper.get("title"),
+        "authors": paper.get("authors"),
+        "year": paper.get("year"),
+        "abstract": paper.get("abstract"),
+        "doi": paper.get("doi"),
+        "journal": paper.get("journal") or paper.get("jurnal"),
+        "citation_count": paper.get("citation_count", paper.get("cites_num")),
+        "url": paper.get("url"),
+    }
+
+
+def paper_vectors(texts):
+    """Vectores TF con hashing normalizados (L2) de una lista de textos, como matriz densa float32"""
+    return _vectorizer.transform(texts).toarray()
+
+
+def sketches(vectors):
+    """Sketch SimHash de cada vector: un bit por hiperplano según el lado en que cae"""
+    return np.packbits(vectors @ _HYPERPLANES > 0, axis=1)
+
+
+class PaperIndex:
+    """
+    Índice vectorial local de todos los artículos que ha resuelto el servicio. Los
+    vectores (TF con hashing sobre título y resumen) y sus sketches SimHash se guardan
+    en ficheros binarios que se leen como matrices NumPy mapeadas en memoria; los
+    metadatos y la fila de cada artículo, en SQLite. Los artículos nuevos se añaden al
+    final y los ya conocidos se actualizan en su fila.
+    """
+
+    def __init__(self, index_dir=None):
+        self.index_dir = index_dir or getCachePath('paper_index')
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.index_dir, 'vectors.f32')
+        self.sketches_path = os.path.join(self.index_dir, 'sketches.u8')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.index_dir, 'papers.sqlite'), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS papers (
+                row INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+        # Filas escritas en los ficheros pero no confirmadas en SQLite (interrupción a medias)
+        for file_path, row_bytes in ((self.vectors_path, INDEX_DIM * 4), (self.sketches_path, SKETCH_BYTES)):
+            with open(file_path, 'ab') as f:
+                if f.tell() > self._count * row_bytes:
+                    f.truncate(self._count * row_bytes)
+        self._maps = None
+
+    def __len__(self):
+        return self._count
+
+    def _matrices(self):
+        if self._maps is None and self._count:
+            self._maps = (np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self._count, INDEX_DIM)),
+                          np.memmap(self.sketches_path, dtype=np.uint8, mode='r', shape=(self._count, SKETCH_BYTES)))
+        return self._maps
+
+    def add_papers(self, papers):
+        """
+        Añade o actualiza artículos (diccionarios con título, resumen, DOI...) en el índice.
+        Se ignoran los que no tienen título.
+
+        Returns:
+            int: Número de artículos añadidos o actualizados
+        """
+        records = {}
+        for paper in papers:
+            key = paper_key(paper) if paper and paper.get("title") else None
+            if key in records:
+                # Un mismo artículo repetido en el lote (p. ej. de varias fuentes) se fusiona
+                records[key] = merge_records([records[key], _record(paper)])
+            elif key:
+                records[key] = _record(paper)
+        if not records:
+            return 0
+
+        keys = list(records)
+        now = time.time()
+
+        with self._lock:
+            placeholders = ",".join("?" * len(keys))
+            existing = {}
+            for key, row, data in self._conn.execute(
+                    f"SELECT key, row, data FROM papers WHERE key IN ({placeholders})", keys):
+                # Se conservan los campos ya conocidos que no trae el resultado nuevo
+                existing[key] = row
+                records[key] = merge_records([json.loads(data), records[key]])
+
+            vectors = paper_vectors([f"{records[key]['title']} {records[key]['abstract'] or ''}" for key in keys])
+            codes = sketches(vectors)
+            new = [i for i, key in enumerate(keys) if key not in existing]
+            updated = [i for i, key in enumerate(keys) if key in existing]
+
+            if updated:
+                rows = [existing[keys[i]] for i in updated]
+                vector_map = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(self._count, INDEX_DIM))
+                sketch_map = np.memmap(self.sketches_path, dtype=np.uint8, mode='r+', shape=(self._count, SKETCH_BYTES))
+                vector_map[rows] = vectors[updated]
+                sketch_map[rows] = codes[updated]
+                vector_map.flush()
+                sketch_map.flush()
+                del vector_map, sketch_map
+
+            # Las filas nuevas se escriben al final de los ficheros antes de registrarlas en SQLite
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors[new].tobytes())
+            with open(self.sketches_path, 'ab') as f:
+                f.write(codes[new].tobytes())
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO papers (row, key, data, updated_at) VALUES (?, ?, ?, ?)",
+                [(existing[keys[i]], keys[i], json.dumps(records[keys[i]]), now) for i in updated] +
+                [(self._count + n, keys[i], json.dumps(records[keys[i]]), now) for n, i in enumerate(new)])
+            self._conn.commit()
+            self._count += len(new)
+            self._maps = None
+
+        return len(keys)
+
+    def get(self, key):
+        """Metadatos guardados de un artículo (por DOI o clave de título) o None"""
+        key = normalizeDOI(key)
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM papers WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search(self, text, k=10, exclude=()):
+        """
+        Artículos del índice más parecidos a un texto. Con pocos artículos se calcula el
+        coseno con todos; con más, se preseleccionan los de sketch más cercano (distancia
+        de Hamming) y solo esos se reordenan con el coseno exacto.
+
+        Returns:
+            list: Pares (metadatos del artículo, similitud coseno), de mayor a menor similitud
+        """
+        query = paper_vectors([text])[0]
+        if not query.any():
+            return []
+        exclude = {normalizeDOI(key) for key in exclude if key}
+
+        with self._lock:
+            maps = self._matrices()
+            if maps is None:
+                return []
+            vectors, codes = maps
+            wanted = k + len(exclude)
+            if len(vectors) <= EXACT_SCAN_LIMIT:
+                candidates = np.arange(len(vectors))
+            else:
+                query_code = sketches(query[None, :])[0]
+                distances = _POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1)
+                shortlist = min(len(vectors) - 1, wanted * CANDIDATES_PER_RESULT)
+                candidates = np.sort(np.argpartition(distances, shortlist)[:shortlist])
+            similarity = np.asarray(vectors[candidates] @ query)
+            order = np.argsort(-similarity, kind='stable')[:wanted]
+            rows = [int(candidates[i]) for i in order]
+            scores = [float(similarity[i]) for i in order]
+
+            placeholders = ",".join("?" * len(rows))
+            found = dict(self._conn.execute(
+                f"SELECT row, data FROM papers WHERE row IN ({placeholders})", rows).fetchall()) if rows else {}
+
+        results = []
+        for row, score in zip(rows, scores):
+            record = json.loads(found[row])
+            if paper_key(record) in exclude or score <= 0:
+                continue
+            results.append((record, score))
+        return results[:k]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_paper_index():
+    """Devuelve la instancia compartida del índice local de artículos"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PaperIndex()
+        return _index
+
+
+def index_papers(papers):
+    """Añade artículos al índice local sin que un fallo del índice interrumpa la búsqueda"""
+    try:
+        return get_paper_index().add_papers(papers)
+    except Exception as e:
+        print(f"Error al indexar artículos: {str(e)}")
+        return 0
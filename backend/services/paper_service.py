@@ -2,18 +2,53 @@ import os
 import re
 from urllib.parse import urlparse
 import tempfile
+import hashlib
+import time
 import shutil
 import requests
 import cloudscraper
-from .Crossref import getPapersInfoFromDOIs
-import time
-import random
+from .Crossref import getPapersInfoFromDOIs, getBibtex
 from .Scholar import ScholarPapersInfo
+from .block_recovery import ScholarBlockedError
 from .ScholarExtractor import ScholarExtractor
+from .metadata_cache import get_metadata_cache
+from .paper_index import index_papers
+from .http_client import http_get, get_scraper
+from .mirror_health import get_mirror_registry
+from .pdf_store import get_pdf_store
+from .scihub_resolver import resolve_scihub_link, is_cloudflare_challenge
+from .stream_download import download_pdf
+from .Utils import normalizeDOI
+from .dedup import deduplicate_papers
 import concurrent.futures
 import threading
 from bs4 import BeautifulSoup
 
+# Espejos de Anna's Archive (SciDB) usados si Sci-Hub no tiene el artículo
+ANNAS_ARCHIVE_MIRRORS = [
+    "https://annas-archive.org",
+    "https://annas-archive.se",
+    "https://annas-archive.li",
+]
+
+# Versión de Chrome instalada; si se indica, Google Scholar se consulta con el pool de
+# navegadores sin interfaz en lugar de peticiones HTTP
+SCHOLAR_CHROME_VERSION = int(os.getenv('SCHOLAR_CHROME_VERSION')) if os.getenv('SCHOLAR_CHROME_VERSION') else None
+
+# Campos que se intentan completar en los resultados de búsqueda por palabras clave
+ENRICHMENT_FIELDS = ("abstract", "authors", "year")
+
+# Concurrencia del enriquecimiento, tiempo que se espera antes de responder y
+# tiempo que se conservan los resultados tardíos
+ENRICHMENT_WORKERS = int(os.getenv('ENRICHMENT_WORKERS', 4))
+ENRICHMENT_LATENCY_BUDGET = float(os.getenv('ENRICHMENT_LATENCY_BUDGET', 8))
+LATE_ENRICHMENT_TTL = 10 * 60
+
+_enrichment_executor = concurrent.futures.ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS,
+                                                             thread_name_prefix="enrichment")
+_late_enrichment = {}
+_late_enrichment_lock = threading.Lock()
+
 def extract_doi_from_url(url):
     """Extrae el DOI de una URL o devuelve el DOI directo si se proporcionó uno"""
     if not url:
@@ -84,35 +119,54 @@ def get_paper_info(query):
     if error or not doi:
         return None, error or "DOI no válido o no encontrado"
     
+    doi = normalizeDOI(doi)
+    cache = get_metadata_cache()
+    
     try:
         results = []
         errors = []
         
-        # 1. Obtener información de Crossref
-        try:
-            crossref_info = getPapersInfoFromDOIs(doi, restrict=None)
-            if crossref_info and crossref_info.DOI:
-                results.append(format_paper_info(crossref_info, doi, "Crossref"))
-        except Exception as e:
-            errors.append(f"Error en Crossref: {str(e)}")
+        # 1. Obtener información de Crossref (desde la caché si está vigente)
+        cached, crossref_result = cache.get(doi, "crossref")
+        if not cached:
+            try:
+                # Solo se guarda como no encontrado un DOI que Crossref no conoce; los
+                # errores de red llegan como excepción y no se guardan en caché
+                crossref_info = getPapersInfoFromDOIs(doi, restrict=None, raise_errors=True)
+                if crossref_info and crossref_info.DOI and crossref_info.title:
+                    crossref_result = format_paper_info(crossref_info, doi, "Crossref")
+                cache.set(doi, "crossref", crossref_result)
+            except Exception as e:
+                errors.append(f"Error en Crossref: {str(e)}")
+        if crossref_result:
+            results.append(crossref_result)
         
         # 2. Obtener información de Google Scholar
         if not results:
-            try:
-                # Buscar en Google Scholar usando el DOI
-                scholar_papers = ScholarPapersInfo(
-                    query=f'"{doi}"', 
-                    scholar_pages=range(1, 2),  # Solo la primera página
-                    restrict=None, 
-                    scholar_results=1  # Solo el primer resultado
-                )
-                
-                if scholar_papers and len(scholar_papers) > 0:
-                    scholar_info = scholar_papers[0]
-                    if hasattr(scholar_info, 'DOI') and scholar_info.DOI:
-                        results.append(format_paper_info(scholar_info, doi, "Google Scholar"))
-            except Exception as e:
-                errors.append(f"Error en Google Scholar: {str(e)}")
+            cached, scholar_result = cache.get(doi, "scholar")
+            if not cached:
+                try:
+                    # Buscar en Google Scholar usando el DOI
+                    scholar_papers = list(ScholarPapersInfo(
+                        query=f'"{doi}"', 
+                        scholar_pages=range(1, 2),  # Solo la primera página
+                        restrict=None, 
+                        scholar_results=1,  # Solo el primer resultado
+                        chrome_version=SCHOLAR_CHROME_VERSION
+                    ))
+                    
+                    if scholar_papers and len(scholar_papers) > 0:
+                        scholar_info = scholar_papers[0]
+                        if hasattr(scholar_info, 'DOI') and scholar_info.DOI:
+                            scholar_result = format_paper_info(scholar_info, doi, "Google Scholar")
+                    cache.set(doi, "scholar", scholar_result)
+                except ScholarBlockedError as e:
+                    # No se guarda en caché: el bloqueo es temporal
+                    errors.append(str(e))
+                except Exception as e:
+                    errors.append(f"Error en Google Scholar: {str(e)}")
+            if scholar_result:
+                results.append(scholar_result)
         
         # Si no se encontró información en ninguna fuente
         if not results:
@@ -123,14 +177,31 @@ def get_paper_info(query):
         
         # 3. Intentar obtener abstract y más información desde Google Scholar
         try:
-            scholar_extractor = ScholarExtractor()
-            for i in range(len(results)):
-                # Intentar enriquecer con abstract y otros datos que puedan faltar
-                results[i] = scholar_extractor.enrich_paper_info(results[i])
+            cached, enrichment = cache.get(doi, "enrichment")
+            if not cached:
+                scholar_extractor = ScholarExtractor()
+                enrichment = {}
+                for i in range(len(results)):
+                    # Intentar enriquecer con abstract y otros datos que puedan faltar
+                    original_keys = {k for k, v in results[i].items() if v}
+                    results[i] = scholar_extractor.enrich_paper_info(results[i])
+                    for key, value in results[i].items():
+                        if key not in original_keys and value:
+                            enrichment.setdefault(key, value)
+                cache.set(doi, "enrichment", enrichment or None)
+            elif enrichment:
+                # Fusionar los campos guardados sin volver a consultar Google Scholar
+                for result in results:
+                    for key, value in enrichment.items():
+                        if key not in result or not result[key]:
+                            result[key] = value
         except Exception as e:
             errors.append(f"Error al enriquecer información: {str(e)}")
             # No fallamos aquí, continuamos con la información que tengamos
         
+        # Guardar el artículo en el índice local de búsqueda de relacionados
+        index_papers(results)
+        
         # Preparar la respuesta con los resultados de ambas fuentes
         print(results)
         return {
@@ -153,24 +224,6 @@ def download_from_scihub(doi, output_path=None, get_link_only=False):
     Returns:
         str o bool: URL de descarga si get_link_only=True, sino True/False según éxito de descarga
     """
-    # Lista de espejos de Sci-Hub a probar
-    mirrors = [
-        "https://sci-hub.ee",
-        "https://sci-hub.se",
-        "https://sci-hub.st",
-        "https://sci-hub.ru",
-        "https://sci-hub.cat",
-        "https://sci-hub.wf",
-        "https://sci-hub.ren",
-        "https://sci-hub.mksa.top",
-        "https://sci-hub.mk"
-    ]
-    
-    # Aleatorizar el orden de los espejos para distribuir la carga
-    random.shuffle(mirrors)
-
-    scrapper = cloudscraper.create_scraper()  # Usar cloudscraper para manejar captchas y bloqueos
-    
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -185,58 +238,45 @@ def download_from_scihub(doi, output_path=None, get_link_only=False):
     print(f"Searching paper with DOI {doi}")
     print("Searching for a sci-hub mirror")
     
-    for mirror in mirrors:
-        try:
-            print(f"Trying with {mirror}...")
-            url = f"{mirror}/{doi}"
-            response = scrapper.get(url, timeout=10)
-            response.raise_for_status()  # Lanza un error si la respuesta no es 200
-            # response = requests.get(url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                # Buscar el enlace de descarga en la página
-                soup = BeautifulSoup(response.text, 'html.parser')
-                print('Souped', url)
-                pdf_element = soup.find(id='pdf')
-                if pdf_element and 'src' in pdf_element.attrs:
-                    download_link = str(pdf_element['src'])
-                    if download_link.startswith('//'):
-                        download_link = 'https:' + download_link
-                    elif not download_link.startswith('http'):
-                        base_url = '/'.join(mirror.split('/')[:3])  # Obtener el esquema y dominio
-                        download_link = base_url + download_link.lstrip('/')
-                    if not download_link.startswith('http'):
-                        download_link = mirror + download_link
-                        
-                    if get_link_only:
-                        return download_link
-                        
-                    # Si se requiere descarga, intentar descargar
-                    if output_path:
-                        pdf_response = scrapper.get(download_link, headers={'Referer': url}, timeout=60)
-                        pdf_response.raise_for_status()
-                        if pdf_response.status_code == 200:
-                            with open(output_path, 'wb') as f:
-                                f.write(pdf_response.content)
-                            return True
-        except cloudscraper.exceptions.CloudflareException as e:
-            print(f"Cloudflare challenge encountered: {e}")
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error de red o de HTTP con el espejo {mirror}: {str(e)}")
-
-        except Exception as e:
-            print(f"Error with mirror {mirror}: {str(e)}")
+    # Consultar los espejos en paralelo y quedarse con el primer enlace válido
+    try:
+        download_link, page_url = resolve_scihub_link(doi)
+    except Exception as e:
+        print(f"Error resolving Sci-Hub link: {str(e)}")
+        download_link, page_url = None, None
+    
+    if download_link:
+        if get_link_only:
+            return download_link
         
-        time.sleep(random.uniform(2, 5))
+        # Si se requiere descarga, intentar descargar
+        if output_path:
+            try:
+                scrapper = get_scraper()  # Usar cloudscraper para manejar captchas y bloqueos
+                if download_pdf(download_link, output_path, session=scrapper, headers={'Referer': page_url}, timeout=60):
+                    return True
+            except cloudscraper.exceptions.CloudflareException as e:
+                print(f"Cloudflare challenge encountered: {e}")
+                get_mirror_registry().record_failure(page_url, cloudflare=True, error=str(e))
+            except requests.exceptions.RequestException as e:
+                print(f"Error de red o de HTTP descargando {download_link}: {str(e)}")
     
     # Si no se encontró en Sci-Hub, intentar con otras fuentes
-    try:
-        print("Using Annas-Archive...")
-        url = f"https://annas-archive.org/scidb/{doi}"
-        response = requests.get(url, headers=headers, timeout=15)
-        
-        if response.status_code == 200:
+    registry = get_mirror_registry()
+    for mirror in registry.rank(ANNAS_ARCHIVE_MIRRORS):
+        started = time.monotonic()
+        try:
+            print(f"Using Annas-Archive ({mirror})...")
+            url = f"{mirror}/scidb/{doi}"
+            response = http_get(url, headers=headers, timeout=15)
+            
+            if response.status_code != 200:
+                registry.record_failure(mirror, time.monotonic() - started,
+                                        cloudflare=is_cloudflare_challenge(response.status_code, response.headers, response.text),
+                                        error=f"HTTP {response.status_code}")
+                continue
+            registry.record_success(mirror, time.monotonic() - started)
+            
             # Extraer enlace de descarga
             soup = BeautifulSoup(response.text, 'html.parser')
             download_link = soup.find('a', class_='download-link')
@@ -245,15 +285,14 @@ def download_from_scihub(doi, output_path=None, get_link_only=False):
                 if get_link_only:
                     return link_url
                     
-                if output_path:
-                    pdf_response = requests.get(link_url, headers=headers, timeout=30)
-                    if pdf_response.status_code == 200:
-                        with open(output_path, 'wb') as f:
-                            f.write(pdf_response.content)
-                        return True
+                if output_path and download_pdf(link_url, output_path, headers=headers, timeout=30):
+                    return True
+            # El espejo respondió: el artículo no está en Anna's Archive
+            break
                         
-    except Exception as e:
-        print(f"Error with Annas-Archive: {str(e)}")
+        except Exception as e:
+            registry.record_failure(mirror, time.monotonic() - started, error=str(e))
+            print(f"Error with Annas-Archive: {str(e)}")
     
     return None if get_link_only else False
 
@@ -273,16 +312,10 @@ def download_paper_from_link(download_link, output_path):
     }
     
     try:
-        response = requests.get(download_link, headers=headers, timeout=30)
-        if response.status_code == 200:
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            return True
+        return download_pdf(download_link, output_path, headers=headers, timeout=30)
     except Exception as e:
         print(f"Error downloading paper: {str(e)}")
         return False
-    
-    return False
 
 def search_and_download_paper(query, output_dir):
     """
@@ -304,6 +337,18 @@ def search_and_download_paper(query, output_dir):
     if error or not doi:
         return None, error or "DOI no válido o no encontrado"
     
+    # Si el PDF ya está en el almacén, responder sin usar la red
+    store = get_pdf_store(output_dir)
+    stored_filename = store.lookup(doi)
+    if stored_filename is not None:
+        # Metadatos guardados con el PDF; los PDFs incorporados sin ellos usan la caché
+        first_source = store.metadata(doi)
+        for source in ("crossref", "scholar"):
+            if first_source:
+                break
+            cached, first_source = get_metadata_cache().get(doi, source)
+        return build_download_result(doi, first_source or {}, stored_filename), None
+    
     # Crear un directorio temporal para la descarga
     temp_dir = tempfile.mkdtemp()
     
@@ -325,38 +370,13 @@ def search_and_download_paper(query, output_dir):
         if not download_success or not os.path.exists(temp_pdf_path):
             return None, "No se pudo descargar el PDF del artículo"
         
-        # Copiar el PDF a la carpeta de destino
-        target_pdf_path = os.path.join(output_dir, pdf_filename)
-        shutil.copy2(temp_pdf_path, target_pdf_path)
-        
         # Tomar el primer resultado como referencia para la respuesta
         first_source = paper_info["sources"][0] if paper_info["sources"] else {}
         
-        # Preparar la respuesta
-        result = {
-            "doi": doi,
-            "title": first_source.get("title", "Sin título"),
-            "authors": first_source.get("authors", ["Autores desconocidos"]),
-            "year": first_source.get("year"),
-            "jurnal": first_source.get("jurnal"),
-            "abstract": first_source.get("abstract", ""),
-            "pdf_url": f"/pdf/{pdf_filename}"
-        }
-        
-        # Asegurar que authors sea siempre un array
-        if not isinstance(result["authors"], list):
-            if isinstance(result["authors"], str):
-                # Intentar dividir por "and" primero, luego por comas
-                authors = [author.strip() for author in result["authors"].split('and') if author.strip()]
-                if not authors:
-                    authors = [a.strip() for a in result["authors"].split(',') if a.strip()]
-                if not authors:
-                    authors = [result["authors"]]
-                result["authors"] = authors
-            else:
-                result["authors"] = ["Autores desconocidos"]
+        # Guardar el PDF en el almacén de la carpeta de destino
+        stored_filename = store.add(doi, temp_pdf_path, first_source)
         
-        return result, None
+        return build_download_result(doi, first_source, stored_filename), None
         
     except Exception as e:
         return None, f"Error al procesar la solicitud: {str(e)}"
@@ -365,13 +385,163 @@ def search_and_download_paper(query, output_dir):
         # Eliminar el directorio temporal
         shutil.rmtree(temp_dir, ignore_errors=True)
 
-def search_papers_by_keywords(query, max_results=10):
+def build_download_result(doi, first_source, pdf_filename):
+    """
+    Prepara la respuesta de search_and_download_paper a partir de la información
+    de la primera fuente y del nombre del PDF en el almacén
+    """
+    result = {
+        "doi": doi,
+        "title": first_source.get("title", "Sin título"),
+        "authors": first_source.get("authors", ["Autores desconocidos"]),
+        "year": first_source.get("year"),
+        "jurnal": first_source.get("jurnal"),
+        "abstract": first_source.get("abstract", ""),
+        "pdf_url": f"/pdf/{pdf_filename}"
+    }
+    
+    # Asegurar que authors sea siempre un array
+    if not isinstance(result["authors"], list):
+        if isinstance(result["authors"], str):
+            # Intentar dividir por "and" primero, luego por comas
+            authors = [author.strip() for author in result["authors"].split('and') if author.strip()]
+            if not authors:
+                authors = [a.strip() for a in result["authors"].split(',') if a.strip()]
+            if not authors:
+                authors = [result["authors"]]
+            result["authors"] = authors
+        else:
+            result["authors"] = ["Autores desconocidos"]
+    
+    return result
+
+def enrichment_key(paper_info):
+    """Clave con la que se consulta el enriquecimiento tardío de un resultado"""
+    if paper_info.get("doi"):
+        return normalizeDOI(paper_info["doi"])
+    title = re.sub(r'\W+', ' ', paper_info.get("title") or "").strip().lower()
+    return "title:" + hashlib.sha1(title.encode('utf-8')).hexdigest()
+
+def merge_missing_fields(paper_info, fields):
+    """Añade a paper_info los campos que le faltan, sin sobrescribir los existentes"""
+    for key, value in fields.items():
+        if value and (key not in paper_info or not paper_info[key]):
+            paper_info[key] = value
+    return paper_info
+
+def enrich_search_result(paper_info):
+    """
+    Obtiene los campos que le faltan a un resultado de búsqueda (abstract, autores,
+    año y BibTeX) consultando Google Scholar y Crossref solo para esos campos
+    
+    Returns:
+        dict: Campos nuevos obtenidos
+    """
+    original = dict(paper_info)
+    enriched = dict(paper_info)
+    requested = [field for field in ENRICHMENT_FIELDS if not original.get(field)]
+    if original.get("doi") and not original.get("bibtex"):
+        requested.append("bibtex")
+    
+    if any(not enriched.get(field) for field in ENRICHMENT_FIELDS):
+        enriched = ScholarExtractor().enrich_paper_info(enriched)
+    
+    if enriched.get("doi") and not enriched.get("bibtex"):
+        # getBibtex devuelve "" tanto si falla como si Crossref no tiene el BibTeX
+        enriched["bibtex"] = getBibtex(enriched["doi"])
+    
+    fields = {key: value for key, value in enriched.items() if value and not original.get(key)}
+    if original.get("doi"):
+        # Si falta algún campo (p. ej. por un fallo o bloqueo de Scholar o Crossref) se
+        # guarda con el TTL negativo para volver a intentarlo pronto
+        if all(fields.get(field) for field in requested):
+            get_metadata_cache().set(original["doi"], "search_enrichment", fields)
+        else:
+            get_metadata_cache().set_not_found(original["doi"], "search_enrichment")
+    return fields
+
+def enrich_search_results(results, latency_budget=ENRICHMENT_LATENCY_BUDGET):
+    """
+    Enriquece los resultados en paralelo con concurrencia acotada. Los campos que
+    llegan dentro del presupuesto de latencia se añaden directamente; el resto queda
+    pendiente y se consulta después con get_late_enrichment.
+    
+    Returns:
+        list: Resultados con 'enrichment_key' y, si quedan campos pendientes, 'enrichment_pending'
+    """
+    cache = get_metadata_cache()
+    futures = {}
+    
+    for paper_info in results:
+        key = enrichment_key(paper_info)
+        paper_info["enrichment_key"] = key
+        
+        if paper_info.get("doi"):
+            cached, fields = cache.get(paper_info["doi"], "search_enrichment")
+            if cached:
+                merge_missing_fields(paper_info, fields or {})
+                continue
+        
+        needs_scholar = any(not paper_info.get(field) for field in ENRICHMENT_FIELDS)
+        needs_bibtex = paper_info.get("doi") and not paper_info.get("bibtex")
+        if needs_scholar or needs_bibtex:
+            futures[_enrichment_executor.submit(enrich_search_result, dict(paper_info))] = paper_info
+    
+    done, not_done = concurrent.futures.wait(futures, timeout=latency_budget)
+    
+    for future in done:
+        try:
+            merge_missing_fields(futures[future], future.result())
+        except Exception as e:
+            print(f"Error al enriquecer información: {str(e)}")
+    
+    # Los campos que lleguen tarde se entregan por /api/enrichment
+    now = time.time()
+    with _late_enrichment_lock:
+        for key in [key for key, (_, created) in _late_enrichment.items() if now - created > LATE_ENRICHMENT_TTL]:
+            del _late_enrichment[key]
+        for future in not_done:
+            paper_info = futures[future]
+            paper_info["enrichment_pending"] = True
+            _late_enrichment[paper_info["enrichment_key"]] = (future, now)
+    
+    return results
+
+def get_late_enrichment(keys):
+    """
+    Devuelve el estado de los enriquecimientos que no llegaron a tiempo
+    
+    Args:
+        keys: Lista de valores 'enrichment_key' de los resultados
+    
+    Returns:
+        dict: {clave: {"state": "done"|"pending"|"failed"|"unknown", "fields": {...}}}
+    """
+    response = {}
+    with _late_enrichment_lock:
+        entries = {key: _late_enrichment.get(key) for key in keys}
+    
+    for key, entry in entries.items():
+        if entry is None:
+            response[key] = {"state": "unknown"}
+            continue
+        future = entry[0]
+        if not future.done():
+            response[key] = {"state": "pending"}
+        elif future.exception() is not None:
+            response[key] = {"state": "failed", "error": str(future.exception())}
+        else:
+            response[key] = {"state": "done", "fields": future.result()}
+    return response
+
+def search_papers_by_keywords(query, max_results=10, latency_budget=ENRICHMENT_LATENCY_BUDGET):
     """
     Busca papers por título o palabras clave utilizando solicitudes paralelas a Scholar y Crossref
     
     Args:
         query: Texto de búsqueda (título o palabras clave)
         max_results: Número máximo de resultados a devolver
+        latency_budget: Segundos que se espera al enriquecimiento antes de responder
     
     Returns:
         tuple: (resultados_lista, error_mensaje)
@@ -390,17 +560,16 @@ def search_papers_by_keywords(query, max_results=10):
         """Función para buscar en Google Scholar en paralelo"""
         try:
             # Buscar en Google Scholar
-            scholar_papers = ScholarPapersInfo(
+            scholar_papers = list(ScholarPapersInfo(
                 query=query, 
                 scholar_pages=range(1, 2),  # Solo primera página
                 restrict=None, 
-                scholar_results=max_results
-            )
+                scholar_results=max_results,
+                chrome_version=SCHOLAR_CHROME_VERSION
+            ))
             
             if scholar_papers:
-                # Enriquecer con información adicional
-                scholar_extractor = ScholarExtractor()
-                enriched_papers = []
+                scholar_results = []
                 
                 for paper in scholar_papers:
                     if hasattr(paper, 'title') and paper.title:
@@ -415,15 +584,14 @@ def search_papers_by_keywords(query, max_results=10):
                             "cites_num": getattr(paper, 'cites_num', None),
                             "source": "Google Scholar"
                         }
-                        
-                        # Enriquecer con información adicional
-                        paper_info = scholar_extractor.enrich_paper_info(paper_info)
-                        enriched_papers.append(paper_info)
+                        scholar_results.append(paper_info)
                 
-                # Agregar a los resultados combinados
+                # Agregar a los resultados combinados (se enriquecen al final, en paralelo)
                 with results_lock:
-                    combined_results.extend(enriched_papers)
+                    combined_results.extend(scholar_results)
         
+        except ScholarBlockedError as e:
+            errors.append(str(e))
         except Exception as e:
             errors.append(f"Error en Google Scholar: {str(e)}")
     
@@ -481,14 +649,6 @@ def search_papers_by_keywords(query, max_results=10):
                     if "DOI" in paper:
                         paper_info["url"] = f"https://doi.org/{paper['DOI']}"
                     
-                    # Añadir bibtex
-                    if "DOI" in paper:
-                        try:
-                            from .Crossref import getBibtex
-                            paper_info["bibtex"] = getBibtex(paper["DOI"])
-                        except:
-                            pass
-                    
                     crossref_results.append(paper_info)
                     
                 except Exception as e:
@@ -516,40 +676,22 @@ def search_papers_by_keywords(query, max_results=10):
             error_msg += ": " + "; ".join(errors)
         return None, error_msg
     
-    # Eliminar duplicados basados en DOI o título similar
-    unique_results = []
-    seen_dois = set()
-    seen_titles = set()
-    
-    for paper in combined_results:
-        # Normalizar título para comparación
-        title_normalized = paper.get("title", "").lower().strip()
-        doi = paper.get("doi")
-        
-        # Verificar si es un duplicado
-        is_duplicate = False
-        if doi and doi in seen_dois:
-            is_duplicate = True
-        elif title_normalized and any(title_normalized == t for t in seen_titles):
-            is_duplicate = True
-        
-        # Si no es duplicado, añadirlo a los resultados
-        if not is_duplicate:
-            if doi:
-                seen_dois.add(doi)
-            if title_normalized:
-                seen_titles.add(title_normalized)
-            unique_results.append(paper)
-    
+    # Eliminar duplicados (mismo DOI, título casi idéntico o truncado) fusionando sus campos
+    unique_results = deduplicate_papers(combined_results)
+
     # Ordenar por relevancia (actualmente simplificado)
     # En una implementación más avanzada, se podría usar un algoritmo de ranking más sofisticado
-    sorted_results = sorted(unique_results, 
-                           key=lambda x: (x.get("cites_num", 0) or 0) * 10 + 
-                                        (1 if x.get("abstract") else 0) * 5 +
-                                        (1 if x.get("doi") else 0) * 3,
-                           reverse=True)
-    
-    # Limitar el número de resultados
-    final_results = sorted_results[:max_results]
+    def relevance(x):
+        return ((x.get("cites_num", 0) or 0) * 10 +
+                (1 if x.get("abstract") else 0) * 5 +
+                (1 if x.get("doi") else 0) * 3)
+    
+    # Limitar el número de resultados antes de enriquecer, para no consultar de más
+    final_results = sorted(unique_results, key=relevance, reverse=True)[:max_results]
+    
+    # Enriquecer en paralelo y reordenar con los campos obtenidos a tiempo
+    final_results = enrich_search_results(final_results, latency_budget)
+    final_results.sort(key=relevance, reverse=True)
+    index_papers(final_results)
     
     return final_results, None
\ No newline at end of file
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from .Utils import normalizeDOI
+
+# Cuota total del almacén, antigüedad máxima de un PDF y espera tras cerrar el visor
+PDF_STORE_QUOTA = int(os.getenv('PDF_STORE_QUOTA', 2 * 1024 * 1024 * 1024))
+PDF_STORE_MAX_AGE = int(os.getenv('PDF_STORE_MAX_AGE', 7 * 24 * 3600))
+PDF_STORE_GRACE_PERIOD = int(os.getenv('PDF_STORE_GRACE_PERIOD', 5 * 60))
+
+_STORED_NAME = re.compile(r'[0-9a-f]{64}\.pdf')
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class PDFStore:
+    """
+    Almacén de PDFs direccionado por contenido. Cada archivo se guarda una sola vez
+    como <sha256>.pdf y un índice SQLite relaciona los DOIs con su contenido, el
+    tamaño y el último acceso. Los archivos se eliminan por antigüedad, por cuota
+    (los menos usados primero) o al terminar el periodo de gracia tras cerrar el visor.
+    Junto a cada DOI se guardan los metadatos con los que se muestra el artículo.
+    """
+
+    def __init__(self, root_dir, quota_bytes=PDF_STORE_QUOTA, max_age=PDF_STORE_MAX_AGE,
+                 grace_period=PDF_STORE_GRACE_PERIOD):
+        self.root_dir = root_dir
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        self.grace_period = grace_period
+        os.makedirs(root_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._timers = {}
+        self._conn = sqlite3.connect(os.path.join(root_dir, '.pdf_index.sqlite'), check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                closed_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS dois (
+                doi TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL REFERENCES files(sha256)
+            );
+            CREATE INDEX IF NOT EXISTS idx_files_access ON files(last_access);
+        """)
+        # Índices creados antes de guardar los metadatos
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(dois)")]
+        if "metadata" not in columns:
+            self._conn.execute("ALTER TABLE dois ADD COLUMN metadata TEXT")
+        self._conn.commit()
+        self._import_unindexed()
+
+    @staticmethod
+    def filename(sha256):
+        return f"{sha256}.pdf"
+
+    def path(self, sha256):
+        return os.path.join(self.root_dir, self.filename(sha256))
+
+    def lookup(self, doi):
+        """
+        Busca el PDF de un DOI en el almacén sin usar la red
+
+        Returns:
+            str: Nombre del archivo dentro del almacén, o None si no está
+        """
+        doi = normalizeDOI(doi)
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM dois WHERE doi = ?", (doi,)).fetchone()
+            if row is None:
+                return None
+            sha256 = row[0]
+            if not os.path.exists(self.path(sha256)):
+                self._forget(sha256)
+                self._conn.commit()
+                return None
+            self._touch(sha256)
+            self._conn.commit()
+        return self.filename(sha256)
+
+    def metadata(self, doi):
+        """Metadatos guardados con el PDF de un DOI, o None"""
+        doi = normalizeDOI(doi)
+        with self._lock:
+            row = self._conn.execute("SELECT metadata FROM dois WHERE doi = ?", (doi,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def add(self, doi, src_path, metadata=None):
+        """
+        Guarda un PDF descargado en el almacén. Si ya existe un archivo con el mismo
+        contenido, se reutiliza y el archivo de origen se descarta. metadata (título,
+        autores...) se guarda con el DOI para mostrar el artículo sin volver a buscarlo.
+
+        Returns:
+            str: Nombre del archivo dentro del almacén
+        """
+        doi = normalizeDOI(doi)
+        sha256 = file_sha256(src_path)
+        target = self.path(sha256)
+        now = time.time()
+        with self._lock:
+            if os.path.exists(target):
+                os.remove(src_path)
+            else:
+                shutil.move(src_path, target)
+            self._conn.execute(
+                "INSERT INTO files (sha256, size, created_at, last_access) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(sha256) DO UPDATE SET last_access = excluded.last_access, closed_at = NULL",
+                (sha256, os.path.getsize(target), now, now))
+            self._conn.execute("INSERT OR REPLACE INTO dois (doi, sha256, metadata) VALUES (?, ?, ?)",
+                               (doi, sha256, json.dumps(metadata) if metadata else None))
+            self._conn.commit()
+            self._cancel_reaper(sha256)
+            self.evict(keep=sha256)
+        return self.filename(sha256)
+
+    def _import_unindexed(self):
+        # PDFs guardados antes del almacén como <DOI con "/" cambiado por "_">.pdf: se
+        # incorporan para que cuenten en la cuota y se puedan eliminar
+        for name in sorted(os.listdir(self.root_dir)):
+            path = os.path.join(self.root_dir, name)
+            if not name.lower().endswith('.pdf') or _STORED_NAME.fullmatch(name) or not os.path.isfile(path):
+                continue
+            try:
+                self.add(name[:-len('.pdf')].replace('_', '/', 1), path)
+            except OSError as e:
+                print(f"No se pudo incorporar {name} al almacén: {str(e)}")
+
+    def mark_open(self, filename):
+        """Registra que un archivo se está mostrando, cancelando su eliminación pendiente"""
+        sha256 = os.path.splitext(os.path.basename(filename))[0]
+        with self._lock:
+            self._touch(sha256)
+            self._conn.commit()
+            self._cancel_reaper(sha256)
+
+    def close(self, doi):
+        """
+        Registra que se cerró el visor de un DOI y programa la eliminación del PDF
+        cuando termine el periodo de gracia, salvo que se vuelva a abrir antes
+        """
+        doi = normalizeDOI(doi)
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM dois WHERE doi = ?", (doi,)).fetchone()
+            if row is None:
+                return False
+            sha256 = row[0]
+            self._conn.execute("UPDATE files SET closed_at = ? WHERE sha256 = ?", (time.time(), sha256))
+            self._conn.commit()
+            self._cancel_reaper(sha256)
+            timer = threading.Timer(self.grace_period, self._reap, args=(sha256,))
+            timer.daemon = True
+            self._timers[sha256] = timer
+            timer.start()
+        return True
+
+    def _reap(self, sha256):
+        with self._lock:
+            self._timers.pop(sha256, None)
+            row = self._conn.execute("SELECT closed_at, last_access FROM files WHERE sha256 = ?",
+                                     (sha256,)).fetchone()
+            # Solo se elimina si nadie lo volvió a abrir durante el periodo de gracia
+            if row is not None and row[0] is not None and row[1] <= row[0]:
+                self._delete(sha256)
+                self._conn.commit()
+
+    def evict(self, keep=None):
+        """Elimina los PDFs demasiado antiguos y, si se supera la cuota, los menos usados"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT sha256, size, last_access FROM files ORDER BY last_access ASC").fetchall()
+            total = sum(size for _, size, _ in rows)
+            for sha256, size, last_access in rows:
+                if sha256 == keep:
+                    continue
+                if now - last_access > self.max_age or total > self.quota_bytes:
+                    self._delete(sha256)
+                    total -= size
+            self._conn.commit()
+
+    def _touch(self, sha256):
+        self._conn.execute("UPDATE files SET last_access = ?, closed_at = NULL WHERE sha256 = ?",
+                           (time.time(), sha256))
+
+    def _cancel_reaper(self, sha256):
+        timer = self._timers.pop(sha256, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _forget(self, sha256):
+        self._conn.execute("DELETE FROM dois WHERE sha256 = ?", (sha256,))
+        self._conn.execute("DELETE FROM files WHERE sha256 = ?", (sha256,))
+
+    def _delete(self, sha256):
+        self._cancel_reaper(sha256)
+        try:
+            os.remove(self.path(sha256))
+        except OSError:
+            pass
+        self._forget(sha256)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_pdf_store(root_dir):
+    """Devuelve el almacén compartido para un directorio de descargas"""
+    root_dir = os.path.abspath(root_dir)
+    with _stores_lock:
+        if root_dir not in _stores:
+            _stores[root_dir] = PDFStore(root_dir)
+        return _stores[root_dir]
@@ -1,4 +1,6 @@
+import os
 import socket
+import threading
 import pyChainedProxy as socks
 
 def proxy(pchain):
@@ -11,3 +13,37 @@ def proxy(pchain):
 
     rawsocket = socket.socket
     socket.socket = socks.socksocket
+
+
+class ProxyPool:
+    """
+    Proxies to rotate through when Scholar blocks the current IP. Position 0 is the
+    default connection (direct, --single-proxy or the --proxy chain); the others are
+    HTTP(S) proxy URLs used on top of it.
+    """
+
+    def __init__(self, proxies=None):
+        self.proxies = [p.strip() for p in (proxies or []) if p and p.strip()]
+        self._index = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromEnv(cls):
+        return cls(os.getenv('SCHOLAR_PROXY_POOL', '').split(','))
+
+    def __len__(self):
+        return len(self.proxies)
+
+    def current(self):
+        """Return the proxies argument for requests, None for the default connection"""
+        with self._lock:
+            if self._index == 0:
+                return None
+            proxy_url = self.proxies[self._index - 1]
+        return {"http": proxy_url, "https": proxy_url}
+
+    def rotate(self):
+        with self._lock:
+            self._index = (self._index + 1) % (len(self.proxies) + 1)
+            index = self._index
+        print("Switching Scholar connection to {}".format(self.proxies[index - 1] if index else "the default connection"))
@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+from .Utils import getCachePath
+
+# Presupuesto por dominio: peticiones por segundo y ráfaga máxima
+DEFAULT_BUDGET = (5.0, 10)
+HOST_BUDGETS = {
+    "scholar.google.com": (0.5, 3),
+    "api.crossref.org": (10.0, 20),
+    "annas-archive.org": (1.0, 3),
+    "annas-archive.se": (1.0, 3),
+    "annas-archive.li": (1.0, 3),
+}
+SCIHUB_BUDGET = (2.0, 4)
+
+# Ante un 429 o un CAPTCHA la tasa se divide entre dos (hasta MIN_RATE_FRACTION de la
+# tasa base) y se recupera poco a poco con cada respuesta correcta
+MIN_RATE_FRACTION = 1 / 16
+RECOVERY_FRACTION = 0.05
+# Pausa tras un bloqueo sin Retry-After: DEFAULT_COOLDOWN a la tasa base, creciendo al
+# bajar la tasa hasta MAX_COOLDOWN (acquire puede esperar en los hilos de las peticiones)
+DEFAULT_COOLDOWN = float(os.getenv('RATE_LIMIT_COOLDOWN', 10))
+MAX_COOLDOWN = float(os.getenv('RATE_LIMIT_MAX_COOLDOWN', 60))
+
+# Si RATE_LIMIT_SHARED está activo, el presupuesto se comparte entre procesos mediante SQLite
+RATE_LIMIT_SHARED = os.getenv('RATE_LIMIT_SHARED', '0') == '1'
+
+
+class RateLimitExceeded(Exception):
+    """El dominio está en pausa tras un bloqueo y la espera supera la permitida"""
+
+    def __init__(self, host, wait):
+        self.host = host
+        self.wait = wait
+        super().__init__("{} está en pausa tras un bloqueo, reintente en {:.0f} s".format(host, wait))
+
+
+def _host(url):
+    return (urlparse(url).netloc or url).lower()
+
+
+def host_budget(host):
+    if host in HOST_BUDGETS:
+        return HOST_BUDGETS[host]
+    if host.startswith("sci-hub."):
+        return SCIHUB_BUDGET
+    return DEFAULT_BUDGET
+
+
+def _new_state(base_rate, burst, now):
+    return {"tokens": float(burst), "updated": now, "rate": base_rate, "blocked_until": 0.0}
+
+
+def _refill(state, burst, now):
+    elapsed = max(0.0, now - state["updated"])
+    state["tokens"] = min(float(burst), state["tokens"] + elapsed * state["rate"])
+    state["updated"] = now
+
+
+class _LocalStore:
+    """Estado de los presupuestos en memoria, compartido entre los hilos del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def update(self, host, fn):
+        with self._lock:
+            state = self._states.get(host)
+            result, state = fn(state)
+            self._states[host] = state
+            return result
+
+
+class _SQLiteStore:
+    """Estado de los presupuestos en SQLite, compartido entre procesos de la misma máquina"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets (host TEXT PRIMARY KEY, state TEXT NOT NULL)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def update(self, host, fn):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state FROM buckets WHERE host = ?", (host,)).fetchone()
+            result, state = fn(json.loads(row[0]) if row else None)
+            conn.execute("INSERT OR REPLACE INTO buckets (host, state) VALUES (?, ?)", (host, json.dumps(state)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+
+class RateLimiter:
+    """
+    Planificador de peticiones con un token bucket por dominio. Sustituye las esperas
+    aleatorias: solo se espera cuando el dominio ha agotado su presupuesto, y el
+    presupuesto se reduce automáticamente cuando el servidor responde con 429 o CAPTCHA.
+    """
+
+    def __init__(self, shared=RATE_LIMIT_SHARED, path=None):
+        self._store = _SQLiteStore(path or getCachePath('rate_limits.sqlite')) if shared else _LocalStore()
+
+    def acquire(self, url, max_wait=None):
+        """
+        Bloquea hasta que el dominio de la URL tenga presupuesto para una petición. Con
+        max_wait, si el dominio está en pausa tras un bloqueo y quedan más de max_wait
+        segundos, lanza RateLimitExceeded en lugar de esperar (max_wait=0: sin esperas).
+        """
+        host = _host(url)
+        base_rate, burst = host_budget(host)
+
+        def take(state):
+            now = time.time()
+            if state is None:
+                state = _new_state(base_rate, burst, now)
+            _refill(state, burst, now)
+            if now < state["blocked_until"]:
+                if max_wait is not None and state["blocked_until"] - now > max_wait:
+                    raise RateLimitExceeded(host, state["blocked_until"] - now)
+                return state["blocked_until"] - now, state
+            if state["tokens"] >= 1:
+                state["tokens"] -= 1
+                return 0.0, state
+            return (1 - state["tokens"]) / state["rate"], state
+
+        while True:
+            wait = self._store.update(host, take)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def penalize(self, url, retry_after=None):
+        """Reduce el presupuesto del dominio tras un 429, un bloqueo o un CAPTCHA"""
+        host = _host(url)
+        base_rate, burst = host_budget(host)
+
+        def slow_down(state):
+            now = time.time()
+            if state is None:
+                state = _new_state(base_rate, burst, now)
+            _refill(state, burst, now)
+            state["rate"] = max(base_rate * MIN_RATE_FRACTION, state["rate"] / 2)
+            state["tokens"] = 0.0
+            if retry_after is not None:
+                cooldown = retry_after
+            else:
+                cooldown = min(MAX_COOLDOWN, DEFAULT_COOLDOWN * base_rate / state["rate"])
+            state["blocked_until"] = max(state["blocked_until"], now + cooldown)
+            return None, state
+
+        self._store.update(host, slow_down)
+        print("Rate limit reached on {}, slowing down".format(host))
+
+    def cooldown_remaining(self, url):
+        """Segundos que faltan para que termine la pausa impuesta al dominio tras un bloqueo"""
+        host = _host(url)
+
+        def remaining(state):
+            if state is None:
+                return 0.0, state
+            return max(0.0, state["blocked_until"] - time.time()), state
+
+        return self._store.update(host, remaining)
+
+    def reward(self, url):
+        """Recupera poco a poco la tasa base del dominio tras una respuesta correcta"""
+        host = _host(url)
+        base_rate, burst = host_budget(host)
+
+        def speed_up(state):
+            if state is not None and state["rate"] < base_rate:
+                state["rate"] = min(base_rate, state["rate"] + base_rate * RECOVERY_FRACTION)
+            return None, state
+
+        self._store.update(host, speed_up)
+
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Devuelve el planificador compartido por todos los módulos"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+        return _limiter
@@ -1,9 +1,83 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import datetime
 import numpy as np
 import re
-import requests
+from .http_client import http_get
 from .Crossref import getPapersInfoFromDOIs
+from .Utils import normalizeDOI
+from .paper_index import get_paper_index, index_papers, paper_key
+from .citation_graph import get_citation_graph, record_crossref_works
+
+# Pesos de la puntuación final: similitud de contenido, citas, antigüedad y cercanía en
+# el grafo de citas (co-citación, acoplamiento bibliográfico y citas directas)
+SIMILARITY_WEIGHT = 0.7
+CITATION_WEIGHT = 0.2
+RECENCY_WEIGHT = 0.1
+GRAPH_WEIGHT = 0.3
+# Años tras los que la puntuación de actualidad de un artículo se reduce a la mitad
+RECENCY_HALF_LIFE = 5
+MAX_RELATED_RESULTS = 10
+# Candidatos que se toman del índice local y similitud a partir de la cual un candidato
+# local cuenta como parecido; con MAX_RELATED_RESULTS parecidos no se consulta Crossref
+LOCAL_CANDIDATES = 50
+GRAPH_CANDIDATES = 30
+LOCAL_MIN_SIMILARITY = 0.3
+
+_TAGS = re.compile(r'<[^>]+>')
+
+
+def _paper_text(paper):
+    # Crossref devuelve los resúmenes en JATS (<jats:p>...), las etiquetas no aportan al TF-IDF
+    return _TAGS.sub(' ', f"{paper.get('title') or ''} {paper.get('abstract') or ''}")
+
+
+def _citation_scores(candidates):
+    cites = np.array([paper.get('citation_count') or 0 for paper in candidates], dtype=np.float64)
+    cites = np.log1p(np.maximum(cites, 0))
+    top = cites.max() if len(cites) else 0
+    return cites / top if top > 0 else np.zeros(len(cites))
+
+
+def _recency_scores(candidates, current_year=None):
+    current_year = current_year or datetime.date.today().year
+    years = np.array([paper.get('year') or np.nan for paper in candidates], dtype=np.float64)
+    age = np.maximum(current_year - years, 0)
+    # Los artículos sin año no suman por actualidad
+    return np.nan_to_num(0.5 ** (age / RECENCY_HALF_LIFE), nan=0.0)
+
+
+def rank_related_papers(seed_text, candidates, limit=MAX_RELATED_RESULTS, graph_scores=None):
+    """
+    Ordena los candidatos respecto al texto del artículo original. Se ajusta una única
+    matriz TF-IDF dispersa sobre el artículo y los candidatos y la similitud coseno de
+    todos ellos se obtiene con un solo producto de matrices (las filas ya están
+    normalizadas), combinada con las citas y la antigüedad de cada candidato y, si se
+    indica, con su puntuación en el grafo de citas (diccionario por clave de artículo).
+
+    Returns:
+        list: Pares (índice del candidato, similitud, puntuación), de mayor a menor puntuación
+    """
+    if not candidates:
+        return []
+
+    vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True, strip_accents='unicode')
+    try:
+        matrix = vectorizer.fit_transform([seed_text] + [_paper_text(paper) for paper in candidates])
+        similarity = (matrix[1:] @ matrix[0].T).toarray().ravel()
+    except ValueError:
+        # Ningún texto tiene términos fuera de las stop words
+        similarity = np.zeros(len(candidates))
+
+    scores = (SIMILARITY_WEIGHT * similarity
+              + CITATION_WEIGHT * _citation_scores(candidates)
+              + RECENCY_WEIGHT * _recency_scores(candidates))
+    if graph_scores:
+        graph = np.array([graph_scores.get(paper_key(paper), 0) for paper in candidates], dtype=np.float64)
+        if graph.max() > 0:
+            scores += GRAPH_WEIGHT * graph / graph.max()
+    order = np.argsort(-scores, kind='stable')[:limit]
+    return [(int(i), float(similarity[i]), float(scores[i])) for i in order]
+
 
 # Función para buscar artículos relacionados
 def find_related_papers(paper_id, context='', model='tfidf'):
@@ -11,10 +85,21 @@ def find_related_papers(paper_id, context='', model='tfidf'):
     Encuentra artículos relacionados basados en el contenido y contexto
     """
     try:
-        # Obtener el artículo original
-        original_paper = getPapersInfoFromDOIs(paper_id, restrict=1)
+        seed_doi = normalizeDOI(paper_id)
+        index = get_paper_index()
+
+        # Obtener el artículo original, del índice local si ya se resolvió antes; la
+        # consulta a Crossref registra también sus referencias en el grafo de citas
+        original_paper = index.get(seed_doi)
+        if original_paper is None:
+            original_paper = next(iter(get_crossref_papers([seed_doi])), None)
+            index_papers([original_paper] if original_paper else [])
+        if original_paper is None:
+            paper = getPapersInfoFromDOIs(paper_id, restrict=1)
+            if paper and paper.DOI and paper.title:
+                original_paper = {'title': paper.title, 'abstract': paper.abstract, 'doi': seed_doi}
         
-        if not original_paper or not original_paper.DOI:
+        if not original_paper:
             return {
                 'success': False,
                 'error': 'No se encontró el artículo original',
@@ -22,8 +107,8 @@ def find_related_papers(paper_id, context='', model='tfidf'):
             }
         
         # Preparar el texto para análisis
-        title = original_paper.title if hasattr(original_paper, 'title') and original_paper.title else ""
-        abstract = getattr(original_paper, 'abstract', '')
+        title = original_paper.get('title') or ""
+        abstract = _TAGS.sub(' ', original_paper.get('abstract') or "")
         text_to_analyze = f"{title} {abstract} {context}".strip()
         
         if not text_to_analyze:
@@ -33,17 +118,44 @@ def find_related_papers(paper_id, context='', model='tfidf'):
                 'model': model
             }
         
-        # Obtener palabras clave
-        keywords = extract_keywords(text_to_analyze)
-        if not keywords:
-            return {
-                'success': False,
-                'error': 'No se pudieron extraer palabras clave',
-                'model': model
-            }
+        # Vecinos en el grafo de citas; las referencias del artículo se piden una sola vez
+        graph = get_citation_graph()
+        if not graph.is_fetched(seed_doi):
+            index_papers(get_crossref_papers([seed_doi]))
+        neighbours = graph.related(seed_doi, k=GRAPH_CANDIDATES)
+        graph_scores = {neighbour['doi']: neighbour['score'] for neighbour in neighbours}
+        graph_papers = {doi: index.get(doi) for doi in graph_scores}
+        missing = [doi for doi, paper in graph_papers.items() if paper is None]
+        if missing:
+            fetched = get_crossref_papers(missing)
+            index_papers(fetched)
+            graph_papers.update((normalizeDOI(paper['doi']), paper) for paper in fetched if paper.get('doi'))
+        related_papers = [paper for paper in graph_papers.values() if paper]
         
-        # Buscar artículos relacionados en Crossref
-        related_papers = search_crossref_papers(' '.join(keywords))
+        # Candidatos del índice local; solo se hace una búsqueda por palabras clave en
+        # Crossref si entre el grafo y el índice no hay suficientes artículos parecidos
+        local_matches = index.search(text_to_analyze, k=LOCAL_CANDIDATES, exclude=[seed_doi])
+        known = {paper_key(paper) for paper in related_papers}
+        related_papers += [paper for paper, similarity in local_matches if paper_key(paper) not in known]
+        close_matches = len(known) + sum(similarity >= LOCAL_MIN_SIMILARITY and paper_key(paper) not in known
+                                         for paper, similarity in local_matches)
+        
+        if close_matches < MAX_RELATED_RESULTS:
+            # Obtener palabras clave
+            keywords = extract_keywords(text_to_analyze)
+            if not keywords and not related_papers:
+                return {
+                    'success': False,
+                    'error': 'No se pudieron extraer palabras clave',
+                    'model': model
+                }
+            
+            # Buscar artículos relacionados en Crossref, sin incluir el mismo paper
+            crossref_papers = [paper for paper in (search_crossref_papers(' '.join(keywords)) if keywords else [])
+                               if not paper.get('doi') or normalizeDOI(paper['doi']) != seed_doi]
+            index_papers([original_paper] + crossref_papers)
+            known = {paper_key(paper) for paper in related_papers}
+            related_papers += [paper for paper in crossref_papers if paper_key(paper) not in known]
         
         if not related_papers:
             return {
@@ -52,52 +164,25 @@ def find_related_papers(paper_id, context='', model='tfidf'):
                 'model': model
             }
         
-        # Verificar que hay suficientes datos
-        if len(related_papers) < 1:
-            return {
-                'success': False,
-                'error': 'No hay suficientes artículos para comparar',
-                'model': model
-            }
-        
-        # Calcular similitud sin usar matrices TF-IDF para evitar errores
-        # Usar las palabras clave directamente para puntuar
         results = []
-        for paper in related_papers:
-            # Crear texto completo del paper
-            paper_text = f"{paper.get('title', '')} {paper.get('abstract', '')}"
-            
-            # Calcular cuántas keywords están en el texto del paper (puntuación simple)
-            score = 0
-            for keyword in keywords:
-                if keyword.lower() in paper_text.lower():
-                    score += 1
-            
-            # Normalizar puntuación
-            similarity = score / len(keywords) if keywords else 0
-            
-            # Evitar incluir el mismo paper
-            if paper.get('doi') == paper_id:
-                continue
-                
+        for i, similarity, score in rank_related_papers(text_to_analyze, related_papers, graph_scores=graph_scores):
+            paper = related_papers[i]
             results.append({
                 'title': paper.get('title', 'Sin título'),
-                'authors': paper.get('authors', ['Autores desconocidos']),
-                'abstract': paper.get('abstract', ''),
+                'authors': paper.get('authors') or ['Autores desconocidos'],
+                'abstract': _TAGS.sub(' ', paper.get('abstract') or '').strip(),
                 'doi': paper.get('doi', ''),
                 'url': paper.get('url', ''),
                 'year': paper.get('year', None),
+                'journal': paper.get('journal', ''),
                 'cites_num': paper.get('citation_count', None),
-                'similarity_score': float(similarity)
+                'similarity_score': similarity,
+                'score': score
             })
         
-        # Ordenar por puntuación de similitud
-        results.sort(key=lambda x: x['similarity_score'], reverse=True)
-        
-        # Devolver solo los 10 primeros resultados
         return {
             'success': True,
-            'results': results[:10],
+            'results': results,
             'model': model
         }
     
@@ -136,82 +221,99 @@ def extract_keywords(text, max_keywords=10):
     # Devolver las palabras más frecuentes
     return [word for word, freq in sorted_words[:max_keywords]]
 
+CROSSREF_HEADERS = {
+    'User-Agent': 'ResearchAssistant/1.0 (mailto:example@example.com)'
+}
+CROSSREF_FIELDS = 'DOI,title,abstract,author,published-print,published-online,container-title,reference,is-referenced-by-count'
+
+
+def _crossref_paper(item):
+    """Convierte un registro de Crossref en el diccionario de artículo que usa el buscador"""
+    # Extraer título
+    title = item.get('title', [''])[0] if item.get('title') and len(item['title']) > 0 else 'Sin título'
+    
+    # Extraer autores
+    authors = []
+    if 'author' in item:
+        for author in item['author']:
+            name_parts = []
+            if 'given' in author:
+                name_parts.append(author['given'])
+            if 'family' in author:
+                name_parts.append(author['family'])
+            if name_parts:
+                authors.append(' '.join(name_parts))
+    
+    # Extraer año de publicación
+    year = None
+    if 'published-print' in item and 'date-parts' in item['published-print']:
+        year = item['published-print']['date-parts'][0][0]
+    elif 'published-online' in item and 'date-parts' in item['published-online']:
+        year = item['published-online']['date-parts'][0][0]
+    
+    # Extraer resumen
+    abstract = item.get('abstract', '')
+    
+    # Extraer DOI
+    doi = item.get('DOI', '')
+    
+    # Extraer revista
+    journal = item.get('container-title', [''])[0] if item.get('container-title') and len(item['container-title']) > 0 else ''
+    
+    # Extraer número de citas
+    citation_count = item.get('is-referenced-by-count', 0)
+    
+    return {
+        'title': title,
+        'authors': authors,
+        'year': year,
+        'abstract': abstract,
+        'doi': doi,
+        'journal': journal,
+        'citation_count': citation_count,
+        'url': f"https://doi.org/{doi}" if doi else None
+    }
+
+
+def _crossref_works(params):
+    response = http_get("https://api.crossref.org/works", params=dict(params, select=CROSSREF_FIELDS),
+                        headers=CROSSREF_HEADERS, timeout=15)
+    
+    if response.status_code != 200:
+        return []
+        
+    data = response.json()
+    
+    if 'message' not in data or 'items' not in data['message']:
+        return []
+    
+    items = data['message']['items']
+    # Las listas de referencias alimentan el grafo de citas
+    record_crossref_works(items)
+    return [_crossref_paper(item) for item in items]
+
+
 def search_crossref_papers(query, max_results=30):
     """
     Busca artículos científicos en Crossref
     """
-    headers = {
-        'User-Agent': 'ResearchAssistant/1.0 (mailto:example@example.com)'
-    }
-    
     try:
-        url = "https://api.crossref.org/works"
-        params = {
-            'query': query,
-            'rows': max_results,
-            'sort': 'relevance',
-            'select': 'DOI,title,abstract,author,published-print,published-online,container-title,reference,is-referenced-by-count'
-        }
-        
-        response = requests.get(url, params=params, headers=headers, timeout=15)
-        
-        if response.status_code != 200:
-            return []
-            
-        data = response.json()
-        
-        if 'message' not in data or 'items' not in data['message']:
-            return []
-            
-        results = []
-        for item in data['message']['items']:
-            # Extraer título
-            title = item.get('title', [''])[0] if item.get('title') and len(item['title']) > 0 else 'Sin título'
-            
-            # Extraer autores
-            authors = []
-            if 'author' in item:
-                for author in item['author']:
-                    name_parts = []
-                    if 'given' in author:
-                        name_parts.append(author['given'])
-                    if 'family' in author:
-                        name_parts.append(author['family'])
-                    if name_parts:
-                        authors.append(' '.join(name_parts))
-            
-            # Extraer año de publicación
-            year = None
-            if 'published-print' in item and 'date-parts' in item['published-print']:
-                year = item['published-print']['date-parts'][0][0]
-            elif 'published-online' in item and 'date-parts' in item['published-online']:
-                year = item['published-online']['date-parts'][0][0]
-            
-            # Extraer resumen
-            abstract = item.get('abstract', '')
-            
-            # Extraer DOI
-            doi = item.get('DOI', '')
-            
-            # Extraer revista
-            journal = item.get('container-title', [''])[0] if item.get('container-title') and len(item['container-title']) > 0 else ''
-            
-            # Extraer número de citas
-            citation_count = item.get('is-referenced-by-count', 0)
-            
-            results.append({
-                'title': title,
-                'authors': authors,
-                'year': year,
-                'abstract': abstract,
-                'doi': doi,
-                'journal': journal,
-                'citation_count': citation_count,
-                'url': f"https://doi.org/{doi}" if doi else None
-            })
-            
-        return results
-    
+        return _crossref_works({'query': query, 'rows': max_results, 'sort': 'relevance'})
     except Exception as e:
         print(f"Error buscando en Crossref: {str(e)}")
-        return [] 
\ No newline at end of file
+        return []
+
+
+def get_crossref_papers(dois):
+    """
+    Obtiene de Crossref los registros de una lista de DOIs con una única consulta
+    (los filtros doi: de la misma consulta se combinan con OR)
+    """
+    dois = [doi for doi in dois if doi and ',' not in doi]
+    if not dois:
+        return []
+    try:
+        return _crossref_works({'filter': ','.join('doi:' + doi for doi in dois), 'rows': len(dois)})
+    except Exception as e:
+        print(f"Error consultando Crossref: {str(e)}")
+        return []
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import time
+import aiohttp
+from .HTMLparsers import getSciHubPDFLink
+from .mirror_health import get_mirror_registry
+
+# Lista de espejos de Sci-Hub a probar
+SCIHUB_MIRRORS = [
+    "https://sci-hub.ee",
+    "https://sci-hub.se",
+    "https://sci-hub.st",
+    "https://sci-hub.ru",
+    "https://sci-hub.cat",
+    "https://sci-hub.wf",
+    "https://sci-hub.ren",
+    "https://sci-hub.mksa.top",
+    "https://sci-hub.mk"
+]
+
+# Número de espejos consultados a la vez, tiempo máximo por espejo y plazo total
+SCIHUB_FANOUT = int(os.getenv('SCIHUB_FANOUT', 4))
+SCIHUB_MIRROR_TIMEOUT = float(os.getenv('SCIHUB_MIRROR_TIMEOUT', 10))
+SCIHUB_DEADLINE = float(os.getenv('SCIHUB_DEADLINE', 20))
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Referer': 'https://www.google.com/',
+    'DNT': '1',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0',
+}
+
+
+def extract_pdf_link(html, page_url):
+    """
+    Extrae el enlace del PDF del iframe/embed con id 'pdf' de una página de Sci-Hub
+
+    Returns:
+        str: Enlace absoluto del PDF o None si la página no lo contiene
+    """
+    return getSciHubPDFLink(html, page_url)
+
+
+def is_cloudflare_challenge(status, headers, html):
+    """Detecta las páginas de desafío de Cloudflare que bloquean el acceso al espejo"""
+    if status not in (403, 429, 503):
+        return False
+    server = headers.get('Server', '') if headers else ''
+    return 'cloudflare' in server.lower() or 'Just a moment' in html or 'challenge-platform' in html
+
+
+async def _probe_mirror(session, mirror, doi, semaphore):
+    """Consulta un espejo y devuelve (enlace_pdf, url_pagina) o None"""
+    registry = get_mirror_registry()
+    url = f"{mirror}/{doi}"
+    async with semaphore:
+        print(f"Trying with {mirror}...")
+        started = time.monotonic()
+        try:
+            async with session.get(url) as response:
+                html = await response.text(errors='ignore')
+                latency = time.monotonic() - started
+                if response.status != 200:
+                    print(f"Mirror {mirror} answered with status {response.status}")
+                    registry.record_failure(mirror, latency,
+                                            cloudflare=is_cloudflare_challenge(response.status, response.headers, html),
+                                            error=f"HTTP {response.status}")
+                    return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error de red o de HTTP con el espejo {mirror}: {str(e) or type(e).__name__}")
+            registry.record_failure(mirror, time.monotonic() - started, error=str(e) or type(e).__name__)
+            return None
+
+    # El espejo respondió aunque no tenga el artículo: cuenta como espejo sano
+    registry.record_success(mirror, latency)
+
+    download_link = extract_pdf_link(html, url)
+    if download_link is None:
+        return None
+    return download_link, url
+
+
+async def resolve_scihub_link_async(doi, mirrors=None, fanout=SCIHUB_FANOUT,
+                                    mirror_timeout=SCIHUB_MIRROR_TIMEOUT, deadline=SCIHUB_DEADLINE):
+    """
+    Consulta los espejos de Sci-Hub de forma concurrente y devuelve el primer
+    enlace válido al PDF, cancelando el resto de peticiones pendientes
+
+    Args:
+        doi: DOI del artículo
+        mirrors: Espejos a consultar; se prueban según su estado en el registro de espejos
+        fanout: Número máximo de espejos consultados a la vez
+        mirror_timeout: Tiempo máximo (s) de cada petición
+        deadline: Tiempo máximo (s) de toda la búsqueda
+
+    Returns:
+        tuple: (enlace_pdf, url_pagina) o (None, None) si ningún espejo lo tiene
+    """
+    mirrors = get_mirror_registry().rank(mirrors or SCIHUB_MIRRORS)
+    semaphore = asyncio.Semaphore(max(1, fanout))
+    timeout = aiohttp.ClientTimeout(total=mirror_timeout)
+
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout) as session:
+        tasks = [asyncio.ensure_future(_probe_mirror(session, mirror, doi, semaphore)) for mirror in mirrors]
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=deadline):
+                result = await next_done
+                if result is not None:
+                    return result
+        except asyncio.TimeoutError:
+            print(f"No Sci-Hub mirror answered within {deadline} seconds")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    return None, None
+
+
+def resolve_scihub_link(doi, mirrors=None, fanout=SCIHUB_FANOUT,
+                        mirror_timeout=SCIHUB_MIRROR_TIMEOUT, deadline=SCIHUB_DEADLINE):
+    """Versión bloqueante de resolve_scihub_link_async para código síncrono"""
+    return asyncio.run(resolve_scihub_link_async(doi, mirrors, fanout, mirror_timeout, deadline))
@@ -0,0 +1,151 @@
+import os
+import requests
+from .http_client import http_get
+
+# Tamaño máximo aceptado para un PDF y tamaño de los bloques escritos en disco
+MAX_PDF_BYTES = int(os.getenv('MAX_PDF_BYTES', 200 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+# Según la especificación, la cabecera %PDF debe aparecer en los primeros 1024 bytes
+PDF_MAGIC = b'%PDF'
+PDF_MAGIC_WINDOW = 1024
+
+
+def _has_pdf_magic(head):
+    return PDF_MAGIC in head[:PDF_MAGIC_WINDOW]
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def save_response_stream(response, output_path, max_bytes=MAX_PDF_BYTES, append=False, check_magic=True):
+    """
+    Escribe el cuerpo de una respuesta (pedida con stream=True) en disco por bloques
+
+    Args:
+        response: Respuesta de requests con el cuerpo sin leer
+        output_path: Ruta del archivo donde escribir
+        max_bytes: Tamaño máximo permitido del archivo completo
+        append: Si es True, continúa un archivo parcial existente
+        check_magic: Si es True, descarta la respuesta si no empieza como un PDF
+
+    Returns:
+        bool: True si se escribió el cuerpo completo. Si la conexión se corta, el
+        archivo parcial se conserva para reanudar la descarga; si el contenido no es
+        un PDF o supera el tamaño máximo, se elimina
+    """
+    written = os.path.getsize(output_path) if append and os.path.exists(output_path) else 0
+
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit() and written + int(content_length) > max_bytes:
+        print(f"File too large ({written + int(content_length)} bytes), skipping {response.url}")
+        response.close()
+        return False
+
+    head = b''
+    try:
+        with open(output_path, 'ab' if append else 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                written += len(chunk)
+                if written > max_bytes:
+                    print(f"File exceeds the size limit of {max_bytes} bytes, skipping {response.url}")
+                    f.close()
+                    _remove(output_path)
+                    return False
+
+                # Comprobar la cabecera %PDF antes de escribir nada para descartar páginas de error
+                if check_magic and not append and len(head) < PDF_MAGIC_WINDOW:
+                    head += chunk
+                    if len(head) < PDF_MAGIC_WINDOW:
+                        continue
+                    if not _has_pdf_magic(head):
+                        print(f"Response is not a PDF, skipping {response.url}")
+                        f.close()
+                        _remove(output_path)
+                        return False
+                    f.write(head)
+                    continue
+
+                f.write(chunk)
+
+            if head and len(head) < PDF_MAGIC_WINDOW:
+                if not _has_pdf_magic(head):
+                    print(f"Response is not a PDF, skipping {response.url}")
+                    f.close()
+                    _remove(output_path)
+                    return False
+                f.write(head)
+    except requests.exceptions.RequestException as e:
+        print(f"Download interrupted after {written} bytes: {str(e)}")
+        return False
+    finally:
+        response.close()
+
+    if written == 0:
+        _remove(output_path)
+        return False
+    return True
+
+
+def download_pdf(url, output_path, session=None, headers=None, timeout=60, max_bytes=MAX_PDF_BYTES):
+    """
+    Descarga un PDF por bloques a un archivo temporal y lo renombra de forma atómica.
+    Si existe una descarga parcial previa, se reanuda con una petición HTTP Range.
+
+    Args:
+        url: URL del PDF
+        output_path: Ruta final del archivo
+        session: Sesión de requests (o cloudscraper) a usar; por defecto la sesión compartida del dominio
+        headers: Cabeceras adicionales de la petición
+        timeout: Tiempo máximo de espera de la conexión y entre bloques
+        max_bytes: Tamaño máximo permitido
+
+    Returns:
+        bool: True si el PDF se descargó completo, False en caso contrario
+    """
+    part_path = output_path + '.part'
+    request_headers = dict(headers or {})
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset > 0:
+        with open(part_path, 'rb') as f:
+            if not _has_pdf_magic(f.read(PDF_MAGIC_WINDOW)):
+                offset = 0
+        if offset > 0:
+            request_headers['Range'] = f"bytes={offset}-"
+        else:
+            _remove(part_path)
+
+    try:
+        if session is not None:
+            response = session.get(url, headers=request_headers, timeout=timeout, stream=True)
+        else:
+            response = http_get(url, headers=request_headers, timeout=timeout, stream=True)
+    except requests.exceptions.RequestException as e:
+        print(f"Error downloading {url}: {str(e)}")
+        return False
+
+    if response.status_code == 416 and offset > 0:
+        # El archivo parcial ya contiene todo el contenido
+        response.close()
+        os.replace(part_path, output_path)
+        return True
+
+    if response.status_code not in (200, 206):
+        print(f"Error downloading {url}: HTTP {response.status_code}")
+        response.close()
+        return False
+
+    # Si el servidor ignora el Range, la descarga empieza desde cero
+    append = offset > 0 and response.status_code == 206
+    if not save_response_stream(response, part_path, max_bytes=max_bytes, append=append):
+        return False
+
+    os.replace(part_path, output_path)
+    return True
@@ -0,0 +1,166 @@
+import concurrent.futures
+import gc
+import os
+import queue
+import threading
+import time
+
+# Modelo y modo de ejecución: "torch" (modelo completo), "torch-int8" (cuantización
+# dinámica de las capas lineales, para CPU) u "onnx" (ONNX Runtime, requiere
+# optimum[onnxruntime]). Los modos para CPU usan por defecto un modelo destilado.
+SUMMARIZER_BACKEND = os.getenv('SUMMARIZER_BACKEND', 'torch')
+SUMMARIZER_MODEL = os.getenv('SUMMARIZER_MODEL') or (
+    'facebook/bart-large-cnn' if SUMMARIZER_BACKEND == 'torch' else 'sshleifer/distilbart-cnn-12-6')
+# Segundos sin peticiones tras los que se descarga el modelo de memoria
+SUMMARIZER_IDLE_TIMEOUT = float(os.getenv('SUMMARIZER_IDLE_TIMEOUT', 600))
+# Secciones por pasada del modelo y espera máxima para reunir secciones de varias peticiones
+SUMMARIZER_BATCH_SIZE = int(os.getenv('SUMMARIZER_BATCH_SIZE', 8))
+SUMMARIZER_BATCH_WAIT = float(os.getenv('SUMMARIZER_BATCH_WAIT', 0.05))
+
+BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+
+class _Request:
+    __slots__ = ('text', 'options', 'future')
+
+    def __init__(self, text, options):
+        self.text = text
+        self.options = options
+        self.future = concurrent.futures.Future()
+
+
+class SummarizationModel:
+    """
+    Pipeline de resumen compartido por todo el proceso. El modelo se carga con la
+    primera petición y se descarga tras un tiempo sin uso. Las secciones de todas las
+    peticiones pasan por una cola: un único hilo las agrupa en lotes (hasta batch_size
+    secciones o batch_wait segundos) y resume cada lote con una sola llamada al modelo.
+    """
+
+    def __init__(self, model_name=SUMMARIZER_MODEL, backend=SUMMARIZER_BACKEND, batch_size=SUMMARIZER_BATCH_SIZE,
+                 batch_wait=SUMMARIZER_BATCH_WAIT, idle_timeout=SUMMARIZER_IDLE_TIMEOUT):
+        if backend not in BACKENDS:
+            raise ValueError(f"Modo de ejecución no soportado: {backend}")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.idle_timeout = idle_timeout
+        self._pipeline = None
+        self._last_used = time.monotonic()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    def _load(self):
+        from transformers import AutoTokenizer, pipeline
+
+        print(f"Cargando el modelo de resumen {self.model_name} ({self.backend})")
+        if self.backend == 'onnx':
+            try:
+                from optimum.onnxruntime import ORTModelForSeq2SeqLM
+            except ImportError:
+                raise ImportError("El modo onnx requiere optimum con ONNX Runtime (pip install optimum[onnxruntime])")
+            model = ORTModelForSeq2SeqLM.from_pretrained(self.model_name, export=True)
+            return pipeline('summarization', model=model, tokenizer=AutoTokenizer.from_pretrained(self.model_name))
+
+        summarizer = pipeline('summarization', model=self.model_name)
+        if self.backend == 'torch-int8':
+            import torch
+            summarizer.model = torch.quantization.quantize_dynamic(summarizer.model, {torch.nn.Linear},
+                                                                   dtype=torch.qint8)
+        return summarizer
+
+    def _get_pipeline(self):
+        with self._lock:
+            if self._pipeline is None:
+                self._pipeline = self._load()
+            self._last_used = time.monotonic()
+            return self._pipeline
+
+    def unload(self):
+        """Libera el modelo; se vuelve a cargar con la siguiente petición"""
+        with self._lock:
+            if self._pipeline is None:
+                return
+            self._pipeline = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        print(f"Modelo de resumen {self.model_name} descargado por inactividad")
+
+    def summarize(self, texts, max_length=130, min_length=30):
+        """
+        Resume una lista de textos; las secciones se procesan en lote junto con las de
+        otras peticiones concurrentes.
+
+        Returns:
+            list: Un resumen por texto, en el mismo orden
+        """
+        options = (('max_length', max_length), ('min_length', min_length), ('do_sample', False))
+        requests = [_Request(text, options) for text in texts]
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        for request in requests:
+            self._queue.put(request)
+        return [request.future.result() for request in requests]
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=min(self.idle_timeout, 60))]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if self._pipeline is not None and time.monotonic() - self._last_used >= self.idle_timeout:
+                    self.unload()
+                continue
+
+            # Solo se resumen juntas las secciones pedidas con los mismos parámetros
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.options, []).append(request)
+            for options, group in groups.items():
+                try:
+                    summarizer = self._get_pipeline()
+                    outputs = summarizer([request.text for request in group], batch_size=len(group),
+                                         truncation=True, **dict(options))
+                    for request, output in zip(group, outputs):
+                        request.future.set_result(output['summary_text'])
+                except Exception as e:
+                    for request in group:
+                        request.future.set_exception(e)
+                finally:
+                    self._last_used = time.monotonic()
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_summarization_model():
+    """Devuelve el modelo de resumen compartido; no carga el modelo hasta la primera petición"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = SummarizationModel()
+        return _model
@@ -4,6 +4,8 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentPaperInfo = null;
     let selectedSourceIndex = 0;
     let searchTimeout = null;
+    // Contador de búsquedas: las respuestas y sondeos de una búsqueda anterior se descartan
+    let busquedaActual = 0;
 
     // Elementos del DOM
     const searchForm = document.getElementById('searchForm');
@@ -26,6 +28,8 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
         
+        busquedaActual++;
+        
         // Mostrar mensaje de búsqueda inicial
         resultsDiv.innerHTML = '<div class="alert alert-info"><i class="fas fa-spinner fa-spin me-2"></i>Buscando información del artículo...</div>';
         closePDF(); // Cierra cualquier visor abierto antes de nueva búsqueda
@@ -48,7 +52,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 mostrarFuentesArticulo(data.info);
                 
                 // Actualizar la UI cuando el enlace de descarga esté disponible
-                if (data.info.download_link) {
+                if (data.info.link_job_id) {
+                    esperarEnlaceDescarga(data.info);
+                } else {
                     const downloadBtn = document.getElementById('downloadBtn');
                     if (downloadBtn) {
                         downloadBtn.disabled = false;
@@ -67,6 +73,7 @@ document.addEventListener('DOMContentLoaded', function() {
         e.preventDefault();
         const query = keywordsInput.value.trim();
         if (!query) return;
+        const busqueda = ++busquedaActual;
         
         // Mostrar mensaje de búsqueda inicial
         resultsDiv.innerHTML = '<div class="alert alert-info"><i class="fas fa-spinner fa-spin me-2"></i>Buscando artículos que coincidan con las palabras clave...</div>';
@@ -102,6 +109,9 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             const data = await response.json();
+            if (busqueda !== busquedaActual) {
+                return;
+            }
             
             if (!data.success) {
                 resultsDiv.innerHTML = `
@@ -114,6 +124,7 @@ document.addEventListener('DOMContentLoaded', function() {
             
             // Mostrar los resultados de la búsqueda
             mostrarResultadosBusquedaPorPalabras(data.results);
+            completarResultadosPendientes(data.results, busqueda);
             
         } catch (error) {
             // Limpiar timeout
@@ -330,16 +341,74 @@ document.addEventListener('DOMContentLoaded', function() {
         }, 2000);
     };
 
+    // Sigue el progreso de un trabajo del backend mediante Server-Sent Events
+    // (con consulta periódica si la conexión de eventos falla)
+    function seguirTrabajo(jobId, onUpdate) {
+        return new Promise((resolve) => {
+            const finalizar = (job) => {
+                if (onUpdate) onUpdate(job);
+                if (job.state === 'done' || job.state === 'failed') {
+                    resolve(job);
+                    return true;
+                }
+                return false;
+            };
+            
+            const consultar = async () => {
+                try {
+                    const response = await fetch(`${API_BASE_URL}/api/jobs/${jobId}`);
+                    const data = await response.json();
+                    if (!data.success) {
+                        resolve({ state: 'failed', error: data.error });
+                        return;
+                    }
+                    if (!finalizar(data.job)) {
+                        setTimeout(consultar, 2000);
+                    }
+                } catch (error) {
+                    resolve({ state: 'failed', error: error.message });
+                }
+            };
+            
+            if (!window.EventSource) {
+                consultar();
+                return;
+            }
+            
+            const events = new EventSource(`${API_BASE_URL}/api/jobs/${jobId}/events`);
+            events.onmessage = (event) => {
+                if (finalizar(JSON.parse(event.data))) {
+                    events.close();
+                }
+            };
+            events.onerror = () => {
+                events.close();
+                consultar();
+            };
+        });
+    }
+
+    // Espera en segundo plano el enlace de descarga encontrado por el backend
+    async function esperarEnlaceDescarga(info) {
+        const job = await seguirTrabajo(info.link_job_id);
+        if (currentPaperInfo !== info) {
+            return; // El usuario ya hizo otra búsqueda
+        }
+        if (job.state === 'done' && job.result && job.result.download_link) {
+            info.download_link = job.result.download_link;
+        }
+        // El botón se habilita aunque no haya enlace: el backend volverá a buscarlo
+        const downloadBtn = document.getElementById('downloadBtn');
+        if (downloadBtn) {
+            downloadBtn.disabled = false;
+        }
+    }
+
     // Función para descargar el artículo
     window.descargarArticulo = async function(doi) {
         const downloadBtn = document.getElementById('downloadBtn');
         const downloadStatus = document.getElementById('downloadStatus');
         
-        if (!currentPaperInfo || !currentPaperInfo.download_link) {
-            downloadStatus.innerHTML = '<div class="alert alert-warning">No hay enlace de descarga disponible todavía. Por favor, espere unos momentos...</div>';
-            return;
-        }
-        
         // Deshabilitar el botón de descarga
         downloadBtn.disabled = true;
         downloadBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Descargando...';
@@ -347,6 +416,12 @@ document.addEventListener('DOMContentLoaded', function() {
         // Mostrar mensaje de descarga
         downloadStatus.innerHTML = '<div class="alert alert-info"><i class="fas fa-spinner fa-spin me-2"></i>Descargando PDF, esto puede tardar unos momentos...</div>';
         
+        const mostrarError = (message) => {
+            downloadStatus.innerHTML = '<div class="alert alert-danger"><i class="fas fa-exclamation-circle me-2"></i>Error al descargar el PDF: ' + (message || 'Error desconocido') + '</div>';
+            downloadBtn.disabled = false;
+            downloadBtn.innerHTML = '<i class="fas fa-download me-2"></i>Reintentar descarga';
+        };
+        
         try {
             const response = await fetch(`${API_BASE_URL}/api/download`, {
                 method: 'POST',
@@ -355,94 +430,37 @@ document.addEventListener('DOMContentLoaded', function() {
                 },
                 body: JSON.stringify({
                     doi: doi,
-                    download_link: currentPaperInfo.download_link
+                    download_link: currentPaperInfo ? currentPaperInfo.download_link : null
                 })
             });
             
             const data = await response.json();
             
-            if (data.success) {
-                downloadBtn.disabled = false;
-                downloadBtn.innerHTML = '<i class="fas fa-download me-2"></i>Descargar PDF';
-                mostrarPDF(data.pdf_url, doi, currentPaperInfo.sources[selectedSourceIndex].title);
-            } else {
-                downloadStatus.innerHTML = '<div class="alert alert-danger"><i class="fas fa-exclamation-circle me-2"></i>Error al descargar el PDF: ' + (data.error || 'Error desconocido') + '</div>';
-                downloadBtn.disabled = false;
-                downloadBtn.innerHTML = '<i class="fas fa-download me-2"></i>Reintentar descarga';
-            }
-        } catch (error) {
-            downloadStatus.innerHTML = '<div class="alert alert-danger"><i class="fas fa-exclamation-circle me-2"></i>Error al descargar el PDF: ' + error.message + '</div>';
-            downloadBtn.disabled = false;
-            downloadBtn.innerHTML = '<i class="fas fa-download me-2"></i>Reintentar descarga';
-        }
-        
-        // Simular actualizaciones de estado para mejorar la experiencia de usuario
-        searchTimeout = setTimeout(() => {
-            downloadStatus.innerHTML = '<div class="alert alert-info"><i class="fas fa-spinner fa-spin me-2"></i>Consultando repositorios académicos...</div>';
-            
-            searchTimeout = setTimeout(() => {
-                downloadStatus.innerHTML = '<div class="alert alert-info"><i class="fas fa-spinner fa-spin me-2"></i>Procesando archivo PDF...</div>';
-            }, 3000);
-        }, 2000);
-        
-        // Realizar la solicitud de descarga
-        fetch(`${API_BASE_URL}/api/search`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ query: doi })
-        })
-        .then(response => response.json())
-        .then(data => {
-            // Limpiar timeouts
-            if (searchTimeout) {
-                clearTimeout(searchTimeout);
-                searchTimeout = null;
-            }
-            
             if (!data.success) {
-                let errorMsg = data.error;
-                if (errorMsg.includes("No se pudo descargar el PDF")) {
-                    errorMsg = "No se pudo descargar el PDF del artículo. Esto puede deberse a restricciones de acceso o problemas con los servidores de descarga. Por favor, intente más tarde o con otro DOI.";
-                }
-                downloadStatus.innerHTML = `
-                    <div class='alert alert-danger'>
-                        <h5><i class="fas fa-exclamation-triangle me-2"></i>Error</h5>
-                        <p>${errorMsg}</p>
-                    </div>`;
-                    
-                // Restaurar botón de descarga
-                downloadBtn.disabled = false;
-                downloadBtn.innerHTML = '<i class="fas fa-download me-2"></i>Reintentar Descarga';
+                mostrarError(data.error);
                 return;
             }
             
-            // Mostrar mensaje de éxito
-            downloadStatus.innerHTML = '<div class="alert alert-success"><i class="fas fa-check-circle me-2"></i>¡PDF descargado con éxito!</div>';
+            const job = await seguirTrabajo(data.job_id, (update) => {
+                if (update.state === 'resolving') {
+                    downloadStatus.innerHTML = '<div class="alert alert-info"><i class="fas fa-spinner fa-spin me-2"></i>Consultando repositorios académicos...</div>';
+                } else if (update.state === 'downloading') {
+                    downloadStatus.innerHTML = '<div class="alert alert-info"><i class="fas fa-spinner fa-spin me-2"></i>Procesando archivo PDF...</div>';
+                }
+            });
             
-            // Mostrar el PDF
-            if (data.results && data.results.length > 0) {
-                const result = data.results[0];
-                mostrarPDF(result.pdf_url, result.doi, encodeURIComponent(result.title));
-            }
-        })
-        .catch(error => {
-            // Limpiar timeouts
-            if (searchTimeout) {
-                clearTimeout(searchTimeout);
-                searchTimeout = null;
+            if (job.state === 'done' && job.result && job.result.pdf_url) {
+                downloadStatus.innerHTML = '<div class="alert alert-success"><i class="fas fa-check-circle me-2"></i>¡PDF descargado con éxito!</div>';
+                downloadBtn.disabled = false;
+                downloadBtn.innerHTML = '<i class="fas fa-download me-2"></i>Descargar PDF';
+                const title = currentPaperInfo ? currentPaperInfo.sources[selectedSourceIndex].title : '';
+                mostrarPDF(job.result.pdf_url, doi, title);
+            } else {
+                mostrarError(job.error);
             }
-            
-            downloadStatus.innerHTML = `
-                <div class='alert alert-danger'>
-                    <h5><i class="fas fa-exclamation-triangle me-2"></i>Error de conexión</h5>
-                    <p>${error.message}</p>
-                    <p>Compruebe que el servidor backend está en funcionamiento.</p>
-                </div>`;
-                
-            // Restaurar botón de descarga
-            downloadBtn.disabled = false;
-            downloadBtn.innerHTML = '<i class="fas fa-download me-2"></i>Reintentar Descarga';
-        });
+        } catch (error) {
+            mostrarError(error.message);
+        }
     };
 
     // Mostrar resultados de búsqueda
@@ -641,6 +659,54 @@ document.addEventListener('DOMContentLoaded', function() {
         searchForm.dispatchEvent(new Event('submit'));
     }
 
+    // Consulta los campos que el backend no pudo completar a tiempo y vuelve a mostrar los resultados,
+    // mientras no se haya iniciado otra búsqueda
+    async function completarResultadosPendientes(results, busqueda, intentos = 10) {
+        const pendientes = results.filter(r => r.enrichment_pending);
+        if (!pendientes.length || intentos <= 0 || busqueda !== busquedaActual) {
+            return;
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        if (busqueda !== busquedaActual) {
+            return;
+        }
+        try {
+            const response = await fetch(`${API_BASE_URL}/api/enrichment`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ keys: pendientes.map(r => r.enrichment_key) })
+            });
+            const data = await response.json();
+            if (!data.success || busqueda !== busquedaActual) {
+                return;
+            }
+            
+            let cambios = false;
+            pendientes.forEach(paper => {
+                const estado = data.results[paper.enrichment_key];
+                if (!estado || estado.state === 'pending') {
+                    return;
+                }
+                paper.enrichment_pending = false;
+                Object.entries(estado.fields || {}).forEach(([key, value]) => {
+                    if (!paper[key]) {
+                        paper[key] = value;
+                        cambios = true;
+                    }
+                });
+            });
+            
+            if (cambios) {
+                mostrarResultadosBusquedaPorPalabras(results);
+            }
+        } catch (error) {
+            console.error('Error al completar resultados:', error);
+            return;
+        }
+        completarResultadosPendientes(results, busqueda, intentos - 1);
+    }
+
     // Mostrar resultados de búsqueda por palabras clave
     function mostrarResultadosBusquedaPorPalabras(results) {
         if (!results || !results.length) {